@@ -12,6 +12,8 @@ import datetime
 import requests
 import json
 import uuid
+import sys
+import sqlite3
 from pathlib import Path
 
 app = Flask(__name__)
@@ -25,6 +27,20 @@ JENKINS_URL = 'http://localhost:8080'
 JENKINS_USER = 'forensics_admin'
 JENKINS_TOKEN = 'your-jenkins-api-token'
 IRIS_API_URL = 'https://10.128.0.19:443/api'
+FORENSICS_SCRIPTS = '/opt/forensics/scripts'
+
+# Case-local search indexes (case_index.py) and NDJSON paging (ndjson_io.py) come from the processing scripts
+sys.path.append(FORENSICS_SCRIPTS)
+try:
+    from case_index import open_case_index, case_files, CASE_ID_RE, DEFAULT_LIMIT
+    from ndjson_io import open_indexed, build_index, is_compressed, PAGE_SIZE
+    from converter_stats import event_epoch
+except ImportError:
+    open_case_index = None
+    open_indexed = None
+    DEFAULT_LIMIT = 100
+    PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 # Ensure upload directory exists
 Path(UPLOAD_FOLDER).mkdir(parents=True, exist_ok=True)
@@ -220,11 +236,128 @@ def upload_evidence():
         flash(f'Error processing evidence submission: {str(e)}', 'error')
         return redirect(url_for('submit_evidence_form'))
 
+def case_outputs(case_id):
+    """Converter output files of a case with their record counts (None until indexed)"""
+    if open_indexed is None or not CASE_ID_RE.match(case_id):
+        return []
+    outputs = []
+    for path in case_files(case_id):
+        reader = open_indexed(path)
+        outputs.append({
+            'file': os.path.basename(path),
+            'records': len(reader) if reader else None,
+            'time_field': reader.time_field if reader else None
+        })
+        if reader:
+            reader.close()
+    return outputs
+
 @app.route('/case-status/<case_id>')
 def case_status(case_id):
     """Show case processing status"""
     # TODO: Integrate with IRIS API to get real case status
-    return render_template('case_status.html', case_id=case_id)
+    return render_template('case_status.html', case_id=case_id, outputs=case_outputs(case_id))
+
+@app.route('/api/cases/<case_id>/records')
+def api_case_records(case_id):
+    """Page through a case's converter output: ?file=<name>&page=N, or ?file=<name>&start=..&end=.. for a time range"""
+    if open_indexed is None:
+        return jsonify({'error': 'Record paging is not installed on this host'}), 503
+    if not CASE_ID_RE.match(case_id):
+        return jsonify({'error': f"Invalid case ID '{case_id}'"}), 400
+    
+    name = request.args.get('file')
+    if not name:
+        return jsonify({'case_id': case_id, 'outputs': case_outputs(case_id)})
+    # Only ever open files the case actually produced
+    paths = {os.path.basename(path): path for path in case_files(case_id)}
+    if name not in paths:
+        return jsonify({'error': f'No output {name} for case {case_id}'}), 404
+    path = paths[name]
+    
+    try:
+        page = int(request.args.get('page', 1))
+        page_size = min(int(request.args.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'page and page_size must be integers'}), 400
+    if page < 1 or page_size < 1:
+        return jsonify({'error': 'page and page_size must be positive'}), 400
+    
+    reader = open_indexed(path)
+    if reader is None:
+        if is_compressed(path):
+            return jsonify({'error': f'{name} was written without an index'}), 404
+        # Older uncompressed output: index it once, later requests reuse the sidecar
+        try:
+            build_index(path, 'timestamp' if name.startswith('timeline_') else None)
+        except OSError as e:
+            return jsonify({'error': f'Cannot index {name}: {e}'}), 503
+        reader = open_indexed(path)
+    
+    try:
+        started = datetime.datetime.now()
+        start, end = request.args.get('start'), request.args.get('end')
+        if start or end:
+            start_epoch = event_epoch(start) if start else float('-inf')
+            end_epoch = event_epoch(end) if end else float('inf')
+            if start_epoch is None or end_epoch is None:
+                return jsonify({'error': 'start and end must be epoch seconds or ISO timestamps'}), 400
+            rows = reader.time_range(start_epoch, end_epoch, page_size, (page - 1) * page_size)
+        else:
+            rows = reader.page(page, page_size)
+        elapsed_ms = (datetime.datetime.now() - started).total_seconds() * 1000
+        return jsonify({
+            'case_id': case_id,
+            'file': name,
+            'total': len(reader),
+            'page': page,
+            'page_size': page_size,
+            'count': len(rows),
+            'elapsed_ms': round(elapsed_ms, 1),
+            'results': rows
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        reader.close()
+
+@app.route('/api/cases/<case_id>/search')
+def api_case_search(case_id):
+    """Search a case's local index: full text with ?q=, or field filters such as ?table=processes&pid=4"""
+    if open_case_index is None:
+        return jsonify({'error': 'Case search is not installed on this host'}), 503
+    
+    args = request.args.to_dict()
+    text = args.pop('q', None)
+    table = args.pop('table', None)
+    limit = args.pop('limit', DEFAULT_LIMIT)
+    
+    try:
+        index = open_case_index(case_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if index is None:
+        return jsonify({'error': f'No search index for case {case_id}'}), 404
+    
+    try:
+        started = datetime.datetime.now()
+        if text:
+            rows = index.search(text, table, limit)
+        elif table:
+            rows = index.find(table, args, limit)
+        else:
+            return jsonify({'error': 'Provide q for full-text search or table for a field query'}), 400
+        elapsed_ms = (datetime.datetime.now() - started).total_seconds() * 1000
+        return jsonify({
+            'case_id': case_id,
+            'count': len(rows),
+            'elapsed_ms': round(elapsed_ms, 1),
+            'results': rows
+        })
+    except (ValueError, sqlite3.Error) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    finally:
+        index.close()
 
 @app.route('/api/status')
 def api_status():
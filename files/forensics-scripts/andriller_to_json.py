@@ -3,6 +3,14 @@ import json
 import sys
 import os
 from datetime import datetime
+from converter_stats import RunSummary
+from converter_schema import tool_schema, coerce
+from ndjson_io import NDJSONWriter
+
+SCHEMA = tool_schema({
+    'content': 'text',
+    'file_size': 'long'
+})
 
 def process_andriller_data(output_dir, case_id):
     """Process Andriller output directory"""
@@ -43,17 +51,20 @@ def main():
     json_dir = '/data/processed/andriller'
     os.makedirs(json_dir, exist_ok=True)
     
+    summary = RunSummary(case_id, 'andriller')
     results = process_andriller_data(output_dir, case_id)
+    timestamp = int(datetime.now().timestamp())
     
     if results:
-        timestamp = int(datetime.now().timestamp())
-        output_file = os.path.join(json_dir, f'andriller_{case_id}_{timestamp}.json')
-        with open(output_file, 'w') as f:
+        with NDJSONWriter(os.path.join(json_dir, f'andriller_{case_id}_{timestamp}.json')) as writer:
             for result in results:
-                f.write(json.dumps(result) + '\n')
-        print(f"Andriller data: {len(results)} entries written to {output_file}")
+                summary.observe(result)
+                writer.write(coerce(result, SCHEMA))
+        print(f"Andriller data: {len(results)} entries written to {writer.path}")
     else:
         print("No andriller data to process")
+    
+    summary.write(json_dir, timestamp)
 
 if __name__ == '__main__':
     main()
@@ -4,10 +4,72 @@ import csv
 import sys
 import os
 from datetime import datetime
+from known_files import KnownFileSet, load_file_hashes, fls_meta_address
+from converter_stats import RunSummary
+from converter_schema import tool_schema, as_long
+from converter_records import Row
+from ndjson_io import NDJSONWriter, SHARED_FIELDS
 
-def process_timeline(timeline_file, case_id, file_hash):
+SCHEMA = tool_schema({
+    'timestamp': 'keyword',
+    'file_size': 'long',
+    'activity_type': 'keyword',
+    'permissions': 'keyword',
+    'uid': 'long',
+    'gid': 'long',
+    'meta_address': {'type': 'keyword', 'doc_values': False},
+    'file_path': 'keyword',
+    'file_entry': 'text',
+    'known_file': 'boolean',
+    'content_hash': {'type': 'keyword', 'doc_values': False}
+})
+
+class TimelineRow(Row):
+    __slots__ = FIELDS = ('timestamp', 'file_size', 'activity_type', 'permissions', 'uid', 'gid',
+                          'meta_address', 'file_path', 'line_number', 'known_file', 'content_hash')
+    OPTIONAL = ('known_file', 'content_hash')
+    SOURCE = 'timeline'
+
+    def __init__(self, parts, line_number):
+        self.timestamp = parts[0] if parts[0] != '0' else None
+        self.file_size = as_long(parts[1])
+        self.activity_type = parts[2]
+        self.permissions = parts[3]
+        self.uid = as_long(parts[4])
+        self.gid = as_long(parts[5])
+        self.meta_address = parts[6]
+        self.file_path = parts[7] if len(parts) > 7 else ''
+        self.line_number = line_number
+        self.known_file = None
+        self.content_hash = None
+
+class FileListingRow(Row):
+    __slots__ = FIELDS = ('file_entry', 'line_number', 'known_file', 'content_hash')
+    OPTIONAL = ('known_file', 'content_hash')
+    SOURCE = 'file_listing'
+
+    def __init__(self, file_entry, line_number):
+        self.file_entry = file_entry
+        self.line_number = line_number
+        self.known_file = None
+        self.content_hash = None
+
+def check_known(row, meta_address, file_hashes, known_set, known_mode):
+    """Tag a row whose content hash is in the known-file set; return False if it should be dropped"""
+    if known_set is None or not meta_address:
+        return True
+    content_hash = file_hashes.get(meta_address)
+    if content_hash and known_set.contains(content_hash):
+        if known_mode == 'drop':
+            return False
+        row.known_file = True
+        row.content_hash = content_hash
+    return True
+
+def process_timeline(timeline_file, file_hashes=None, known_set=None, known_mode='tag'):
     """Process Sleuth Kit timeline data"""
     results = []
+    file_hashes = file_hashes or {}
     if os.path.exists(timeline_file):
         try:
             with open(timeline_file, 'r') as f:
@@ -15,86 +77,95 @@ def process_timeline(timeline_file, case_id, file_hash):
                     if line.strip():
                         parts = line.strip().split(',')
                         if len(parts) >= 8:
-                            result = {
-                                '@timestamp': datetime.now().isoformat(),
-                                'case_id': case_id,
-                                'evidence_hash': file_hash,
-                                'type': 'autopsy',
-                                'source': 'timeline',
-                                'timestamp': parts[0] if parts[0] != '0' else None,
-                                'file_size': parts[1],
-                                'activity_type': parts[2],
-                                'permissions': parts[3],
-                                'uid': parts[4],
-                                'gid': parts[5],
-                                'meta_address': parts[6],
-                                'file_path': parts[7] if len(parts) > 7 else '',
-                                'processed_time': datetime.now().isoformat(),
-                                'line_number': line_num
-                            }
-                            results.append(result)
+                            row = TimelineRow(parts, line_num)
+                            if check_known(row, parts[6], file_hashes, known_set, known_mode):
+                                results.append(row)
         except Exception as e:
             print(f"Error processing timeline: {e}")
     return results
 
-def process_file_listing(listing_file, case_id, file_hash):
+def process_file_listing(listing_file, file_hashes=None, known_set=None, known_mode='tag'):
     """Process file listing data"""
     results = []
+    file_hashes = file_hashes or {}
     if os.path.exists(listing_file):
         try:
             with open(listing_file, 'r') as f:
                 for line_num, line in enumerate(f, 1):
                     if line.strip():
-                        result = {
-                            '@timestamp': datetime.now().isoformat(),
-                            'case_id': case_id,
-                            'evidence_hash': file_hash,
-                            'type': 'autopsy',
-                            'source': 'file_listing',
-                            'file_entry': line.strip(),
-                            'processed_time': datetime.now().isoformat(),
-                            'line_number': line_num
-                        }
-                        results.append(result)
+                        row = FileListingRow(line.strip(), line_num)
+                        meta_address = fls_meta_address(line)
+                        if check_known(row, meta_address, file_hashes, known_set, known_mode):
+                            results.append(row)
         except Exception as e:
             print(f"Error processing file listing: {e}")
     return results
 
+def shared_values(case_id, file_hash, source, processed_time):
+    """Fields every row of one output file has in common"""
+    return {
+        '@timestamp': processed_time,
+        'case_id': case_id,
+        'evidence_hash': file_hash,
+        'type': 'autopsy',
+        'source': source,
+        'processed_time': processed_time
+    }
+
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: autopsy_to_json.py <output_directory> <case_id> <file_hash>")
+    if len(sys.argv) not in (4, 5, 6):
+        print("Usage: autopsy_to_json.py <output_directory> <case_id> <file_hash> [known_files_db] [tag|drop]")
         sys.exit(1)
     
     output_dir = sys.argv[1]
     case_id = sys.argv[2]
     file_hash = sys.argv[3]
+    known_db = sys.argv[4] if len(sys.argv) > 4 else ''
+    known_mode = sys.argv[5] if len(sys.argv) > 5 else 'tag'
+    
+    # Known-file filtering needs both the reference set and the per-image content hashes
+    known_set = None
+    file_hashes = {}
+    if known_db and os.path.exists(known_db):
+        known_set = KnownFileSet(known_db)
+        file_hashes = load_file_hashes(os.path.join(output_dir, 'file_hashes.txt'))
+        print(f"Known-file filter ({known_mode}): {known_set.count} reference hashes, {len(file_hashes)} image files hashed")
     
     json_dir = '/data/processed/autopsy'
     os.makedirs(json_dir, exist_ok=True)
     
     timestamp = int(datetime.now().timestamp())
+    processed_time = datetime.now().isoformat()
+    summary = RunSummary(case_id, 'autopsy', file_hash)
     
     # Process timeline
     timeline_file = os.path.join(output_dir, 'timeline.csv')
-    timeline_results = process_timeline(timeline_file, case_id, file_hash)
+    timeline_results = process_timeline(timeline_file, file_hashes, known_set, known_mode)
     
     if timeline_results:
-        timeline_json = os.path.join(json_dir, f'timeline_{case_id}_{timestamp}.json')
-        with open(timeline_json, 'w') as f:
-            for result in timeline_results:
-                f.write(json.dumps(result) + '\n')
-        print(f"Timeline data: {len(timeline_results)} entries written to {timeline_json}")
+        with NDJSONWriter(os.path.join(json_dir, f'timeline_{case_id}_{timestamp}.json'),
+                          shared_fields=SHARED_FIELDS, time_field='timestamp') as writer:
+            event_times = [summary.observe(row) for row in timeline_results]
+            writer.write_rows(timeline_results, shared_values(case_id, file_hash, TimelineRow.SOURCE, processed_time),
+                              event_times)
+        print(f"Timeline data: {len(timeline_results)} entries written to {writer.path}")
     
     # Process file listing
     listing_file = os.path.join(output_dir, 'file_listing.txt')
-    listing_results = process_file_listing(listing_file, case_id, file_hash)
+    listing_results = process_file_listing(listing_file, file_hashes, known_set, known_mode)
     
     if listing_results:
-        listing_json = os.path.join(json_dir, f'files_{case_id}_{timestamp}.json')
-        with open(listing_json, 'w') as f:
-            for result in listing_results:
-                f.write(json.dumps(result) + '\n')
-        print(f"File listing: {len(listing_results)} entries written to {listing_json}")
+        with NDJSONWriter(os.path.join(json_dir, f'files_{case_id}_{timestamp}.json'),
+                          shared_fields=SHARED_FIELDS) as writer:
+            for row in listing_results:
+                summary.observe(row)
+            writer.write_rows(listing_results, shared_values(case_id, file_hash, FileListingRow.SOURCE, processed_time))
+        print(f"File listing: {len(listing_results)} entries written to {writer.path}")
+    
+    summary.write(json_dir, timestamp)
+    
+    if known_set is not None:
+        known_set.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
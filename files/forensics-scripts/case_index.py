@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Per-case SQLite search index over the converter NDJSON in /data/processed.
+
+Streams every output file of a case into /data/case_index/<case_id>.db:
+typed tables per record kind (timeline, files, processes, connections,
+artifacts) plus one contentless FTS5 table over file paths, fls entries,
+process names, addresses and artifact content (strings, messages, YARA
+output). Full-text matches resolve to their rows through the FTS rowid,
+which encodes the table and row, so the text is not stored twice.
+
+Converter outputs are write-once, so a rebuild only appends files it has
+not seen. If an indexed file changed or disappeared the case database is
+rebuilt from scratch into a temporary file and swapped in, and readers
+keep the old copy until then. Field and full-text queries work without
+Elasticsearch.
+"""
+import fcntl
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from converter_schema import as_long
+from converter_stats import parse_event_time
+from ndjson_io import iter_records, NDJSON_SUFFIXES
+
+PROCESSED_DIR = '/data/processed'
+CASE_INDEX_DIR = os.environ.get('CASE_INDEX_DIR', '/data/case_index')
+INSERT_BATCH = 5000
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+JOURNAL_SUFFIXES = ('-journal', '-wal', '-shm')
+
+# Typed columns per table; every table also has rowid, file_id and evidence_hash
+TABLES = {
+    'timeline': {
+        'kind': 1,
+        'columns': ['line_number INTEGER', 'event_time TEXT', 'file_size INTEGER', 'activity_type TEXT',
+                    'permissions TEXT', 'uid INTEGER', 'gid INTEGER', 'meta_address TEXT', 'file_path TEXT',
+                    'known_file INTEGER'],
+        'indexes': ['event_time', 'meta_address', 'file_path']
+    },
+    'files': {
+        'kind': 2,
+        'columns': ['line_number INTEGER', 'file_entry TEXT', 'known_file INTEGER'],
+        'indexes': []
+    },
+    'processes': {
+        'kind': 3,
+        'columns': ['process_name TEXT', 'pid INTEGER', 'ppid INTEGER', 'threads INTEGER', 'handles INTEGER'],
+        'indexes': ['pid', 'ppid', 'process_name']
+    },
+    'connections': {
+        'kind': 4,
+        'columns': ['protocol TEXT', 'local_addr TEXT', 'foreign_addr TEXT', 'state TEXT'],
+        'indexes': ['foreign_addr', 'local_addr']
+    },
+    'artifacts': {
+        'kind': 5,
+        'columns': ['type TEXT', 'source TEXT', 'content TEXT', 'file_size INTEGER', 'yara_matches INTEGER',
+                    'malware_detected INTEGER'],
+        'indexes': ['source']
+    }
+}
+KIND_BITS = 3
+TABLE_BY_KIND = {spec['kind']: name for name, spec in TABLES.items()}
+COLUMNS = {name: [column.split()[0] for column in spec['columns']] for name, spec in TABLES.items()}
+# Converter (type, source) pairs with their own table; andriller and cape records are artifacts
+ROUTES = {
+    ('autopsy', 'timeline'): 'timeline',
+    ('autopsy', 'file_listing'): 'files',
+    ('volatility', 'process_list'): 'processes',
+    ('volatility', 'network_connections'): 'connections'
+}
+ARTIFACT_TYPES = ('andriller', 'cape')
+FILTER_ARG_RE = re.compile(r'^(\w+)(>=|<=|=)(.*)$')
+CASE_ID_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def _flag(value):
+    return 1 if value else None
+
+
+def _timeline_row(record):
+    event_time = parse_event_time(record.get('timestamp'))
+    return (record.get('line_number'), event_time.isoformat() if event_time else None,
+            as_long(record.get('file_size')), record.get('activity_type'), record.get('permissions'),
+            as_long(record.get('uid')), as_long(record.get('gid')), record.get('meta_address'),
+            record.get('file_path'), _flag(record.get('known_file'))), record.get('file_path')
+
+
+def _files_row(record):
+    entry = record.get('file_entry') or ''
+    # fls lines are "<type> <meta>:\t<path>"; only the path is worth searching
+    return (record.get('line_number'), entry, _flag(record.get('known_file'))), entry.split('\t')[-1]
+
+
+def _processes_row(record):
+    return (record.get('process_name'), as_long(record.get('pid')), as_long(record.get('ppid')),
+            as_long(record.get('threads')), as_long(record.get('handles'))), record.get('process_name')
+
+
+def _connections_row(record):
+    return (record.get('protocol'), record.get('local_addr'), record.get('foreign_addr'), record.get('state')), \
+        f"{record.get('local_addr') or ''} {record.get('foreign_addr') or ''}"
+
+
+def _artifacts_row(record):
+    return (record.get('type'), record.get('source'), record.get('content'), as_long(record.get('file_size')),
+            _flag(record.get('yara_matches')), _flag(record.get('malware_detected'))), record.get('content')
+
+
+ROW_BUILDERS = {
+    'timeline': _timeline_row,
+    'files': _files_row,
+    'processes': _processes_row,
+    'connections': _connections_row,
+    'artifacts': _artifacts_row
+}
+
+
+def case_files(case_id, processed_dir=PROCESSED_DIR, tool='*'):
+    """Every converter output file of a case, across the per-tool directories (or one tool's).
+
+    Names are <kind>_<case_id>_<epoch>.json* (run summaries: summary_<tool>_<case_id>_<epoch>.json);
+    matching the whole name keeps case C1 from picking up the files of case A_C1.
+    """
+    name_re = re.compile(rf'^(?:summary_)?[^_]+_{re.escape(case_id)}_\d+\.json')
+    paths = glob.glob(os.path.join(processed_dir, tool, f'*_{glob.escape(case_id)}_*.json*'))
+    return sorted(path for path in paths
+                  if path.endswith(NDJSON_SUFFIXES) and name_re.match(os.path.basename(path)))
+
+
+def fts_query(text):
+    """Quote each term so paths and addresses are matched literally instead of as FTS5 syntax.
+
+    A trailing * keeps its meaning as a prefix query.
+    """
+    terms = []
+    for term in text.split():
+        prefix = term.endswith('*') and len(term) > 1
+        term = term.rstrip('*') if prefix else term
+        terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+class CaseIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # Rollback journal rather than WAL: a rebuild swaps the file in with os.replace,
+        # and a -wal/-shm pair left beside the path would belong to the old database
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+
+    def create_schema(self):
+        statements = ["CREATE TABLE IF NOT EXISTS ingested (file_id INTEGER PRIMARY KEY, path TEXT UNIQUE, "
+                      "size INTEGER, mtime_ns INTEGER, rows INTEGER, ingested_at REAL)"]
+        for name, spec in TABLES.items():
+            columns = ', '.join(['file_id INTEGER', 'evidence_hash TEXT'] + spec['columns'])
+            statements.append(f"CREATE TABLE IF NOT EXISTS {name} ({columns})")
+        # Contentless: the text lives in the typed tables, the rowid says which row matched
+        statements.append("CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5("
+                          "body, content='', tokenize='unicode61', prefix='3')")
+        self.conn.executescript(';\n'.join(statements) + ';')
+        self.conn.commit()
+
+    def create_indexes(self):
+        """Secondary indexes for field queries; built after a bulk load, which is faster than maintaining them"""
+        for name, spec in TABLES.items():
+            for column in spec['indexes']:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_{column} ON {name} ({column})")
+        self.conn.commit()
+
+    def ingested(self):
+        return {row['path']: (row['size'], row['mtime_ns'])
+                for row in self.conn.execute("SELECT path, size, mtime_ns FROM ingested")}
+
+    def ingest(self, path):
+        """Stream one converter output file into the typed tables and the FTS index"""
+        stat = os.stat(path)
+        cursor = self.conn.execute("INSERT INTO ingested (path, size, mtime_ns, rows, ingested_at) "
+                                   "VALUES (?, ?, ?, 0, ?)", (path, stat.st_size, stat.st_mtime_ns, time.time()))
+        file_id = cursor.lastrowid
+        next_rowid = {name: (self.conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {name}").fetchone()[0] + 1)
+                      for name in TABLES}
+        pending = {name: [] for name in TABLES}
+        search_rows = []
+        count = 0
+
+        for record in iter_records(path):
+            record_type = record.get('type')
+            table = ROUTES.get((record_type, record.get('source')))
+            if table is None:
+                if record_type not in ARTIFACT_TYPES:
+                    continue  # run summaries and anything without a table
+                table = 'artifacts'
+            values, text = ROW_BUILDERS[table](record)
+            rowid = next_rowid[table]
+            next_rowid[table] += 1
+            pending[table].append((rowid, file_id, record.get('evidence_hash') or record.get('sample_hash')) + values)
+            if text:
+                search_rows.append(((rowid << KIND_BITS) | TABLES[table]['kind'], text))
+            count += 1
+            if count % INSERT_BATCH == 0:
+                self._flush(pending, search_rows)
+
+        self._flush(pending, search_rows)
+        self.conn.execute("UPDATE ingested SET rows = ? WHERE file_id = ?", (count, file_id))
+        return count
+
+    def _flush(self, pending, search_rows):
+        for name, rows in pending.items():
+            if rows:
+                placeholders = ', '.join('?' * (len(COLUMNS[name]) + 3))
+                self.conn.executemany(f"INSERT INTO {name} (rowid, file_id, evidence_hash, {', '.join(COLUMNS[name])}) "
+                                      f"VALUES ({placeholders})", rows)
+                rows.clear()
+        if search_rows:
+            self.conn.executemany("INSERT INTO search (rowid, body) VALUES (?, ?)", search_rows)
+            search_rows.clear()
+
+    def optimize(self):
+        """Merge the FTS segments written by a build, so queries read one b-tree"""
+        self.conn.execute("INSERT INTO search (search) VALUES ('optimize')")
+        self.conn.commit()
+        self.conn.execute('PRAGMA optimize')
+
+    def _fetch(self, table, rowids):
+        if not rowids:
+            return []
+        placeholders = ', '.join('?' * len(rowids))
+        rows = self.conn.execute(f"SELECT rowid AS id, * FROM {table} WHERE rowid IN ({placeholders})", rowids)
+        return [dict(row, table=table) for row in rows]
+
+    def search(self, text, table=None, limit=DEFAULT_LIMIT):
+        """Full-text search; returns matching rows from every table, or only from one"""
+        if table is not None and table not in TABLES:
+            raise ValueError(f"Unknown table '{table}' (expected one of {', '.join(TABLES)})")
+        limit = min(int(limit), MAX_LIMIT)
+        query = "SELECT rowid FROM search WHERE search MATCH ?"
+        params = [fts_query(text)]
+        if table is not None:
+            # Table kind is the low bits of the rowid
+            query += f" AND (rowid & {(1 << KIND_BITS) - 1}) = ?"
+            params.append(TABLES[table]['kind'])
+        query += " LIMIT ?"
+        params.append(limit)
+
+        by_table = {}
+        for (rowid,) in self.conn.execute(query, params):
+            by_table.setdefault(TABLE_BY_KIND[rowid & ((1 << KIND_BITS) - 1)], []).append(rowid >> KIND_BITS)
+        results = []
+        for name, rowids in by_table.items():
+            results.extend(self._fetch(name, rowids))
+        return results
+
+    def find(self, table, filters, limit=DEFAULT_LIMIT):
+        """Field query: filters maps column to a value, '>=x'/'<=x' ranges or '*' wildcards"""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table '{table}' (expected one of {', '.join(TABLES)})")
+        clauses = []
+        params = []
+        for column, value in filters.items():
+            if column not in COLUMNS[table] and column != 'evidence_hash':
+                raise ValueError(f"Unknown column '{column}' for {table}")
+            value = str(value)
+            if value[:2] in ('>=', '<='):
+                clauses.append(f"{column} {value[:2]} ?")
+                value = value[2:]
+            elif '*' in value:
+                clauses.append(f"{column} GLOB ?")
+            else:
+                clauses.append(f"{column} = ?")
+            params.append(as_long(value) if value.lstrip('-').isdigit() else value)
+        query = f"SELECT rowid AS id, * FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " LIMIT ?"
+        params.append(min(int(limit), MAX_LIMIT))
+        return [dict(row, table=table) for row in self.conn.execute(query, params)]
+
+    def stats(self):
+        counts = {name: self.conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in TABLES}
+        files = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(ingested_at), 0) FROM ingested").fetchone()
+        return {
+            'db_path': self.db_path,
+            'db_bytes': os.path.getsize(self.db_path),
+            'files': files[0],
+            'last_ingest': files[1],
+            'rows': counts
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def case_db_path(case_id, index_dir=CASE_INDEX_DIR):
+    # Case IDs come from the portal, so never let one name a path outside the index directory
+    if not CASE_ID_RE.match(case_id):
+        raise ValueError(f"Invalid case ID '{case_id}'")
+    return os.path.join(index_dir, f'{case_id}.db')
+
+
+def build_case_index(case_id, processed_dir=PROCESSED_DIR, index_dir=CASE_INDEX_DIR):
+    """Bring a case's index up to date with its converter outputs; returns rows added"""
+    os.makedirs(index_dir, exist_ok=True)
+    db_path = case_db_path(case_id, index_dir)
+    # One build per case at a time; readers never write, so they take no lock
+    with open(db_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _build_locked(case_id, db_path, processed_dir)
+
+
+def _build_locked(case_id, db_path, processed_dir):
+    paths = case_files(case_id, processed_dir)
+
+    rebuild = False
+    if os.path.exists(db_path):
+        index = CaseIndex(db_path)
+        seen = index.ingested()
+        for path, (size, mtime_ns) in seen.items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                rebuild = True
+                break
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                rebuild = True
+                break
+        if rebuild:
+            index.close()
+    else:
+        rebuild = True
+
+    if rebuild:
+        build_path = db_path + '.build'
+        for suffix in ('',) + JOURNAL_SUFFIXES:
+            if os.path.exists(build_path + suffix):
+                os.remove(build_path + suffix)
+        index = CaseIndex(build_path)
+        # Nothing reads the build copy, so skip the journal until it is swapped in
+        index.conn.execute('PRAGMA journal_mode=OFF')
+        index.conn.execute('PRAGMA synchronous=OFF')
+        seen = {}
+    index.create_schema()
+
+    added = 0
+    started = time.time()
+    for path in paths:
+        if path in seen:
+            continue
+        count = index.ingest(path)
+        index.conn.commit()
+        added += count
+        print(f"Indexed {count} rows from {path}", file=sys.stderr)
+
+    index.create_indexes()
+    if added or rebuild:
+        index.optimize()
+    if rebuild:
+        index.conn.execute('PRAGMA journal_mode=DELETE')
+    index.close()
+    if rebuild:
+        # Journal files left by the old database (or a WAL-mode one from before) must not
+        # be applied to the new file once it takes the name
+        for suffix in JOURNAL_SUFFIXES:
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        os.replace(build_path, db_path)
+    print(f"Case {case_id}: {added} rows indexed in {time.time() - started:.1f}s ({db_path})", file=sys.stderr)
+    return added
+
+
+def open_case_index(case_id, index_dir=CASE_INDEX_DIR):
+    """Open a case's search index, or return None if it has not been built"""
+    db_path = case_db_path(case_id, index_dir)
+    if not os.path.exists(db_path):
+        return None
+    try:
+        return CaseIndex(db_path)
+    except sqlite3.Error as e:
+        print(f"Case index unavailable ({db_path}): {e}", file=sys.stderr)
+        return None
+
+
+def print_rows(rows):
+    for row in rows:
+        print(json.dumps(row, default=str))
+
+
+def main():
+    actions = ('build', 'files', 'search', 'find', 'stats')
+    if len(sys.argv) < 3 or sys.argv[1] not in actions:
+        print("Usage: case_index.py build <case_id> [processed_dir]")
+        print("       case_index.py files <case_id> [tool]")
+        print("       case_index.py search <case_id> <text> [table] [limit]")
+        print("       case_index.py find <case_id> <table> [column=value ...] [limit=N]")
+        print("       case_index.py stats <case_id>")
+        print(f"Tables: {', '.join(TABLES)}")
+        sys.exit(1)
+
+    action, case_id = sys.argv[1], sys.argv[2]
+    if action == 'build':
+        build_case_index(case_id, sys.argv[3] if len(sys.argv) > 3 else PROCESSED_DIR)
+        return
+    if action == 'files':
+        for path in case_files(case_id, tool=sys.argv[3] if len(sys.argv) > 3 else '*'):
+            print(path)
+        return
+
+    index = open_case_index(case_id)
+    if index is None:
+        print(f"No search index for case {case_id}; run: case_index.py build {case_id}")
+        sys.exit(1)
+    try:
+        started = time.time()
+        if action == 'search' and len(sys.argv) >= 4:
+            table = sys.argv[4] if len(sys.argv) > 4 else None
+            limit = sys.argv[5] if len(sys.argv) > 5 else DEFAULT_LIMIT
+            rows = index.search(sys.argv[3], table, limit)
+        elif action == 'find' and len(sys.argv) >= 4:
+            filters = {}
+            for arg in sys.argv[4:]:
+                match = FILTER_ARG_RE.match(arg)
+                if match is None:
+                    raise ValueError(f"Cannot parse filter '{arg}' (expected column=value, column>=value or column<=value)")
+                column, operator, value = match.groups()
+                filters[column] = value if operator == '=' else operator + value
+            limit = filters.pop('limit', DEFAULT_LIMIT)
+            rows = index.find(sys.argv[3], filters, limit)
+        elif action == 'stats':
+            print(json.dumps(index.stats(), indent=2))
+            return
+        else:
+            print(f"Invalid arguments for {action}")
+            sys.exit(1)
+        print_rows(rows)
+        print(f"{len(rows)} rows ({(time.time() - started) * 1000:.1f} ms)", file=sys.stderr)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Query failed: {e}")
+        sys.exit(1)
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Slotted row types and a batch encoder for the converter hot loops.
+
+A converter row holds only the columns that vary from line to line, in
+__slots__ and already converted to the schema types, so there is no
+per-row dict and no generic coerce() pass. Fields shared by a whole batch
+(case, evidence hash, type, source, run times) are passed once to
+NDJSONWriter.write_rows. encode_rows() encodes them once into a JSON
+prefix and fills a per-type template of pre-encoded keys with each row's
+encoded values, so a row costs one scalar encode per field.
+"""
+import json
+from operator import attrgetter
+
+BATCH_ROWS = 1000
+_encode = json.JSONEncoder().encode
+
+# Scalar encoders by exact type, each giving what json.dumps writes for that value
+_SCALAR_ENCODERS = {
+    str: json.encoder.encode_basestring_ascii,
+    int: int.__repr__,
+    bool: {True: 'true', False: 'false'}.__getitem__,
+    type(None): lambda value: 'null',
+}
+
+
+class Row:
+    """Base for converter rows; subclasses set FIELDS as their __slots__ and SOURCE.
+
+    Values must be scalars. OPTIONAL fields are left out of the document
+    while None, the way the dict records only carried them when set.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    OPTIONAL = ()
+    SOURCE = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        getter = attrgetter(*cls.FIELDS)
+        cls.values = getter if len(cls.FIELDS) > 1 else lambda row: (getter(row),)
+        cls.encoded_keys = tuple(_encode(field) + ': ' for field in cls.FIELDS)
+        cls.optional_slots = tuple(i for i, field in enumerate(cls.FIELDS) if field in cls.OPTIONAL)
+
+    def get(self, field, default=None):
+        """dict-style access, so RunSummary.observe handles rows and records alike"""
+        if field == 'source':
+            return self.SOURCE
+        return getattr(self, field, default)
+
+
+def _template(head, keys, missing):
+    """%-template for one document shape: the shared prefix, then a slot per present field"""
+    parts = [key + '%s' for i, key in enumerate(keys) if i not in missing]
+    if head:
+        parts.insert(0, head.replace('%', '%%'))
+    return '{' + ', '.join(parts) + '}'
+
+
+def encode_rows(rows, shared=None):
+    """NDJSON text for a list of rows of one type, each merged with the shared fields.
+
+    The output matches json.dumps of the merged dict, except that a row
+    field also present in shared is written among the row fields.
+    """
+    if not rows:
+        return ''
+    row_type = type(rows[0])
+    values, keys, optional = row_type.values, row_type.encoded_keys, row_type.optional_slots
+    if shared and not shared.keys().isdisjoint(row_type.FIELDS):
+        shared = {key: value for key, value in shared.items() if key not in row_type.FIELDS}
+    head = _encode(shared)[1:-1] if shared else ''
+    full = _template(head, keys, ())
+    templates = {}
+    lines = []
+    scalar_encoder = _SCALAR_ENCODERS.get
+    for row in rows:
+        row_values = values(row)
+        encoded = [scalar_encoder(type(value), _encode)(value) for value in row_values]
+        template = full
+        if optional:
+            missing = tuple([i for i in optional if row_values[i] is None])
+            if missing:
+                template = templates.get(missing)
+                if template is None:
+                    template = templates[missing] = _template(head, keys, missing)
+                for i in reversed(missing):
+                    del encoded[i]
+        lines.append(template % tuple(encoded))
+    lines.append('')
+    return '\n'.join(lines)
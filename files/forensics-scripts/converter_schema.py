@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Field schemas for the *_to_json converters and the index templates built from them.
+
+Each converter declares SCHEMA = tool_schema({...}) with its own fields;
+the shared fields every document carries (and the ones added at load
+time or by run summaries) are merged in here. coerce() converts a record
+to the declared types at write time, so the generated templates can map
+fields strictly instead of relying on dynamic text+keyword mapping.
+
+Schema values are a mapping type name or a dict of mapping parameters,
+e.g. {'type': 'keyword', 'doc_values': False} for fields that are only
+filtered on, never sorted or aggregated.
+"""
+import importlib
+import json
+import os
+import sys
+import requests
+
+TEMPLATE_PRIORITY = 200
+ROLLOVER_POLICY = 'forensics-rollover'  # installed by es_index_manager.py setup
+SCHEMA_VERSION = 1
+KEYWORD_IGNORE_ABOVE = 1024
+
+# Converter module per document type, for template generation
+CONVERTERS = {
+    'autopsy': 'autopsy_to_json',
+    'volatility': 'volatility_to_json',
+    'andriller': 'andriller_to_json',
+    'cape': 'malware_to_json'
+}
+
+COMMON_FIELDS = {
+    '@timestamp': 'date',
+    'case_id': 'keyword',
+    'evidence_hash': 'keyword',
+    'type': 'keyword',
+    'source': 'keyword',
+    'processed_time': 'date',
+    'line_number': {'type': 'long', 'doc_values': False},
+    'tags': 'keyword',
+    'misp_match': 'boolean',
+    # Added by es_bulk_loader.enrich
+    'lab_processed': 'boolean',
+    'processing_time': 'date',
+    'file_directory': 'keyword',
+    'file_name': 'keyword',
+    'file_extension': 'keyword',
+    'process_key': 'keyword'
+}
+
+# Written once per converter run by converter_stats.RunSummary
+RUN_SUMMARY_FIELDS = {
+    'record_count': 'long',
+    'counts_by_source': 'flattened',
+    'flag_counts': 'flattened',
+    'top_extensions': {'properties': {'value': 'keyword', 'count': 'long', 'max_error': 'long'}},
+    'top_processes': {'properties': {'value': 'keyword', 'count': 'long', 'max_error': 'long'}},
+    'time_min': 'date',
+    'time_max': 'date',
+    'total_file_size': 'long',
+    'run_started': 'date',
+    'run_finished': 'date'
+}
+
+
+def tool_schema(fields):
+    """Full schema for a converter: shared fields plus the converter's own"""
+    schema = dict(COMMON_FIELDS)
+    schema.update(RUN_SUMMARY_FIELDS)
+    schema.update(fields)
+    return schema
+
+
+def field_type(spec):
+    return spec if isinstance(spec, str) else spec.get('type', 'object')
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return int(value, 0)  # hex offsets such as 0x1f4
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'y')
+    return bool(value)
+
+
+COERCERS = {
+    'long': _to_int,
+    'integer': _to_int,
+    'double': float,
+    'float': float,
+    'boolean': _to_bool,
+    'keyword': str,
+    'text': str
+}
+
+
+def coerce(record, schema):
+    """Convert record values to their declared types in place; unparseable values become null"""
+    for field, value in record.items():
+        spec = schema.get(field)
+        if spec is None or value is None:
+            continue
+        convert = COERCERS.get(field_type(spec))
+        if convert is None or isinstance(value, (list, dict)):
+            continue
+        if value == '' and convert is not str:
+            record[field] = None
+            continue
+        try:
+            record[field] = convert(value)
+        except (TypeError, ValueError):
+            record[field] = None
+    return record
+
+
+def as_long(value):
+    """Integer value of a raw column, or None when empty or unparseable, as coerce() would give"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return _to_int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def field_mapping(spec):
+    """Elasticsearch mapping for one schema entry, with storage-saving defaults"""
+    if isinstance(spec, dict) and 'properties' in spec:
+        return {'properties': {name: field_mapping(sub) for name, sub in spec['properties'].items()}}
+    mapping = {'type': spec} if isinstance(spec, str) else dict(spec)
+    if mapping['type'] == 'keyword':
+        mapping.setdefault('ignore_above', KEYWORD_IGNORE_ABOVE)
+    elif mapping['type'] == 'text':
+        # Free text is only matched, never scored by length or aggregated
+        mapping.setdefault('norms', False)
+        mapping.setdefault('index_options', 'freqs')
+    return mapping
+
+
+def index_template(tool, schema):
+    """Composable index template for forensics-<tool>-* built from a converter schema"""
+    return {
+        'index_patterns': [f'forensics-{tool}-*'],
+        'priority': TEMPLATE_PRIORITY,
+        'template': {
+            'settings': {
+                'index.lifecycle.name': ROLLOVER_POLICY,
+                'index.lifecycle.rollover_alias': f'forensics-{tool}'
+            },
+            'mappings': {
+                'dynamic': 'strict',
+                # Documents are always routed by case_id
+                '_routing': {'required': True},
+                'properties': {field: field_mapping(spec) for field, spec in sorted(schema.items())}
+            }
+        },
+        '_meta': {'generated_by': 'converter_schema.py', 'schema_version': SCHEMA_VERSION}
+    }
+
+
+def load_templates():
+    """Build templates for every converter that can be imported from this directory"""
+    templates = {}
+    for tool, module_name in CONVERTERS.items():
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Skipping {tool}: cannot import {module_name} ({e})", file=sys.stderr)
+            continue
+        templates[f'forensics-{tool}'] = index_template(tool, module.SCHEMA)
+    return templates
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ('generate', 'install'):
+        print("Usage: converter_schema.py generate <output_dir>")
+        print("       converter_schema.py install <elasticsearch_url>")
+        sys.exit(1)
+
+    templates = load_templates()
+
+    if sys.argv[1] == 'generate':
+        os.makedirs(sys.argv[2], exist_ok=True)
+        for name, template in templates.items():
+            template_file = os.path.join(sys.argv[2], f'{name}.json')
+            with open(template_file, 'w') as f:
+                json.dump(template, f, indent=2)
+            print(f"Template written: {template_file}")
+        return
+
+    es_url = sys.argv[2].rstrip('/')
+    failed = False
+    for name, template in templates.items():
+        response = requests.put(f"{es_url}/_index_template/{name}", json=template, timeout=60)
+        if response.status_code == 200:
+            print(f"Installed index template {name}")
+        else:
+            print(f"Failed to install {name}: {response.status_code} {response.text[:200]}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Running aggregates for the *_to_json converters.
+
+Each converter feeds every record it writes through a RunSummary, which
+keeps per-source counts, approximate top-K extensions and processes
+(Space-Saving heavy hitters), flag counts and the event time range in
+constant memory. At the end of the run one compact summary document is
+written next to the converter output so reports and dashboards can read
+pre-materialized numbers instead of aggregating raw documents.
+"""
+import json
+import os
+from datetime import datetime
+
+TOP_K = 20               # entries reported per heavy-hitter list
+SKETCH_CAPACITY = 200    # counters kept per sketch; larger means more accurate top-K
+MAX_EXTENSION_LENGTH = 10
+FLAG_FIELDS = ['yara_matches', 'malware_detected', 'known_file', 'misp_match']
+TIME_FORMATS = ['%a %b %d %Y %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+
+class HeavyHitters:
+    """Space-Saving sketch: approximate counts of the most frequent items in bounded memory"""
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Replace the smallest counter; its count bounds the new item's overestimate
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+
+    def top(self, n=TOP_K):
+        ranked = sorted(self.counts.items(), key=lambda entry: entry[1], reverse=True)[:n]
+        return [{'value': item, 'count': count, 'max_error': self.errors[item]} for item, count in ranked]
+
+
+def parse_event_time(value):
+    """Parse a tool timestamp (epoch seconds, ISO 8601 or mactime) into a datetime, or None"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value))
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def event_epoch(value):
+    """Epoch seconds of a tool timestamp as a float, or None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value.isdigit():
+        return float(value)
+    return datetime_epoch(parse_event_time(value))
+
+
+def datetime_epoch(event_time):
+    """Epoch seconds of a parse_event_time result as a float, or None"""
+    if event_time is None:
+        return None
+    try:
+        return event_time.timestamp()
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def record_extension(record):
+    """Lower-case file extension of a record's path, or None"""
+    path = record.get('file_path')
+    if not path:
+        # fls lines are "<type> <meta>:\t<path>"
+        path = (record.get('file_entry') or '').split('\t')[-1]
+    if not path:
+        return None
+    extension = os.path.splitext(os.path.basename(path))[1].lower()
+    if not extension or len(extension) > MAX_EXTENSION_LENGTH:
+        return None
+    return extension
+
+
+class RunSummary:
+    def __init__(self, case_id, tool, evidence_hash=None):
+        self.case_id = case_id
+        self.tool = tool
+        self.evidence_hash = evidence_hash
+        self.started = datetime.now()
+        self.record_count = 0
+        self.counts_by_source = {}
+        self.flags = dict.fromkeys(FLAG_FIELDS, 0)
+        self.extensions = HeavyHitters()
+        self.processes = HeavyHitters()
+        self.time_min = None
+        self.time_max = None
+        self.bytes_seen = 0
+
+    def observe(self, record):
+        """Fold one converter record into the running aggregates; returns its parsed timestamp"""
+        self.record_count += 1
+        source = record.get('source', 'unknown')
+        self.counts_by_source[source] = self.counts_by_source.get(source, 0) + 1
+
+        for flag in FLAG_FIELDS:
+            if record.get(flag):
+                self.flags[flag] += 1
+
+        extension = record_extension(record)
+        if extension:
+            self.extensions.add(extension)
+        process_name = record.get('process_name')
+        if process_name:
+            self.processes.add(process_name)
+
+        event_time = parse_event_time(record.get('timestamp'))
+        if event_time is not None:
+            if self.time_min is None or event_time < self.time_min:
+                self.time_min = event_time
+            if self.time_max is None or event_time > self.time_max:
+                self.time_max = event_time
+
+        try:
+            self.bytes_seen += int(record.get('file_size') or 0)
+        except (TypeError, ValueError):
+            pass
+        return event_time
+
+    def document(self):
+        """Compact summary document for this run"""
+        return {
+            '@timestamp': datetime.now().isoformat(),
+            'case_id': self.case_id,
+            'evidence_hash': self.evidence_hash,
+            'type': self.tool,
+            'source': 'run_summary',
+            'record_count': self.record_count,
+            'counts_by_source': self.counts_by_source,
+            'flag_counts': self.flags,
+            'top_extensions': self.extensions.top(),
+            'top_processes': self.processes.top(),
+            'time_min': self.time_min.isoformat() if self.time_min else None,
+            'time_max': self.time_max.isoformat() if self.time_max else None,
+            'total_file_size': self.bytes_seen,
+            'run_started': self.started.isoformat(),
+            'run_finished': datetime.now().isoformat()
+        }
+
+    def write(self, json_dir, timestamp):
+        """Write the summary document next to the converter output and return its path"""
+        summary_file = os.path.join(json_dir, f'summary_{self.tool}_{self.case_id}_{timestamp}.json')
+        with open(summary_file, 'w') as f:
+            f.write(json.dumps(self.document()) + '\n')
+        print(f"Run summary: {self.record_count} records summarized in {summary_file}")
+        return summary_file
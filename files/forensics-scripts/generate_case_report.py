@@ -2,48 +2,221 @@
 import json
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from html import escape
 import requests
+from requests.adapters import HTTPAdapter
 
-def generate_case_summary(case_id, evidence_type, investigator, output_dir):
-    """Generate case summary report"""
-    
-    # Query Elasticsearch for case data
-    elasticsearch_url = "http://192.168.1.12:9200"
-    
+ELASTICSEARCH_URL = "http://192.168.1.12:9200"
+CASE_INDEX = "forensics-*"
+CASE_ALIAS_PREFIX = "case-"  # filtered, routed per-case aliases from es_index_manager.py
+PAGE_SIZE = 1000          # documents per search_after page
+COMPOSITE_PAGE_SIZE = 500 # buckets per composite aggregation page
+PIT_KEEP_ALIVE = "2m"
+MSEARCH_BATCH = 100       # searches per _msearch request
+REPORT_WORKERS = 4        # reports rendered concurrently in batch mode
+REPORT_CACHE = "report_cache.json"
+
+def es_session(pool_size=REPORT_WORKERS):
+    """Keep-alive session shared by every query of a run"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+_case_aliases = None
+
+def case_index(session, case_id):
+    """Routed per-case alias when the case has one, otherwise every forensics index"""
+    global _case_aliases
+    if _case_aliases is None:
+        aliases = set()
+        response = session.get(f"{ELASTICSEARCH_URL}/_alias/{CASE_ALIAS_PREFIX}*", timeout=60)
+        if response.status_code == 200:
+            for info in response.json().values():
+                aliases.update(info.get('aliases', {}))
+        _case_aliases = aliases
+    alias = f"{CASE_ALIAS_PREFIX}{case_id}".lower()
+    return alias if alias in _case_aliases else CASE_INDEX
+
+def msearch(session, searches):
+    """Run (index, body) searches through _msearch, in request-sized batches"""
+    results = []
+    for i in range(0, len(searches), MSEARCH_BATCH):
+        lines = []
+        for index, body in searches[i:i + MSEARCH_BATCH]:
+            lines.append(json.dumps({"index": index}))
+            lines.append(json.dumps(body))
+        response = session.post(f"{ELASTICSEARCH_URL}/_msearch", data='\n'.join(lines) + '\n',
+                                headers={'Content-Type': 'application/x-ndjson'}, timeout=300)
+        response.raise_for_status()
+        for result in response.json().get('responses', []):
+            if 'error' in result:
+                raise RuntimeError(f"Elasticsearch search failed: {result['error']}")
+            results.append(result)
+    return results
+
+def case_query(case_id):
+    """Query matching every evidence document of a case (converter run summaries excluded)"""
+    return {
+        "bool": {
+            "filter": [{"term": {"case_id": case_id}}],
+            "must_not": [{"term": {"source": "run_summary"}}]
+        }
+    }
+
+def count_case_documents(session, case_id):
+    """Exact document count for a case"""
+    response = session.post(f"{ELASTICSEARCH_URL}/{case_index(session, case_id)}/_count",
+                            json={"query": case_query(case_id)}, timeout=60)
+    response.raise_for_status()
+    return response.json().get('count', 0)
+
+def composite_query(case_id, fields, after_key=None):
+    """Search body for one page of a composite aggregation over the given fields"""
+    composite = {
+        "size": COMPOSITE_PAGE_SIZE,
+        "sources": [{field: {"terms": {"field": field, "missing_bucket": True}}} for field in fields]
+    }
+    if after_key:
+        composite["after"] = after_key
+    return {
+        "size": 0,
+        "query": case_query(case_id),
+        "aggs": {"breakdown": {"composite": composite}}
+    }
+
+def iter_composite_buckets(session, case_id, fields, first_page=None):
+    """Yield every (key, doc_count) bucket for the given fields, paging with after_key"""
+    after_key = None
+    while True:
+        if first_page is not None:
+            data, first_page = first_page, None
+        else:
+            response = session.post(f"{ELASTICSEARCH_URL}/{case_index(session, case_id)}/_search",
+                                    json=composite_query(case_id, fields, after_key), timeout=120)
+            response.raise_for_status()
+            data = response.json()
+        breakdown = data.get('aggregations', {}).get('breakdown', {})
+        for bucket in breakdown.get('buckets', []):
+            yield bucket['key'], bucket['doc_count']
+        after_key = breakdown.get('after_key')
+        if not after_key or not breakdown.get('buckets'):
+            return
+
+def iter_case_documents(session, case_id, extra_filter=None, source_fields=None):
+    """Yield every matching case document using a point-in-time and search_after"""
+    index = case_index(session, case_id)
+    pit_url = f"{ELASTICSEARCH_URL}/{index}/_pit?keep_alive={PIT_KEEP_ALIVE}"
+    if index != CASE_INDEX:
+        pit_url += f"&routing={case_id}"
+    response = session.post(pit_url, timeout=60)
+    response.raise_for_status()
+    pit_id = response.json()['id']
+
+    query = {"bool": {"filter": [case_query(case_id)]}}
+    if extra_filter:
+        query["bool"]["filter"].append(extra_filter)
+
+    search_after = None
     try:
-        # Search for all data related to this case
-        search_url = f"{elasticsearch_url}/forensics-*/_search"
-        query = {
-            "query": {
-                "term": {
-                    "case_id": case_id
-                }
-            },
-            "size": 1000,
-            "aggs": {
-                "evidence_types": {
-                    "terms": {
-                        "field": "type"
-                    }
-                },
-                "sources": {
-                    "terms": {
-                        "field": "source"
-                    }
-                }
+        while True:
+            body = {
+                "size": PAGE_SIZE,
+                "query": query,
+                "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                "sort": [{"_shard_doc": "asc"}],
+                "track_total_hits": False
             }
+            if source_fields:
+                body["_source"] = source_fields
+            if search_after:
+                body["search_after"] = search_after
+            response = session.post(f"{ELASTICSEARCH_URL}/_search", json=body, timeout=120)
+            response.raise_for_status()
+            data = response.json()
+            pit_id = data.get('pit_id', pit_id)
+            hits = data.get('hits', {}).get('hits', [])
+            for hit in hits:
+                yield hit.get('_source', {})
+            if len(hits) < PAGE_SIZE:
+                return
+            search_after = hits[-1]['sort']
+    finally:
+        session.delete(f"{ELASTICSEARCH_URL}/_pit", json={"id": pit_id}, timeout=30)
+
+def describe_finding(source_data):
+    """One-line description of a notable document, or None"""
+    if source_data.get('misp_match'):
+        value = source_data.get('file_hash') or source_data.get('ip_address') or source_data.get('url', '')
+        return f"⚠️ MISP match: {value}"
+    if source_data.get('yara_matches'):
+        return "⚠️ YARA rule matches detected"
+    if source_data.get('file_path'):
+        return f"File: {source_data['file_path']}"
+    if source_data.get('process_name'):
+        return f"Process: {source_data['process_name']}"
+    return None
+
+NOTABLE_FILTER = {
+    "bool": {
+        "should": [
+            {"term": {"misp_match": True}},
+            {"term": {"yara_matches": True}},
+            {"term": {"malware_detected": True}}
+        ],
+        "minimum_should_match": 1
+    }
+}
+
+BREAKDOWN_FIELDS = ['type', 'source']
+
+def section_queries(case_id):
+    """First-page search bodies for each report section, run together through _msearch"""
+    return {
+        'breakdown': composite_query(case_id, BREAKDOWN_FIELDS),
+        'notable': {
+            "size": PAGE_SIZE,
+            "query": {"bool": {"filter": [case_query(case_id), NOTABLE_FILTER]}},
+            "sort": ["_doc"],
+            "track_total_hits": False
         }
-        
-        response = requests.post(search_url, json=query)
-        data = response.json() if response.status_code == 200 else {}
-        
-        # Generate HTML report
-        html_content = f"""
+    }
+
+def iter_notable_documents(session, case_id, first_page=None):
+    """Yield flagged documents, using a prefetched page when it already holds all of them"""
+    if first_page is not None:
+        hits = first_page.get('hits', {}).get('hits', [])
+        if len(hits) < PAGE_SIZE:
+            for hit in hits:
+                yield hit.get('_source', {})
+            return
+    yield from iter_case_documents(session, case_id, NOTABLE_FILTER)
+
+def generate_case_summary(case_id, evidence_type, investigator, output_dir,
+                          session=None, total_items=None, prefetched=None):
+    """Generate case summary report; returns the HTML report path, or None if only a basic report was written"""
+
+    os.makedirs(output_dir, exist_ok=True)
+    report_file = os.path.join(output_dir, f"case_report_{case_id}.html")
+    tmp_report = report_file + '.tmp'
+    session = session or es_session(1)
+    prefetched = prefetched or {}
+
+    try:
+        if total_items is None:
+            total_items = count_case_documents(session, case_id)
+        summary_counts = {'evidence_types': {}, 'sources': {}, 'notable_findings': 0}
+
+        # Write the HTML report section by section so memory stays constant
+        with open(tmp_report, 'w') as f:
+            f.write(f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <title>Forensics Case Report - {case_id}</title>
+    <title>Forensics Case Report - {escape(case_id)}</title>
     <style>
         body {{ font-family: Arial, sans-serif; margin: 40px; }}
         .header {{ background: #2c3e50; color: white; padding: 20px; }}
@@ -57,62 +230,70 @@ def generate_case_summary(case_id, evidence_type, investigator, output_dir):
 <body>
     <div class="header">
         <h1>Digital Forensics Case Report</h1>
-        <p>Case ID: {case_id} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        <p>Case ID: {escape(case_id)} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
     </div>
-    
+
     <div class="section">
         <h2>Case Information</h2>
         <table>
-            <tr><th>Case ID</th><td>{case_id}</td></tr>
-            <tr><th>Primary Investigator</th><td>{investigator}</td></tr>
-            <tr><th>Evidence Type</th><td>{evidence_type}</td></tr>
+            <tr><th>Case ID</th><td>{escape(case_id)}</td></tr>
+            <tr><th>Primary Investigator</th><td>{escape(investigator)}</td></tr>
+            <tr><th>Evidence Type</th><td>{escape(evidence_type)}</td></tr>
             <tr><th>Processing Date</th><td>{datetime.now().strftime('%Y-%m-%d')}</td></tr>
-            <tr><th>Total Evidence Items</th><td>{data.get('hits', {}).get('total', {}).get('value', 0)}</td></tr>
+            <tr><th>Total Evidence Items</th><td>{total_items}</td></tr>
         </table>
     </div>
-    
+
     <div class="section">
         <h2>Analysis Summary</h2>
         <div class="evidence-item">
             <h3>Evidence Sources Processed:</h3>
-            <ul>
-"""
-        
-        # Add aggregation results
-        if 'aggregations' in data:
-            for bucket in data['aggregations'].get('sources', {}).get('buckets', []):
-                html_content += f"<li>{bucket['key']}: {bucket['doc_count']} items</li>"
-        
-        html_content += """
-            </ul>
+            <table>
+                <tr><th>Tool</th><th>Source</th><th>Items</th></tr>
+""")
+
+            # Complete tool/source breakdown, however many buckets there are
+            for key, doc_count in iter_composite_buckets(session, case_id, BREAKDOWN_FIELDS,
+                                                      prefetched.get('breakdown')):
+                tool = key.get('type') or 'unknown'
+                source = key.get('source') or 'unknown'
+                summary_counts['evidence_types'][tool] = summary_counts['evidence_types'].get(tool, 0) + doc_count
+                summary_counts['sources'][source] = summary_counts['sources'].get(source, 0) + doc_count
+                f.write(f"<tr><td>{escape(str(tool))}</td><td>{escape(str(source))}</td><td>{doc_count}</td></tr>\n")
+
+            f.write("""
+            </table>
         </div>
     </div>
-    
+
     <div class="section">
         <h2>Key Findings</h2>
         <div class="evidence-item">
-"""
-        
-        # Add key findings from evidence
-        hits = data.get('hits', {}).get('hits', [])
-        key_findings = []
-        
-        for hit in hits[:10]:  # Top 10 findings
-            source_data = hit.get('_source', {})
-            if source_data.get('file_path'):
-                key_findings.append(f"File: {source_data['file_path']}")
-            elif source_data.get('process_name'):
-                key_findings.append(f"Process: {source_data['process_name']}")
-            elif source_data.get('yara_matches'):
-                key_findings.append("⚠️ YARA rule matches detected")
-        
-        for finding in key_findings[:5]:
-            html_content += f"<p>• {finding}</p>"
-        
-        html_content += """
+""")
+
+            # Every notable document (MISP/YARA/malware hits), streamed page by page
+            for source_data in iter_notable_documents(session, case_id, prefetched.get('notable')):
+                finding = describe_finding(source_data)
+                if finding:
+                    f.write(f"<p>• {escape(finding)}</p>\n")
+                    summary_counts['notable_findings'] += 1
+
+            # Without flagged items, show a sample of processed artifacts as before
+            if not summary_counts['notable_findings']:
+                sample = 0
+                for source_data in iter_case_documents(session, case_id,
+                                                       source_fields=['file_path', 'process_name', 'yara_matches']):
+                    finding = describe_finding(source_data)
+                    if finding:
+                        f.write(f"<p>• {escape(finding)}</p>\n")
+                        sample += 1
+                    if sample >= 5:
+                        break
+
+            f.write("""
         </div>
     </div>
-    
+
     <div class="section">
         <h2>Technical Details</h2>
         <p>This automated analysis was performed using the Digital Forensics Lab pipeline.</p>
@@ -123,7 +304,7 @@ def generate_case_summary(case_id, evidence_type, investigator, output_dir):
             <li>Elasticsearch indices: forensics-*</li>
         </ul>
     </div>
-    
+
     <div class="section">
         <h2>Next Steps</h2>
         <ol>
@@ -135,33 +316,33 @@ def generate_case_summary(case_id, evidence_type, investigator, output_dir):
     </div>
 </body>
 </html>
-"""
-        
-        # Write report
-        os.makedirs(output_dir, exist_ok=True)
-        report_file = os.path.join(output_dir, f"case_report_{case_id}.html")
-        
-        with open(report_file, 'w') as f:
-            f.write(html_content)
-        
+""")
+
+        os.replace(tmp_report, report_file)
+
         # Also create JSON summary
         summary = {
             'case_id': case_id,
             'investigator': investigator,
             'evidence_type': evidence_type,
             'generated_at': datetime.now().isoformat(),
-            'total_items': data.get('hits', {}).get('total', {}).get('value', 0),
-            'elasticsearch_data': data
+            'total_items': total_items,
+            'evidence_types': summary_counts['evidence_types'],
+            'sources': summary_counts['sources'],
+            'notable_findings': summary_counts['notable_findings']
         }
-        
+
         json_file = os.path.join(output_dir, f"case_summary_{case_id}.json")
         with open(json_file, 'w') as f:
             json.dump(summary, f, indent=2)
-        
+
         print(f"Report generated: {report_file}")
         print(f"Summary data: {json_file}")
-        
+        return report_file
+
     except Exception as e:
+        if os.path.exists(tmp_report):
+            os.remove(tmp_report)
         print(f"Error generating report: {e}")
         # Create minimal report even if ES query fails
         simple_report = f"""
@@ -183,21 +364,98 @@ Please check:
 - Network connectivity
 - Case data in /data/cases/{case_id}/
 """
-        
+
         report_file = os.path.join(output_dir, f"case_report_{case_id}.txt")
         with open(report_file, 'w') as f:
             f.write(simple_report)
-        
+
         print(f"Basic report generated: {report_file}")
+        return None
+
+def load_cases(cases_file):
+    """Read batch cases: a JSON list of case IDs or of {case_id, evidence_type, investigator} objects"""
+    with open(cases_file, 'r') as f:
+        entries = json.load(f)
+    cases = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'case_id': entry}
+        cases.append({
+            'case_id': entry['case_id'],
+            'evidence_type': entry.get('evidence_type', 'unknown'),
+            'investigator': entry.get('investigator', 'unknown')
+        })
+    return cases
+
+def generate_batch_reports(cases, output_dir, workers=REPORT_WORKERS):
+    """Regenerate reports for many cases, skipping cases whose document count is unchanged"""
+    os.makedirs(output_dir, exist_ok=True)
+    cache_file = os.path.join(output_dir, REPORT_CACHE)
+    cache = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+
+    session = es_session(workers)
+
+    # One cheap count per case decides which reports are stale
+    counts = msearch(session, [
+        (case_index(session, case['case_id']),
+         {"size": 0, "query": case_query(case['case_id']), "track_total_hits": True}) for case in cases
+    ])
+    stale = []
+    skipped = 0
+    for case, result in zip(cases, counts):
+        case['total_items'] = result.get('hits', {}).get('total', {}).get('value', 0)
+        cached = cache.get(case['case_id'], {})
+        if cached.get('doc_count') == case['total_items'] and os.path.exists(cached.get('report', '')):
+            skipped += 1
+        else:
+            stale.append(case)
+
+    # First page of every section for every stale case in as few requests as possible
+    names = list(section_queries('').keys())
+    first_pages = msearch(session, [(case_index(session, case['case_id']), body) for case in stale
+                                    for body in section_queries(case['case_id']).values()])
+    for index, case in enumerate(stale):
+        case['prefetched'] = dict(zip(names, first_pages[index * len(names):(index + 1) * len(names)]))
+
+    def render(case):
+        return case, generate_case_summary(case['case_id'], case['evidence_type'], case['investigator'],
+                                           output_dir, session, case['total_items'], case['prefetched'])
+
+    generated = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for case, report_file in executor.map(render, stale):
+            if report_file:
+                cache[case['case_id']] = {'doc_count': case['total_items'], 'report': report_file,
+                                          'generated_at': datetime.now().isoformat()}
+                generated += 1
+            else:
+                failed += 1
+
+    tmp_cache = cache_file + '.tmp'
+    with open(tmp_cache, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_cache, cache_file)
+
+    print(f"Batch complete: {generated} generated, {skipped} unchanged, {failed} failed")
+    return {'generated': generated, 'skipped': skipped, 'failed': failed}
 
 if __name__ == '__main__':
+    if len(sys.argv) in (4, 5) and sys.argv[1] == '--batch':
+        workers = int(sys.argv[4]) if len(sys.argv) == 5 else REPORT_WORKERS
+        result = generate_batch_reports(load_cases(sys.argv[2]), sys.argv[3], workers)
+        sys.exit(1 if result['failed'] else 0)
+
     if len(sys.argv) != 5:
         print("Usage: generate_case_report.py <case_id> <evidence_type> <investigator> <output_dir>")
+        print("       generate_case_report.py --batch <cases_json> <output_dir> [workers]")
         sys.exit(1)
-    
+
     case_id = sys.argv[1]
     evidence_type = sys.argv[2]
     investigator = sys.argv[3]
     output_dir = sys.argv[4]
-    
-    generate_case_summary(case_id, evidence_type, investigator, output_dir)
\ No newline at end of file
+
+    generate_case_summary(case_id, evidence_type, investigator, output_dir)
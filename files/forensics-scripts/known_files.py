@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Known-file hash set for the disk pipeline.
+
+Builds an NSRL-style reference hash list into a compact sorted binary file
+and answers membership queries through mmap and binary search, so hundreds
+of millions of reference hashes never become Python objects.
+
+File layout:
+    header  - magic (8 bytes), digest size (uint32), reserved (uint32), count (uint64)
+    records - <count> raw digests, sorted, de-duplicated
+    fanout  - 65536 uint64 cumulative counts keyed by the first two digest bytes
+"""
+import heapq
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b'KNOWNHS1'
+HEADER = struct.Struct('<8sIIQ')
+FANOUT_ENTRIES = 65536
+DIGEST_SIZES = {'md5': 16, 'sha1': 20, 'sha256': 32}
+NSRL_COLUMNS = {'md5': '"MD5"', 'sha1': '"SHA-1"', 'sha256': '"SHA-256"'}
+RUN_SIZE = 2000000  # digests sorted in memory per temporary run
+
+FLS_META_RE = re.compile(r'^[+\s]*\S+\s+(?:\*\s+)?([0-9]+(?:-[0-9]+)*)(?:\(realloc\))?:')
+
+
+def _hash_column(header_line, hash_type):
+    """Return the column index of hash_type in an NSRL header, or None for plain lists"""
+    columns = header_line.strip().split(',')
+    if NSRL_COLUMNS[hash_type] in columns:
+        return columns.index(NSRL_COLUMNS[hash_type])
+    return None
+
+
+def _iter_digests(hash_list, hash_type):
+    """Yield raw digests from an NSRL RDS file or a plain one-hash-per-line list"""
+    hex_len = DIGEST_SIZES[hash_type] * 2
+    column = None
+    with open(hash_list, 'r', encoding='utf-8', errors='ignore') as f:
+        for line_num, line in enumerate(f, 1):
+            if line_num == 1:
+                column = _hash_column(line, hash_type)
+                if column is not None:
+                    continue
+            if column is not None:
+                parts = line.split(',', column + 1)
+                if len(parts) <= column:
+                    continue
+                value = parts[column].strip().strip('"')
+            else:
+                value = line.strip().split(None, 1)[0] if line.strip() else ''
+            if len(value) != hex_len:
+                continue
+            try:
+                yield bytes.fromhex(value)
+            except ValueError:
+                continue
+
+
+def _write_run(digests, temp_dir):
+    """Sort one chunk of digests and spill it to a temporary run file"""
+    digests.sort()
+    fd, path = tempfile.mkstemp(prefix='known_run_', dir=temp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(b''.join(digests))
+    return path
+
+
+def _read_run(path, digest_size):
+    """Stream fixed-width digests back out of a run file"""
+    with open(path, 'rb', buffering=1024 * 1024) as f:
+        while True:
+            digest = f.read(digest_size)
+            if len(digest) < digest_size:
+                return
+            yield digest
+
+
+def build_known_set(hash_list, output_file, hash_type='md5', temp_dir=None):
+    """Build a sorted binary hash set from a reference hash list using an external merge sort"""
+    digest_size = DIGEST_SIZES[hash_type]
+    temp_dir = temp_dir or os.path.dirname(os.path.abspath(output_file))
+    runs = []
+    chunk = []
+
+    try:
+        for digest in _iter_digests(hash_list, hash_type):
+            chunk.append(digest)
+            if len(chunk) >= RUN_SIZE:
+                runs.append(_write_run(chunk, temp_dir))
+                chunk = []
+        if chunk:
+            runs.append(_write_run(chunk, temp_dir))
+        chunk = []
+
+        fanout = array('Q', bytes(8 * FANOUT_ENTRIES))
+        count = 0
+        previous = None
+        tmp_output = output_file + '.tmp'
+
+        with open(tmp_output, 'wb', buffering=1024 * 1024) as out:
+            out.write(HEADER.pack(MAGIC, digest_size, 0, 0))
+            merged = heapq.merge(*[_read_run(path, digest_size) for path in runs])
+            for digest in merged:
+                if digest == previous:
+                    continue
+                out.write(digest)
+                fanout[(digest[0] << 8) | digest[1]] += 1
+                previous = digest
+                count += 1
+
+            total = 0
+            for i in range(FANOUT_ENTRIES):
+                total += fanout[i]
+                fanout[i] = total
+            out.write(fanout.tobytes())
+
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, digest_size, 0, count))
+
+        os.replace(tmp_output, output_file)
+        return count
+    finally:
+        for path in runs:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class KnownFileSet:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._file = open(db_file, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.digest_size, _, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a known-file hash set: {db_file}")
+
+        self._records_offset = HEADER.size
+        fanout_offset = self._records_offset + self.count * self.digest_size
+        self._fanout = array('Q')
+        self._fanout.frombytes(self._mm[fanout_offset:fanout_offset + 8 * FANOUT_ENTRIES])
+
+    def __contains__(self, value):
+        return self.contains(value)
+
+    def contains(self, value):
+        """Check whether a hex or raw digest is in the reference set"""
+        if isinstance(value, str):
+            if len(value) != self.digest_size * 2:
+                return False
+            try:
+                digest = bytes.fromhex(value)
+            except ValueError:
+                return False
+        else:
+            digest = value
+        if len(digest) != self.digest_size:
+            return False
+
+        bucket = (digest[0] << 8) | digest[1]
+        lo = self._fanout[bucket - 1] if bucket else 0
+        hi = self._fanout[bucket]
+        size = self.digest_size
+        base = self._records_offset
+        mm = self._mm
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + mid * size
+            candidate = mm[pos:pos + size]
+            if candidate < digest:
+                lo = mid + 1
+            elif candidate > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        """Release the mapping and file handle"""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_file_hashes(hash_file):
+    """Load the per-image meta address to content hash map written by process_disk_image.sh"""
+    file_hashes = {}
+    if os.path.exists(hash_file):
+        with open(hash_file, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    file_hashes[parts[0]] = parts[1].lower()
+    return file_hashes
+
+
+def fls_meta_address(entry):
+    """Extract the meta address from an fls listing line"""
+    match = FLS_META_RE.match(entry)
+    return match.group(1) if match else None
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'lookup'):
+        print("Usage: known_files.py build <hash_list> <output_db> [md5|sha1|sha256]")
+        print("       known_files.py lookup <known_db> <hash> [hash...]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == 'build':
+        if len(sys.argv) not in (4, 5):
+            print("Usage: known_files.py build <hash_list> <output_db> [md5|sha1|sha256]")
+            sys.exit(1)
+        hash_type = sys.argv[4] if len(sys.argv) == 5 else 'md5'
+        if hash_type not in DIGEST_SIZES:
+            print(f"Unsupported hash type: {hash_type}")
+            sys.exit(1)
+        count = build_known_set(sys.argv[2], sys.argv[3], hash_type)
+        print(f"Known-file set: {count} unique {hash_type} hashes written to {sys.argv[3]}")
+
+    elif command == 'lookup':
+        if len(sys.argv) < 4:
+            print("Usage: known_files.py lookup <known_db> <hash> [hash...]")
+            sys.exit(1)
+        known = KnownFileSet(sys.argv[2])
+        try:
+            for value in sys.argv[3:]:
+                print(f"{value}\t{'known' if known.contains(value.lower()) else 'unknown'}")
+        finally:
+            known.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Streaming NDJSON writer and reader shared by the converters and loaders.
+
+Output compression is chosen with NDJSON_COMPRESSION (none, gzip or zstd)
+and shows in the file extension: .json, .json.gz or .json.zst. zstd needs
+the zstandard package and falls back to gzip without it. Files are written
+under a hidden .part name and renamed when closed, so readers never pick up
+a half-written compressed stream.
+
+Writers given shared_fields produce envelope NDJSON: a header line
+{"_envelope": {...}} carries the fields every following row has in common
+(case, evidence hash, type, source, run times) and rows carry only the rest.
+A new header is written whenever the shared values change. Readers merge
+the current header into each row, so consumers see the full documents.
+
+Writers also leave a hidden sidecar index (.<name>.idx) with the byte
+offset of every INDEX_STRIDE-th record and, for timelines, each block's
+event time range. IndexedNDJSON mmaps it to jump straight to a record
+number or time range instead of reading the file from the start;
+build_index() creates it after the fact for uncompressed files.
+"""
+import gzip
+import io
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from converter_records import encode_rows, BATCH_ROWS
+from converter_stats import event_epoch, datetime_epoch
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_COMPRESSION = os.environ.get('NDJSON_COMPRESSION', 'none')
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+EXTENSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+NDJSON_SUFFIXES = ('.json', '.json.gz', '.json.zst')
+ENVELOPE_KEY = '_envelope'
+ENVELOPE_PREFIX = b'{"' + ENVELOPE_KEY.encode() + b'"'
+# Fields that are constant across a converter file or a run of same-source rows
+SHARED_FIELDS = ('@timestamp', 'case_id', 'evidence_hash', 'type', 'source', 'processed_time')
+_MISSING = object()
+
+INDEX_STRIDE = 1000  # records per index block
+INDEX_MAGIC = b'NDJIDX01'
+# magic, stride, reserved, record count, block count, time field name
+INDEX_HEADER = struct.Struct('<8sIIQQ32s')
+# block start offset, offset of the envelope header in force there, min and max event time
+INDEX_ENTRY = struct.Struct('<QQdd')
+NO_OFFSET = 2 ** 64 - 1
+PAGE_SIZE = 100
+
+
+def resolve_compression(compression):
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Unknown NDJSON compression '{compression}' (expected none, gzip or zstd)")
+    if compression == 'zstd' and zstandard is None:
+        print("zstandard is not installed, writing gzip instead", file=sys.stderr)
+        return 'gzip'
+    return compression
+
+
+def is_compressed(path):
+    return path.endswith(('.gz', '.zst'))
+
+
+def index_path(path):
+    """Sidecar index of an NDJSON file, hidden so loaders and globs never pick it up"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.idx')
+
+
+def write_index(path, stride, count, blocks, time_field=None):
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, stride, 0, count, len(blocks), (time_field or '').encode()))
+        for block in blocks:
+            f.write(INDEX_ENTRY.pack(*block))
+    os.replace(tmp_path, path)
+
+
+def expand(envelope, row):
+    """Full document for an envelope row"""
+    if not envelope:
+        return row
+    document = dict(envelope)
+    document.update(row)
+    return document
+
+
+class NDJSONWriter:
+    """Write one JSON document per line to base_path (+ .gz/.zst), optionally compressed.
+
+    With index_stride set, a sidecar index records where every stride-th
+    record starts (each block is its own gzip member or zstd frame, so
+    compressed files can be entered there too) and, given time_field, each
+    block's event time range.
+    """
+
+    def __init__(self, base_path, compression=None, level=None, shared_fields=None,
+                 index_stride=INDEX_STRIDE, time_field=None):
+        self.compression = resolve_compression(compression or DEFAULT_COMPRESSION)
+        self.level = level
+        self.path = base_path + EXTENSIONS[self.compression]
+        directory, name = os.path.split(self.path)
+        self.tmp_path = os.path.join(directory, f'.{name}.part')
+        self.count = 0
+        self.shared_fields = shared_fields
+        self.envelope = None
+        self.index_stride = index_stride
+        self.time_field = time_field
+        self.blocks = [] if index_stride else None
+
+        self.raw = open(self.tmp_path, 'wb')
+        self.binary = self._open_binary()
+
+    def _open_binary(self):
+        if self.compression == 'gzip':
+            # GzipFile writes its member header on open, so note where the member starts first
+            self.member_offset = self.raw.tell()
+            return gzip.GzipFile(filename='', fileobj=self.raw, mode='wb', compresslevel=self.level or GZIP_LEVEL)
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level or ZSTD_LEVEL).stream_writer(self.raw, closefd=False)
+        return self.raw
+
+    def _emit(self, text):
+        self.binary.write(text.encode('utf-8'))
+
+    def _start_block(self):
+        """Start an index block at the current position, in a fresh gzip member or zstd frame"""
+        if self.count:
+            if self.compression == 'gzip':
+                self.binary.close()
+                self.binary = self._open_binary()
+            elif self.compression == 'zstd':
+                self.binary.flush(zstandard.FLUSH_FRAME)
+        offset = self.member_offset if self.compression == 'gzip' else self.raw.tell()
+        # Repeat the envelope header at the top of each block, so a block can be read on its own
+        self.envelope = None
+        self.blocks.append([offset, offset if self.shared_fields else NO_OFFSET, math.nan, math.nan])
+
+    def _observe_times(self, records, event_times=None):
+        block = self.blocks[-1]
+        if event_times is None:
+            epochs = [event_epoch(record.get(self.time_field)) for record in records]
+        else:
+            epochs = map(datetime_epoch, event_times)
+        for epoch in epochs:
+            if epoch is not None:
+                _widen(block, epoch)
+
+    def _start_envelope(self, values):
+        """Write a header line if the shared values differ from the current envelope"""
+        if values != self.envelope:
+            shared = {field: value for field, value in zip(self.shared_fields, values) if value is not _MISSING}
+            self._emit(json.dumps({ENVELOPE_KEY: shared}) + '\n')
+            self.envelope = values
+
+    def write(self, record):
+        if self.blocks is not None and self.count % self.index_stride == 0:
+            self._start_block()
+        if self.time_field:
+            self._observe_times((record,))
+        if self.shared_fields:
+            self._start_envelope(tuple([record.get(field, _MISSING) for field in self.shared_fields]))
+            record = record.copy()
+            for field in self.shared_fields:
+                record.pop(field, None)
+        self._emit(json.dumps(record) + '\n')
+        self.count += 1
+
+    def write_rows(self, rows, shared, event_times=None):
+        """Write converter rows of one type (converter_records.Row) with the fields they share.
+
+        event_times, if given, holds each row's time_field already parsed
+        (what RunSummary.observe returns), so the index doesn't parse it again.
+        """
+        values = None
+        if self.shared_fields:
+            values = tuple([shared.get(field, _MISSING) for field in self.shared_fields])
+            shared = {key: value for key, value in shared.items() if key not in self.shared_fields}
+        start = 0
+        while start < len(rows):
+            size = BATCH_ROWS
+            if self.blocks is not None:
+                if self.count % self.index_stride == 0:
+                    self._start_block()
+                # Batches never straddle a block boundary
+                size = min(size, self.index_stride - self.count % self.index_stride)
+            if values is not None:
+                self._start_envelope(values)
+            batch = rows[start:start + size]
+            if self.time_field:
+                self._observe_times(batch, None if event_times is None else event_times[start:start + size])
+            self._emit(encode_rows(batch, shared))
+            self.count += len(batch)
+            start += len(batch)
+
+    def _write_index(self):
+        write_index(index_path(self.path), self.index_stride, self.count, self.blocks, self.time_field)
+
+    def _close_streams(self):
+        if self.binary is not self.raw:
+            self.binary.close()
+        self.raw.close()
+        self.binary = None
+
+    def close(self):
+        if self.binary is None:
+            return
+        self._close_streams()
+        # The index goes in first, so a visible data file always has its index
+        if self.blocks is not None:
+            self._write_index()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._close_streams()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_ndjson(path):
+    """Binary line stream of an NDJSON file, decompressed according to its extension"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+            open(path, 'rb'), closefd=True, read_across_frames=True))
+    return open(path, 'rb')
+
+
+def iter_records(path):
+    """Yield the documents of an NDJSON file of any supported compression, envelopes expanded"""
+    envelope = None
+    with open_ndjson(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if ENVELOPE_KEY in record:
+                envelope = record[ENVELOPE_KEY]
+                continue
+            yield expand(envelope, record)
+
+
+def _widen(block, epoch):
+    """Stretch a block's [min, max] event time to cover epoch; NaN bounds always give way"""
+    if not epoch >= block[2]:
+        block[2] = epoch
+    if not epoch <= block[3]:
+        block[3] = epoch
+
+
+def build_index(path, time_field=None, stride=INDEX_STRIDE):
+    """Write the sidecar index for an existing uncompressed NDJSON file in one pass"""
+    if is_compressed(path):
+        raise ValueError(f"{path} is compressed; only files written with an index can be entered mid-stream")
+    blocks = []
+    count = 0
+    position = 0
+    envelope_offset = NO_OFFSET
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(ENVELOPE_PREFIX):
+                envelope_offset = position
+            elif line.strip():
+                if count % stride == 0:
+                    blocks.append([position, envelope_offset, math.nan, math.nan])
+                if time_field:
+                    epoch = event_epoch(json.loads(line).get(time_field))
+                    if epoch is not None:
+                        _widen(blocks[-1], epoch)
+                count += 1
+            position += len(line)
+    write_index(index_path(path), stride, count, blocks, time_field)
+    return count
+
+
+class IndexedNDJSON:
+    """Random access by record number or event time to an NDJSON file with a sidecar index"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(index_path(path), 'rb') as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.stride, _, self.count, self.block_count, time_field = INDEX_HEADER.unpack_from(self.index)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path(path)} is not an NDJSON index")
+        self.time_field = time_field.rstrip(b'\0').decode() or None
+        self.data = None
+        if not is_compressed(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def block(self, number):
+        return INDEX_ENTRY.unpack_from(self.index, INDEX_HEADER.size + number * INDEX_ENTRY.size)
+
+    def _lines_from(self, offset):
+        """Raw lines from a block offset to the end of the file"""
+        if self.data is not None:
+            data = self.data
+            while offset < len(data):
+                end = data.find(b'\n', offset)
+                end = len(data) if end < 0 else end + 1
+                yield data[offset:end]
+                offset = end
+            return
+        with open(self.path, 'rb') as raw:
+            raw.seek(offset)
+            # Blocks start a gzip member or zstd frame, so decompression can begin right here
+            if self.path.endswith('.gz'):
+                stream = gzip.GzipFile(fileobj=raw, mode='rb')
+            else:
+                stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+            yield from stream
+
+    def _iter_records(self, block_number, skip=0, stop=None):
+        """Yield (record_number, record) from the start of a block; the first skip records are not parsed"""
+        offset, envelope_offset, _, _ = self.block(block_number)
+        envelope = None
+        if envelope_offset not in (NO_OFFSET, offset):
+            # Indexed after the fact: the header in force was written before the block started
+            end = self.data.find(b'\n', envelope_offset)
+            envelope = json.loads(self.data[envelope_offset:end])[ENVELOPE_KEY]
+        number = block_number * self.stride
+        for line in self._lines_from(offset):
+            if line.startswith(ENVELOPE_PREFIX):
+                envelope = json.loads(line)[ENVELOPE_KEY]
+                continue
+            if not line.strip():
+                continue
+            if stop is not None and number >= stop:
+                return
+            if number - block_number * self.stride >= skip:
+                yield number, expand(envelope, json.loads(line))
+            number += 1
+
+    def records(self, start, count=PAGE_SIZE):
+        """count records starting at record number start (0-based)"""
+        if start < 0 or start >= self.count or count <= 0:
+            return []
+        block_number = start // self.stride
+        skip = start - block_number * self.stride
+        return [record for _, record in self._iter_records(block_number, skip, start + count)]
+
+    def page(self, number, page_size=PAGE_SIZE):
+        """One page of records, numbered from 1"""
+        return self.records((number - 1) * page_size, page_size)
+
+    def time_range(self, start, end, limit=PAGE_SIZE, skip=0):
+        """Records whose time field lies in [start, end] (epoch seconds), reading only blocks that overlap"""
+        if self.time_field is None:
+            raise ValueError(f"{self.path} has no time index")
+        entries = self.index[INDEX_HEADER.size:INDEX_HEADER.size + self.block_count * INDEX_ENTRY.size]
+        results = []
+        for block_number, (_, _, low, high) in enumerate(INDEX_ENTRY.iter_unpack(entries)):
+            if math.isnan(low) or high < start or low > end:
+                continue
+            for _, record in self._iter_records(block_number, stop=(block_number + 1) * self.stride):
+                epoch = event_epoch(record.get(self.time_field))
+                if epoch is None or not start <= epoch <= end:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                results.append(record)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def close(self):
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_indexed(path):
+    """IndexedNDJSON for a file, or None if it has no sidecar index"""
+    if not os.path.exists(index_path(path)):
+        return None
+    return IndexedNDJSON(path)
+
+
+def benchmark(sample_file, repeat=1):
+    """Compare output size and CPU time of each compression on a real converter output file"""
+    records = list(iter_records(sample_file))
+    if not records:
+        print(f"No records in {sample_file}")
+        return []
+
+    candidates = [('none', None), ('gzip', 1), ('gzip', 6), ('gzip', 9)]
+    if zstandard is not None:
+        candidates += [('zstd', 1), ('zstd', 3), ('zstd', 9), ('zstd', 19)]
+    # The envelope layout against the plain baseline and the default compression
+    candidates = [(compression, level, None) for compression, level in candidates]
+    candidates += [('none', None, SHARED_FIELDS), ('gzip', GZIP_LEVEL, SHARED_FIELDS)]
+
+    directory = os.path.dirname(os.path.abspath(sample_file))
+    results = []
+    for compression, level, shared_fields in candidates:
+        base = os.path.join(directory, f'.ndjson_benchmark_{compression}_{level}.json')
+        write_cpu = read_cpu = 0.0
+        for _ in range(repeat):
+            started = time.process_time()
+            with NDJSONWriter(base, compression, level, shared_fields) as writer:
+                for record in records:
+                    writer.write(record)
+            write_cpu += time.process_time() - started
+
+            started = time.process_time()
+            count = sum(1 for _ in iter_records(writer.path))
+            read_cpu += time.process_time() - started
+        size = os.path.getsize(writer.path)
+        os.remove(writer.path)
+        os.remove(index_path(writer.path))
+        results.append({
+            'compression': compression,
+            'level': level,
+            'envelope': shared_fields is not None,
+            'bytes': size,
+            'bytes_per_record': round(size / count, 1),
+            'write_cpu_seconds': round(write_cpu / repeat, 3),
+            'read_cpu_seconds': round(read_cpu / repeat, 3)
+        })
+
+    baseline = results[0]['bytes']
+    print(f"{len(records)} records from {sample_file}")
+    print(f"{'mode':<10}{'level':>6}{'envelope':>10}{'size MiB':>11}{'ratio':>8}{'write s':>10}{'read s':>9}")
+    for result in results:
+        print(f"{result['compression']:<10}{str(result['level'] or '-'):>6}{'yes' if result['envelope'] else 'no':>10}"
+              f"{result['bytes'] / 1048576:>11.2f}{baseline / result['bytes']:>8.2f}"
+              f"{result['write_cpu_seconds']:>10.3f}{result['read_cpu_seconds']:>9.3f}")
+    return results
+
+
+def main():
+    actions = ('cat', 'benchmark', 'index', 'page', 'range')
+    if len(sys.argv) < 3 or sys.argv[1] not in actions:
+        print("Usage: ndjson_io.py cat <ndjson_file>")
+        print("       ndjson_io.py benchmark <ndjson_file> [repeat]")
+        print("       ndjson_io.py index <ndjson_file> [time_field]")
+        print("       ndjson_io.py page <ndjson_file> <page> [page_size]")
+        print("       ndjson_io.py range <ndjson_file> <start> <end> [limit]")
+        sys.exit(1)
+
+    action, path = sys.argv[1], sys.argv[2]
+    if action == 'cat':
+        for record in iter_records(path):
+            sys.stdout.write(json.dumps(record) + '\n')
+    elif action == 'benchmark':
+        benchmark(path, int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+    elif action == 'index':
+        count = build_index(path, sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"Indexed {count} records in {index_path(path)}")
+    else:
+        reader = open_indexed(path)
+        if reader is None:
+            print(f"No index for {path}; run: ndjson_io.py index {path}")
+            sys.exit(1)
+        with reader:
+            started = time.perf_counter()
+            if action == 'page' and len(sys.argv) in (4, 5):
+                page_size = int(sys.argv[4]) if len(sys.argv) == 5 else PAGE_SIZE
+                records = reader.page(int(sys.argv[3]), page_size)
+            elif action == 'range' and len(sys.argv) in (5, 6):
+                start, end = event_epoch(sys.argv[3]), event_epoch(sys.argv[4])
+                if start is None or end is None:
+                    print("start and end must be epoch seconds or ISO timestamps")
+                    sys.exit(1)
+                records = reader.time_range(start, end, int(sys.argv[5]) if len(sys.argv) == 6 else PAGE_SIZE)
+            else:
+                print(f"Invalid arguments for {action}")
+                sys.exit(1)
+            elapsed = (time.perf_counter() - started) * 1000
+            for record in records:
+                sys.stdout.write(json.dumps(record) + '\n')
+            print(f"{len(records)} of {len(reader)} records ({elapsed:.1f} ms)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
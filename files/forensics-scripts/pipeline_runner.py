@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Local DAG runner for evidence processing on one tool node.
+
+Each evidence type is a set of steps (hashing, metadata, fsstat, fls,
+mactime, the IOC and YARA scans, Volatility plugins, conversion) that
+declare the files they read and write. A step becomes ready once every
+step producing one of its inputs has finished, and ready steps run
+concurrently under two slot pools: io for steps that mostly stream the
+evidence from disk and cpu for steps that mostly compute. Steps that lead
+the longest chains start first. Step results are cached with the stage
+manifests of stage_manifest.py, so a rerun only repeats what failed or
+changed.
+
+Slot counts default to PIPELINE_CPU_SLOTS (all cores) and
+PIPELINE_IO_SLOTS (2). The run summary, with per-step timings, is written
+to <working_dir>/logs/pipeline_<timestamp>.json.
+"""
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from stage_manifest import StageManifests
+
+CPU_SLOTS = int(os.environ.get('PIPELINE_CPU_SLOTS', os.cpu_count() or 1))
+IO_SLOTS = int(os.environ.get('PIPELINE_IO_SLOTS', 2))
+RESOURCES = ('cpu', 'io')
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = '/data/processed'
+HASH_CHUNK = 4 * 1024 * 1024
+
+
+class Node:
+    """One pipeline step: a shell command (run by bash) or a callable, with declared inputs and outputs.
+
+    A failed optional step does not block the steps that depend on it, the
+    way the shell scripts carry on past a tool that exits with errors.
+    Steps that publish write outside the working directory (converter
+    output in /data/processed) and are left out of benchmarks.
+    """
+
+    def __init__(self, name, command, inputs=(), outputs=(), resource='cpu', tool=None,
+                 params=None, optional=False, after=(), publishes=False):
+        if resource not in RESOURCES:
+            raise ValueError(f"Step {name}: unknown resource '{resource}'")
+        self.name = name
+        self.command = command
+        self.inputs = [os.path.abspath(path) for path in inputs]
+        self.outputs = [os.path.abspath(path) for path in outputs]
+        self.resource = resource
+        self.tool = tool
+        self.params = params or {}
+        self.optional = optional
+        self.after = set(after)
+        self.publishes = publishes
+
+
+def hash_evidence(evidence_path, target):
+    """MD5, SHA1 and SHA256 of the evidence in one read, in the layout validateEvidence writes"""
+    digests = [hashlib.md5(), hashlib.sha1(), hashlib.sha256()]
+    with open(evidence_path, 'rb') as f:
+        for chunk in iter(partial(f.read, HASH_CHUNK), b''):
+            for digest in digests:
+                digest.update(chunk)
+    md5, sha1, sha256 = (digest.hexdigest() for digest in digests)
+    with open(target, 'w') as f:
+        f.write("=== File Integrity Verification ===\n"
+                f"File: {evidence_path}\n"
+                f"Size: {os.path.getsize(evidence_path)}\n"
+                f"MD5: {md5}\nSHA1: {sha1}\nSHA256: {sha256}\n")
+
+
+def _evidence_file(output_dir, name):
+    """Hash and metadata files sit in the working directory, where validateEvidence and
+    generateMetadata write them; with the same stage names and tokens, a step Jenkins
+    already ran is skipped here instead of both sides evicting each other's manifest"""
+    return os.path.join(os.path.dirname(output_dir), name)
+
+
+def _common_nodes(evidence, output_dir, evidence_type):
+    """Hashing, metadata and the IOC scan, which every evidence type runs"""
+    q = shlex.quote
+    e = q(evidence)
+    hashes = _evidence_file(output_dir, 'evidence_hashes.txt')
+    metadata = _evidence_file(output_dir, 'evidence_metadata.txt')
+    iocs = os.path.join(output_dir, 'iocs.txt')
+    if evidence_type == 'malware':
+        ioc_command = (f"strings {e} | grep -oE '[a-fA-F0-9]{{32}}|[a-fA-F0-9]{{40}}|[a-fA-F0-9]{{64}}' "
+                       f"| head -50 > {q(iocs)} || true")
+    else:
+        ioc_command = (f"{{ grep -aoE '([0-9]{{1,3}}\\.){{3}}[0-9]{{1,3}}' {e} | head -100; "
+                       f"grep -aoE '[a-zA-Z0-9.-]+\\.[a-zA-Z]{{2,}}' {e} | head -100; "
+                       f"grep -aoE '[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{{2,}}' {e} | head -50; }} "
+                       f"> {q(iocs)} || true")
+    return [
+        Node('evidence_hashes', partial(hash_evidence, evidence, hashes),
+             inputs=[evidence], outputs=[hashes], resource='io'),
+        Node('evidence_metadata',
+             f"{{ echo '=== Evidence Metadata ==='; echo File: {e}; echo \"Type: $(file {e})\"; "
+             f"echo \"Size: $(stat -c%s {e}) bytes\"; echo \"Modified: $(stat -c%y {e})\"; "
+             f"echo \"Permissions: $(stat -c%a {e})\"; "
+             f"echo \"Header (hex): $(head -c 48 {e} | hexdump -C)\"; "
+             f"echo \"Strings preview: $(strings {e} | head -10)\"; }} > {q(metadata)}",
+             inputs=[evidence], outputs=[metadata], resource='io'),
+        Node('ioc_scan', ioc_command, inputs=[evidence], outputs=[iocs], resource='io',
+             params={'evidence_type': evidence_type}),
+    ]
+
+
+def _convert_node(converter, output_dir, case_id, inputs, tool_dir, extra_args='', with_hash=True):
+    """Run a *_to_json converter once its inputs exist, passing the SHA256 from evidence_hashes.txt"""
+    q = shlex.quote
+    script = os.path.join(SCRIPTS_DIR, converter)
+    command = f"NDJSON_COMPRESSION=${{NDJSON_COMPRESSION:-gzip}} python3 {q(script)} {q(output_dir)} {q(case_id)}"
+    inputs = [script] + inputs
+    if with_hash:
+        hashes = _evidence_file(output_dir, 'evidence_hashes.txt')
+        command += f" \"$(sed -n 's/^SHA256: //p' {q(hashes)})\""
+        inputs.append(hashes)
+    if extra_args:
+        command += ' ' + extra_args
+    return Node('convert', command, inputs=inputs,
+                outputs=[os.path.join(PROCESSED_DIR, tool_dir, f'*_{case_id}_*.json*')],
+                params={'case_id': case_id, 'compression': os.environ.get('NDJSON_COMPRESSION', 'gzip')},
+                publishes=True)
+
+
+def disk_pipeline(evidence, output_dir, case_id, analysis_level='standard'):
+    q = shlex.quote
+    e = q(evidence)
+    out = partial(os.path.join, output_dir)
+    tsk = 'fls -V'
+    nodes = _common_nodes(evidence, output_dir, 'disk') + [
+        Node('fsstat', f"fsstat {e} > {q(out('filesystem_info.txt'))} 2>&1", inputs=[evidence],
+             outputs=[out('filesystem_info.txt')], resource='io', tool=tsk, optional=True),
+        Node('file_listing', f"fls -r -p {e} > {q(out('file_listing.txt'))} 2>/dev/null", inputs=[evidence],
+             outputs=[out('file_listing.txt')], resource='io', tool=tsk, optional=True),
+        Node('interesting_files',
+             f"grep -E '\\.(doc|docx|pdf|jpg|jpeg|png|exe|dll|zip|rar|txt|log)$' {q(out('file_listing.txt'))} "
+             f"> {q(out('interesting_files.txt'))} || true",
+             inputs=[out('file_listing.txt')], outputs=[out('interesting_files.txt')]),
+    ]
+    converter_inputs = [out('file_listing.txt')]
+    if analysis_level != 'basic':
+        nodes += [
+            Node('fls_bodyfile', f"fls -r -p -m / {e} > {q(out('timeline.bodyfile'))} 2>/dev/null",
+                 inputs=[evidence], outputs=[out('timeline.bodyfile')], resource='io', tool=tsk, optional=True),
+            Node('mactime', f"mactime -b {q(out('timeline.bodyfile'))} > {q(out('timeline.csv'))} 2>/dev/null",
+                 inputs=[out('timeline.bodyfile')], outputs=[out('timeline.csv')], tool=tsk, optional=True),
+        ]
+        converter_inputs.append(out('timeline.csv'))
+
+    known_db = os.environ.get('KNOWN_FILES_DB', '/opt/forensics/known/nsrl_md5.bin')
+    known_hash = os.environ.get('KNOWN_FILES_HASH', 'md5')
+    known_mode = os.environ.get('KNOWN_FILES_MODE', 'tag')
+    if os.path.exists(known_db):
+        nodes.append(Node(
+            'file_hashes',
+            f"fls -r -F -u -p {e} 2>/dev/null | while IFS=$'\\t' read -r entry path; do "
+            f"meta=$(echo \"$entry\" | awk '{{print $NF}}' | sed 's/(realloc)//; s/:$//'); "
+            f"echo \"$meta $(icat {e} \"$meta\" 2>/dev/null | {known_hash}sum | cut -d' ' -f1)\"; "
+            f"done > {q(out('file_hashes.txt'))}",
+            inputs=[evidence], outputs=[out('file_hashes.txt')], resource='io', tool=tsk,
+            params={'algorithm': known_hash}, optional=True))
+        converter_inputs.append(out('file_hashes.txt'))
+
+    convert = _convert_node('autopsy_to_json.py', output_dir, case_id, converter_inputs + [known_db], 'autopsy',
+                            f"{q(known_db)} {q(known_mode)}")
+    convert.params['known_mode'] = known_mode
+    return nodes + [convert]
+
+
+VOLATILITY_PLUGINS = {
+    'basic': [('windows.info', 'sysinfo.txt'), ('windows.pslist', 'processes.txt'),
+              ('windows.netstat', 'network_connections.txt')],
+    'standard': [('windows.pstree', 'process_tree.txt'), ('windows.malfind', 'malfind.txt'),
+                 ('windows.filescan', 'file_scan.txt'), ('windows.handles', 'handles.txt')],
+    'comprehensive': [('windows.registry.hivelist', 'registry_hives.txt'), ('windows.cmdline', 'cmdline.txt')]
+}
+ANALYSIS_LEVELS = ('basic', 'standard', 'comprehensive')
+
+
+def memory_pipeline(evidence, output_dir, case_id, analysis_level='standard'):
+    q = shlex.quote
+    out = partial(os.path.join, output_dir)
+    nodes = _common_nodes(evidence, output_dir, 'memory')
+    levels = ANALYSIS_LEVELS[:ANALYSIS_LEVELS.index(analysis_level) + 1]
+    for level in levels:
+        for plugin, output in VOLATILITY_PLUGINS[level]:
+            # Plugins parse the whole dump into memory structures, so they count against cpu slots
+            nodes.append(Node(plugin, f"volatility3 -f {q(evidence)} {plugin} > {q(out(output))} 2>/dev/null",
+                              inputs=[evidence], outputs=[out(output)], tool='volatility3 -h', optional=True))
+    return nodes + [_convert_node('volatility_to_json.py', output_dir, case_id,
+                                  [out('processes.txt'), out('network_connections.txt')], 'volatility')]
+
+
+def malware_pipeline(evidence, output_dir, case_id, analysis_level='standard'):
+    q = shlex.quote
+    e = q(evidence)
+    out = partial(os.path.join, output_dir)
+    rules = '/opt/yara-rules'
+    return _common_nodes(evidence, output_dir, 'malware') + [
+        Node('file_type', f"file {e} > {q(out('file_type.txt'))}", inputs=[evidence],
+             outputs=[out('file_type.txt')], resource='io'),
+        Node('strings', f"strings {e} | head -1000 > {q(out('strings.txt'))}", inputs=[evidence],
+             outputs=[out('strings.txt')], resource='io'),
+        Node('hexdump', f"xxd {e} | head -1000 > {q(out('hexdump.txt'))}", inputs=[evidence],
+             outputs=[out('hexdump.txt')], resource='io', optional=True),
+        Node('yara',
+             f"if [ -d {rules} ]; then yara -r {rules} {e} > {q(out('yara_matches.txt'))} || true; "
+             f"else echo 'No YARA rules found' > {q(out('yara_matches.txt'))}; fi",
+             inputs=[evidence, rules], outputs=[out('yara_matches.txt')], tool='yara -v'),
+        _convert_node('malware_to_json.py', output_dir, case_id,
+                      [out('file_type.txt'), out('yara_matches.txt'), out('strings.txt')], 'cape'),
+    ]
+
+
+def mobile_pipeline(evidence, output_dir, case_id, analysis_level='standard'):
+    q = shlex.quote
+    out = partial(os.path.join, output_dir)
+    extracted = [out(name) for name in ('contacts.csv', 'messages.csv', 'calls.csv', 'apps.txt')]
+    nodes = [
+        Node('andriller', f"andriller -e {q(evidence)} -o {q(output_dir)}", inputs=[evidence], outputs=extracted,
+             resource='io', tool='andriller --version', optional=True),
+    ]
+    return nodes + [_convert_node('andriller_to_json.py', output_dir, case_id, extracted, 'andriller',
+                                  with_hash=False)]
+
+
+PIPELINES = {
+    'disk': disk_pipeline,
+    'memory': memory_pipeline,
+    'malware': malware_pipeline,
+    'mobile': mobile_pipeline
+}
+
+
+class PipelineRunner:
+    """Run a DAG of Nodes with at most slots[resource] steps of each resource at once"""
+
+    def __init__(self, nodes, slots=None, stage_dir=None, log_dir=None):
+        self.nodes = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise ValueError(f"Duplicate step name '{node.name}'")
+            self.nodes[node.name] = node
+        self.slots = slots or {'cpu': CPU_SLOTS, 'io': IO_SLOTS}
+        for node in self.nodes.values():
+            if self.slots.get(node.resource, 0) < 1:
+                raise ValueError(f"Step {node.name} needs a {node.resource} slot but none are configured")
+        self.manifests = StageManifests(stage_dir) if stage_dir else None
+        self.log_dir = log_dir
+        self.tool_versions = {}
+        self.tool_lock = threading.Lock()
+        self.dependencies = self._dependencies()
+        self.rank = self._rank()
+
+    def _dependencies(self):
+        """Each step's upstream steps: the producers of its inputs plus any declared order"""
+        producers = {}
+        for node in self.nodes.values():
+            for path in node.outputs:
+                if path in producers:
+                    raise ValueError(f"{path} is produced by both {producers[path]} and {node.name}")
+                producers[path] = node.name
+        dependencies = {}
+        for node in self.nodes.values():
+            upstream = {producers[path] for path in node.inputs if path in producers} | node.after
+            unknown = upstream - set(self.nodes)
+            if unknown:
+                raise ValueError(f"Step {node.name} runs after unknown steps: {', '.join(sorted(unknown))}")
+            dependencies[node.name] = upstream - {node.name}
+        return dependencies
+
+    def _rank(self):
+        """Length of the longest chain each step leads, in steps; raises ValueError on a cycle"""
+        dependents = {name: set() for name in self.nodes}
+        for name, upstream in self.dependencies.items():
+            for parent in upstream:
+                dependents[parent].add(name)
+        rank = {}
+        visiting = set()
+
+        def visit(name):
+            if name in rank:
+                return rank[name]
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through {name}")
+            visiting.add(name)
+            rank[name] = 1 + max((visit(child) for child in dependents[name]), default=0)
+            visiting.discard(name)
+            return rank[name]
+
+        for name in self.nodes:
+            visit(name)
+        return rank
+
+    def waves(self):
+        """Steps grouped by depth, for printing the plan"""
+        depth = {}
+        remaining = dict(self.dependencies)
+        waves = []
+        while remaining:
+            wave = sorted(name for name, upstream in remaining.items() if not upstream - depth.keys())
+            for name in wave:
+                depth[name] = len(waves)
+                del remaining[name]
+            waves.append(wave)
+        return waves
+
+    def _tool_version(self, command):
+        with self.tool_lock:
+            if command not in self.tool_versions:
+                try:
+                    result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
+                    lines = (result.stdout or result.stderr).strip().splitlines()
+                    self.tool_versions[command] = lines[0] if lines else 'unknown'
+                except (OSError, subprocess.TimeoutExpired):
+                    self.tool_versions[command] = 'unknown'
+            return self.tool_versions[command]
+
+    def _tokens(self, node):
+        params = dict(node.params)
+        if node.tool:
+            params['tool'] = self._tool_version(node.tool)
+        return ([f'{name}={value}' for name, value in sorted(params.items())] +
+                [f'in:{path}' for path in node.inputs] + [f'out:{path}' for path in node.outputs])
+
+    def _execute(self, node):
+        """Run one step; returns (status, detail)"""
+        tokens = None
+        if self.manifests is not None:
+            tokens = self._tokens(node)
+            valid, reason = self.manifests.check(node.name, tokens)
+            if valid:
+                return 'cached', reason
+        for path in node.outputs:
+            if '*' not in path:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        if callable(node.command):
+            try:
+                node.command()
+            except Exception as e:
+                return 'failed', str(e)
+        else:
+            log_path = os.path.join(self.log_dir, f'{node.name}.log') if self.log_dir else os.devnull
+            with open(log_path, 'a') as log:
+                result = subprocess.run(['bash', '-c', node.command],
+                                        stdout=log, stderr=subprocess.STDOUT)
+            if result.returncode != 0:
+                return 'failed', f'exit {result.returncode}'
+        if tokens is not None:
+            self.manifests.record(node.name, tokens)
+        return 'ran', ''
+
+    def run(self):
+        """Run every step whose upstream succeeded; returns the summary dict"""
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+        results = {}
+        waiting = set(self.nodes)
+        busy = dict.fromkeys(RESOURCES, 0)
+        in_flight = {}
+        started_at = time.time()
+
+        with ThreadPoolExecutor(max_workers=sum(self.slots.values())) as executor:
+            while waiting or in_flight:
+                # A step whose upstream failed (and was not optional) cannot run at all
+                for name in sorted(waiting):
+                    if any(results.get(parent, {}).get('status') in ('failed', 'blocked')
+                           and not self.nodes[parent].optional for parent in self.dependencies[name]):
+                        waiting.discard(name)
+                        results[name] = {'status': 'blocked', 'resource': self.nodes[name].resource}
+                ready = [name for name in waiting if self.dependencies[name] <= results.keys()]
+                # Start the steps leading the longest chains first
+                for name in sorted(ready, key=lambda name: (-self.rank[name], name)):
+                    node = self.nodes[name]
+                    if busy[node.resource] >= self.slots[node.resource]:
+                        continue
+                    busy[node.resource] += 1
+                    waiting.discard(name)
+                    in_flight[executor.submit(self._execute, node)] = (node, time.time())
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node, started = in_flight.pop(future)
+                    busy[node.resource] -= 1
+                    try:
+                        status, detail = future.result()
+                    except Exception as e:
+                        status, detail = 'failed', str(e)
+                    results[node.name] = {
+                        'status': status,
+                        'detail': detail,
+                        'resource': node.resource,
+                        'start': round(started - started_at, 3),
+                        'seconds': round(time.time() - started, 3)
+                    }
+                    print(f"[{time.strftime('%H:%M:%S')}] {node.name}: {status}"
+                          f"{' (' + detail + ')' if detail else ''}", flush=True)
+
+        failed = sorted(name for name, result in results.items()
+                        if result['status'] == 'blocked'
+                        or (result['status'] == 'failed' and not self.nodes[name].optional))
+        return {
+            'slots': self.slots,
+            'elapsed_seconds': round(time.time() - started_at, 3),
+            'steps': results,
+            'failed': failed
+        }
+
+
+def build_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level='standard'):
+    if evidence_type not in PIPELINES:
+        raise ValueError(f"Unknown evidence type '{evidence_type}' (expected {', '.join(PIPELINES)})")
+    if analysis_level not in ANALYSIS_LEVELS:
+        raise ValueError(f"Unknown analysis level '{analysis_level}'")
+    if not os.path.exists(evidence_path):
+        raise ValueError(f"Evidence not found: {evidence_path}")
+    output_dir = os.path.join(os.path.abspath(working_dir), 'output')
+    return PIPELINES[evidence_type](os.path.abspath(evidence_path), output_dir, case_id, analysis_level)
+
+
+def run_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level='standard', slots=None):
+    nodes = build_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level)
+    runner = PipelineRunner(nodes, slots, stage_dir=os.path.join(working_dir, '.stages'),
+                            log_dir=os.path.join(working_dir, 'logs', 'pipeline'))
+    summary = runner.run()
+    summary_path = os.path.join(working_dir, 'logs', f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Pipeline finished in {summary['elapsed_seconds']:.1f}s, summary in {summary_path}")
+    return summary
+
+
+def benchmark(evidence_type, evidence_path, scratch_dir, case_id, analysis_level='standard'):
+    """Time the local steps run one at a time against the slot-limited concurrent run, without caching"""
+    timings = {}
+    for label in ('serial', 'concurrent'):
+        working_dir = os.path.join(scratch_dir, label)
+        nodes = [node for node in build_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level)
+                 if not node.publishes]
+        slots = None
+        if label == 'serial':
+            # One step at a time: every step shares a single slot
+            for node in nodes:
+                node.resource = 'cpu'
+            slots = {'cpu': 1, 'io': 1}
+        summary = PipelineRunner(nodes, slots, log_dir=os.path.join(working_dir, 'logs')).run()
+        timings[label] = summary['elapsed_seconds']
+    print(f"{evidence_type} pipeline, {len(nodes)} local steps: serial {timings['serial']:.2f}s, "
+          f"concurrent {timings['concurrent']:.2f}s (cpu={CPU_SLOTS}, io={IO_SLOTS})")
+    return timings
+
+
+def main():
+    actions = ('run', 'plan', 'benchmark')
+    if len(sys.argv) not in (6, 7) or sys.argv[1] not in actions:
+        print("Usage: pipeline_runner.py run <evidence_type> <evidence_path> <working_dir> <case_id> [analysis_level]")
+        print("       pipeline_runner.py plan <evidence_type> <evidence_path> <working_dir> <case_id> [analysis_level]")
+        print("       pipeline_runner.py benchmark <evidence_type> <evidence_path> <scratch_dir> <case_id> [analysis_level]")
+        sys.exit(1)
+
+    action, evidence_type, evidence_path, working_dir, case_id = sys.argv[1:6]
+    analysis_level = sys.argv[6] if len(sys.argv) == 7 else 'standard'
+    try:
+        if action == 'run':
+            summary = run_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level)
+            if summary['failed']:
+                print(f"Failed or blocked steps: {', '.join(summary['failed'])}")
+                sys.exit(1)
+        elif action == 'plan':
+            nodes = build_pipeline(evidence_type, evidence_path, working_dir, case_id, analysis_level)
+            runner = PipelineRunner(nodes)
+            for depth, wave in enumerate(runner.waves()):
+                print(f"{depth}: " + ', '.join(f"{name} [{runner.nodes[name].resource}]" for name in wave))
+        else:
+            benchmark(evidence_type, evidence_path, working_dir, case_id, analysis_level)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
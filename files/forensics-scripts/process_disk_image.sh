@@ -23,29 +23,67 @@ if [ ! -f "$IMAGE_FILE" ]; then
     exit 1
 fi
 
+# Stages whose manifest still matches are skipped on a rerun
+source "$(dirname "$0")/stage_lib.sh"
+TSK_VERSION=$(tool_version fls -V)
+
 # Calculate file hash for integrity
-echo "[$(date)] Calculating file hash..."
-sha256sum "$IMAGE_FILE" > "$OUTPUT_DIR/image_hash.txt"
-FILE_HASH=$(sha256sum "$IMAGE_FILE" | cut -d' ' -f1)
+hash_image() {
+    echo "[$(date)] Calculating file hash..."
+    sha256sum "$IMAGE_FILE" > "$OUTPUT_DIR/image_hash.txt"
+}
+run_stage image_hash "in:$IMAGE_FILE" "out:$OUTPUT_DIR/image_hash.txt" -- hash_image
+FILE_HASH=$(cut -d' ' -f1 "$OUTPUT_DIR/image_hash.txt")
 
 # Generate filesystem timeline using Sleuth Kit
-echo "[$(date)] Generating filesystem timeline..."
 export PATH="/opt/forensics/sleuthkit/bin:$PATH"
-fls -r -p -m "/" "$IMAGE_FILE" > "$OUTPUT_DIR/timeline.bodyfile" 2>/dev/null || echo "Warning: fls had errors"
-mactime -b "$OUTPUT_DIR/timeline.bodyfile" > "$OUTPUT_DIR/timeline.csv" 2>/dev/null || echo "Warning: mactime had errors"
+make_timeline() {
+    echo "[$(date)] Generating filesystem timeline..."
+    fls -r -p -m "/" "$IMAGE_FILE" > "$OUTPUT_DIR/timeline.bodyfile" 2>/dev/null || echo "Warning: fls had errors"
+    mactime -b "$OUTPUT_DIR/timeline.bodyfile" > "$OUTPUT_DIR/timeline.csv" 2>/dev/null || echo "Warning: mactime had errors"
+}
+run_stage timeline "evidence_hash=$FILE_HASH" "tool=$TSK_VERSION" \
+    "out:$OUTPUT_DIR/timeline.bodyfile" "out:$OUTPUT_DIR/timeline.csv" -- make_timeline
 
-# Extract file metadata
-echo "[$(date)] Extracting file listings..."
-fls -r -p "$IMAGE_FILE" > "$OUTPUT_DIR/file_listing.txt" 2>/dev/null || echo "Warning: file listing had errors"
+# Extract file metadata and search for interesting file types
+list_files() {
+    echo "[$(date)] Extracting file listings..."
+    fls -r -p "$IMAGE_FILE" > "$OUTPUT_DIR/file_listing.txt" 2>/dev/null || echo "Warning: file listing had errors"
+    echo "[$(date)] Searching for interesting files..."
+    if [ -f "$OUTPUT_DIR/file_listing.txt" ]; then
+        grep -E '\.(doc|docx|pdf|jpg|jpeg|png|exe|dll|zip|rar|txt|log)$' "$OUTPUT_DIR/file_listing.txt" > "$OUTPUT_DIR/interesting_files.txt" || echo "No interesting files found"
+    fi
+}
+run_stage file_listing "evidence_hash=$FILE_HASH" "tool=$TSK_VERSION" \
+    "out:$OUTPUT_DIR/file_listing.txt" "out:$OUTPUT_DIR/interesting_files.txt" -- list_files
 
-# Search for interesting file types
-echo "[$(date)] Searching for interesting files..."
-if [ -f "$OUTPUT_DIR/file_listing.txt" ]; then
-    grep -E '\.(doc|docx|pdf|jpg|jpeg|png|exe|dll|zip|rar|txt|log)$' "$OUTPUT_DIR/file_listing.txt" > "$OUTPUT_DIR/interesting_files.txt" || echo "No interesting files found"
+# Hash allocated regular files for known-file (NSRL) filtering
+KNOWN_FILES_DB="${KNOWN_FILES_DB:-/opt/forensics/known/nsrl_md5.bin}"
+KNOWN_FILES_HASH="${KNOWN_FILES_HASH:-md5}"
+KNOWN_FILES_MODE="${KNOWN_FILES_MODE:-tag}"
+hash_files() {
+    echo "[$(date)] Hashing files for known-file filtering..."
+    fls -r -F -u -p "$IMAGE_FILE" 2>/dev/null | while IFS=$'\t' read -r entry path; do
+        META_ADDR=$(echo "$entry" | awk '{print $NF}' | sed 's/(realloc)//; s/:$//')
+        CONTENT_HASH=$(icat "$IMAGE_FILE" "$META_ADDR" 2>/dev/null | ${KNOWN_FILES_HASH}sum | cut -d' ' -f1)
+        echo "$META_ADDR $CONTENT_HASH"
+    done > "$OUTPUT_DIR/file_hashes.txt" || echo "Warning: file hashing had errors"
+}
+if [ -f "$KNOWN_FILES_DB" ]; then
+    run_stage file_hashes "evidence_hash=$FILE_HASH" "tool=$TSK_VERSION" "algorithm=$KNOWN_FILES_HASH" \
+        "out:$OUTPUT_DIR/file_hashes.txt" -- hash_files
 fi
 
 # Convert results to JSON for Elasticsearch
-echo "[$(date)] Converting to JSON format..."
-python3 /opt/forensics/scripts/autopsy_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$FILE_HASH"
+# Converter NDJSON is gzip-compressed unless NDJSON_COMPRESSION says otherwise
+export NDJSON_COMPRESSION="${NDJSON_COMPRESSION:-gzip}"
+convert_results() {
+    echo "[$(date)] Converting to JSON format..."
+    python3 /opt/forensics/scripts/autopsy_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$FILE_HASH" "$KNOWN_FILES_DB" "$KNOWN_FILES_MODE"
+}
+run_stage convert "case_id=$CASE_ID" "evidence_hash=$FILE_HASH" "known_mode=$KNOWN_FILES_MODE" \
+    "compression=$NDJSON_COMPRESSION" "in:/opt/forensics/scripts/autopsy_to_json.py" "in:$KNOWN_FILES_DB" \
+    "in:$OUTPUT_DIR/timeline.csv" "in:$OUTPUT_DIR/file_listing.txt" "in:$OUTPUT_DIR/file_hashes.txt" \
+    "out:/data/processed/autopsy/*_${CASE_ID}_*.json*" -- convert_results
 
 echo "[$(date)] Disk image processing completed for case: $CASE_ID"
\ No newline at end of file
@@ -17,26 +17,47 @@ echo "[$(date)] Starting malware analysis for case: $CASE_ID"
 mkdir -p "$OUTPUT_DIR"
 mkdir -p "/data/processed/cape"
 
+# Stages whose manifest still matches are skipped on a rerun
+source "$(dirname "$0")/stage_lib.sh"
+
 # Basic file analysis
-echo "[$(date)] Performing basic file analysis..."
-file "$SAMPLE_FILE" > "$OUTPUT_DIR/file_type.txt"
-sha256sum "$SAMPLE_FILE" > "$OUTPUT_DIR/file_hash.txt"
-SAMPLE_HASH=$(sha256sum "$SAMPLE_FILE" | cut -d' ' -f1)
+analyze_file() {
+    echo "[$(date)] Performing basic file analysis..."
+    file "$SAMPLE_FILE" > "$OUTPUT_DIR/file_type.txt" && sha256sum "$SAMPLE_FILE" > "$OUTPUT_DIR/file_hash.txt"
+}
+run_stage file_analysis "in:$SAMPLE_FILE" "out:$OUTPUT_DIR/file_type.txt" "out:$OUTPUT_DIR/file_hash.txt" -- analyze_file
+SAMPLE_HASH=$(cut -d' ' -f1 "$OUTPUT_DIR/file_hash.txt")
 
 # YARA scanning (if rules exist)
-echo "[$(date)] Running YARA scans..."
-if [ -d "/opt/yara-rules" ]; then
-    yara -r /opt/yara-rules "$SAMPLE_FILE" > "$OUTPUT_DIR/yara_matches.txt" || echo "No YARA matches found"
-else
-    echo "No YARA rules found" > "$OUTPUT_DIR/yara_matches.txt"
-fi
+scan_yara() {
+    echo "[$(date)] Running YARA scans..."
+    if [ -d "/opt/yara-rules" ]; then
+        yara -r /opt/yara-rules "$SAMPLE_FILE" > "$OUTPUT_DIR/yara_matches.txt" || echo "No YARA matches found"
+    else
+        echo "No YARA rules found" > "$OUTPUT_DIR/yara_matches.txt"
+    fi
+}
+# The rules directory is an input, so updated rules rescan the sample
+run_stage yara "sample_hash=$SAMPLE_HASH" "tool=$(tool_version yara -v)" "in:/opt/yara-rules" \
+    "out:$OUTPUT_DIR/yara_matches.txt" -- scan_yara
 
 # String analysis
-echo "[$(date)] Extracting strings..."
-strings "$SAMPLE_FILE" | head -1000 > "$OUTPUT_DIR/strings.txt"
+extract_strings() {
+    echo "[$(date)] Extracting strings..."
+    strings "$SAMPLE_FILE" | head -1000 > "$OUTPUT_DIR/strings.txt"
+}
+run_stage strings "sample_hash=$SAMPLE_HASH" "out:$OUTPUT_DIR/strings.txt" -- extract_strings
 
 # Convert results to JSON
-echo "[$(date)] Converting to JSON format..."
-python3 /opt/forensics/scripts/malware_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$SAMPLE_HASH"
+# Converter NDJSON is gzip-compressed unless NDJSON_COMPRESSION says otherwise
+export NDJSON_COMPRESSION="${NDJSON_COMPRESSION:-gzip}"
+convert_results() {
+    echo "[$(date)] Converting to JSON format..."
+    python3 /opt/forensics/scripts/malware_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$SAMPLE_HASH"
+}
+run_stage convert "case_id=$CASE_ID" "sample_hash=$SAMPLE_HASH" "compression=$NDJSON_COMPRESSION" \
+    "in:/opt/forensics/scripts/malware_to_json.py" "in:$OUTPUT_DIR/file_type.txt" \
+    "in:$OUTPUT_DIR/yara_matches.txt" "in:$OUTPUT_DIR/strings.txt" \
+    "out:/data/processed/cape/*_${CASE_ID}_*.json*" -- convert_results
 
 echo "[$(date)] Malware analysis completed for case: $CASE_ID"
\ No newline at end of file
@@ -23,30 +23,53 @@ if [ ! -f "$MEMORY_DUMP" ]; then
     exit 1
 fi
 
+# Stages whose manifest still matches are skipped on a rerun
+source "$(dirname "$0")/stage_lib.sh"
+VOLATILITY_VERSION=$(tool_version volatility3 -h)
+
 # Calculate file hash
-echo "[$(date)] Calculating memory dump hash..."
-sha256sum "$MEMORY_DUMP" > "$OUTPUT_DIR/memory_hash.txt"
-MEMORY_HASH=$(sha256sum "$MEMORY_DUMP" | cut -d' ' -f1)
+hash_dump() {
+    echo "[$(date)] Calculating memory dump hash..."
+    sha256sum "$MEMORY_DUMP" > "$OUTPUT_DIR/memory_hash.txt"
+}
+run_stage memory_hash "in:$MEMORY_DUMP" "out:$OUTPUT_DIR/memory_hash.txt" -- hash_dump
+MEMORY_HASH=$(cut -d' ' -f1 "$OUTPUT_DIR/memory_hash.txt")
 
-# Run Volatility3 plugins
+# Run Volatility3 plugins, one stage each so a rerun only repeats the plugins that failed
 echo "[$(date)] Running Volatility3 analysis..."
+run_plugin() {
+    volatility3 -f "$MEMORY_DUMP" "$1" > "$OUTPUT_DIR/$2" 2>/dev/null
+}
+volatility_stage() {
+    local plugin="$1" output="$2" label="$3"
+    run_stage "$plugin" "evidence_hash=$MEMORY_HASH" "tool=$VOLATILITY_VERSION" "out:$OUTPUT_DIR/$output" \
+        -- run_plugin "$plugin" "$output" || echo "$label failed"
+}
 
 # System information
-volatility3 -f "$MEMORY_DUMP" windows.info > "$OUTPUT_DIR/sysinfo.txt" 2>/dev/null || echo "System info failed"
+volatility_stage windows.info sysinfo.txt "System info"
 
 # Process analysis
-volatility3 -f "$MEMORY_DUMP" windows.pslist > "$OUTPUT_DIR/processes.txt" 2>/dev/null || echo "Process list failed"
-volatility3 -f "$MEMORY_DUMP" windows.pstree > "$OUTPUT_DIR/process_tree.txt" 2>/dev/null || echo "Process tree failed"
-volatility3 -f "$MEMORY_DUMP" windows.cmdline > "$OUTPUT_DIR/cmdline.txt" 2>/dev/null || echo "Command line failed"
+volatility_stage windows.pslist processes.txt "Process list"
+volatility_stage windows.pstree process_tree.txt "Process tree"
+volatility_stage windows.cmdline cmdline.txt "Command line"
 
 # Network analysis
-volatility3 -f "$MEMORY_DUMP" windows.netstat > "$OUTPUT_DIR/network_connections.txt" 2>/dev/null || echo "Network connections failed"
+volatility_stage windows.netstat network_connections.txt "Network connections"
 
 # Malware detection
-volatility3 -f "$MEMORY_DUMP" windows.malfind > "$OUTPUT_DIR/malfind.txt" 2>/dev/null || echo "Malfind failed"
+volatility_stage windows.malfind malfind.txt "Malfind"
 
 # Convert results to JSON
-echo "[$(date)] Converting to JSON format..."
-python3 /opt/forensics/scripts/volatility_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$MEMORY_HASH"
+# Converter NDJSON is gzip-compressed unless NDJSON_COMPRESSION says otherwise
+export NDJSON_COMPRESSION="${NDJSON_COMPRESSION:-gzip}"
+convert_results() {
+    echo "[$(date)] Converting to JSON format..."
+    python3 /opt/forensics/scripts/volatility_to_json.py "$OUTPUT_DIR" "$CASE_ID" "$MEMORY_HASH"
+}
+run_stage convert "case_id=$CASE_ID" "evidence_hash=$MEMORY_HASH" "compression=$NDJSON_COMPRESSION" \
+    "in:/opt/forensics/scripts/volatility_to_json.py" "in:$OUTPUT_DIR/processes.txt" \
+    "in:$OUTPUT_DIR/network_connections.txt" \
+    "out:/data/processed/volatility/*_${CASE_ID}_*.json*" -- convert_results
 
 echo "[$(date)] Memory analysis completed for case: $CASE_ID"
\ No newline at end of file
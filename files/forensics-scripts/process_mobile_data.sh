@@ -17,12 +17,29 @@ echo "[$(date)] Starting mobile analysis for case: $CASE_ID"
 mkdir -p "$OUTPUT_DIR"
 mkdir -p "/data/processed/andriller"
 
+# Stages whose manifest still matches are skipped on a rerun
+source "$(dirname "$0")/stage_lib.sh"
+
 # Run Andriller extraction
-echo "[$(date)] Running Andriller analysis..."
-andriller -e "$MOBILE_DATA" -o "$OUTPUT_DIR" || echo "Andriller analysis completed with warnings"
+run_andriller() {
+    echo "[$(date)] Running Andriller analysis..."
+    andriller -e "$MOBILE_DATA" -o "$OUTPUT_DIR" || echo "Andriller analysis completed with warnings"
+}
+# Mobile extractions are often directories, so the data is keyed by its size and mtime rather than a hash
+run_stage andriller "in:$MOBILE_DATA" "tool=$(tool_version andriller --version)" \
+    "out:$OUTPUT_DIR/contacts.csv" "out:$OUTPUT_DIR/messages.csv" "out:$OUTPUT_DIR/calls.csv" \
+    "out:$OUTPUT_DIR/apps.txt" -- run_andriller
 
 # Convert results to JSON
-echo "[$(date)] Converting to JSON format..."
-python3 /opt/forensics/scripts/andriller_to_json.py "$OUTPUT_DIR" "$CASE_ID"
+# Converter NDJSON is gzip-compressed unless NDJSON_COMPRESSION says otherwise
+export NDJSON_COMPRESSION="${NDJSON_COMPRESSION:-gzip}"
+convert_results() {
+    echo "[$(date)] Converting to JSON format..."
+    python3 /opt/forensics/scripts/andriller_to_json.py "$OUTPUT_DIR" "$CASE_ID"
+}
+run_stage convert "case_id=$CASE_ID" "compression=$NDJSON_COMPRESSION" \
+    "in:/opt/forensics/scripts/andriller_to_json.py" "in:$OUTPUT_DIR/contacts.csv" "in:$OUTPUT_DIR/messages.csv" \
+    "in:$OUTPUT_DIR/calls.csv" "in:$OUTPUT_DIR/apps.txt" \
+    "out:/data/processed/andriller/*_${CASE_ID}_*.json*" -- convert_results
 
 echo "[$(date)] Mobile analysis completed for case: $CASE_ID"
\ No newline at end of file
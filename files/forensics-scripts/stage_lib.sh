@@ -0,0 +1,32 @@
+#!/bin/bash
+# Stage helpers for the process_*.sh scripts, sourced after OUTPUT_DIR is set.
+# A stage whose manifest in $STAGE_DIR still matches its parameters, inputs
+# and outputs is skipped, so a rerun only repeats what failed or changed.
+
+STAGE_MANIFEST="python3 $(dirname "${BASH_SOURCE[0]}")/stage_manifest.py"
+STAGE_DIR="${STAGE_DIR:-$OUTPUT_DIR/.stages}"
+
+# run_stage <stage> [name=value|in:<path>|out:<path>]... -- <command> [args...]
+# Runs the command unless the stage is up to date; records the manifest only if it succeeds.
+run_stage() {
+    local stage="$1"
+    shift
+    local tokens=()
+    while [ $# -gt 0 ] && [ "$1" != "--" ]; do
+        tokens+=("$1")
+        shift
+    done
+    shift
+    if $STAGE_MANIFEST check "$STAGE_DIR" "$stage" "${tokens[@]}"; then
+        return 0
+    fi
+    "$@" || return $?
+    $STAGE_MANIFEST record "$STAGE_DIR" "$stage" "${tokens[@]}"
+}
+
+# tool_version <command> [args...]: first line a tool prints about itself, or "unknown"
+tool_version() {
+    local version
+    version=$("$@" 2>&1 | head -1)
+    echo "${version:-unknown}"
+}
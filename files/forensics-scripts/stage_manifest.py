@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Stage manifests for resumable evidence processing.
+
+Each expensive step of forensicsCore.groovy and the process_*.sh scripts
+runs as a named stage of the evidence working directory. When a stage
+succeeds, <stage_dir>/<stage>.json records what it ran with (parameters
+such as the evidence hash, analysis level and tool version, and the size
+and mtime of every input) and the size and mtime of everything it
+produced. A rerun checks the manifest first and skips the stage while the
+parameters and inputs are unchanged and every output is still as the
+stage left it, so a build that failed in its last stage repeats only that
+stage. A stage that consumes another stage's output lists it as an input,
+so rerunning a stage invalidates everything downstream of it.
+
+Stages are described by tokens: name=value for a parameter, in:<path> for
+an input and out:<path> for an output. Inputs and outputs may be files or
+directories; an output may be a glob, which records the matching files
+written since the stage started (shared directories such as
+/data/processed hold other runs' output too).
+"""
+import glob
+import json
+import os
+import re
+import socket
+import sys
+import time
+
+STAGE_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+MANIFEST_VERSION = 1
+
+
+def parse_tokens(tokens):
+    """(params, inputs, outputs) from name=value, in:<path> and out:<path> tokens"""
+    params, inputs, outputs = {}, [], []
+    for token in tokens:
+        if token.startswith('in:'):
+            inputs.append(os.path.abspath(token[3:]))
+        elif token.startswith('out:'):
+            outputs.append(os.path.abspath(token[4:]))
+        elif '=' in token:
+            name, value = token.split('=', 1)
+            params[name] = value
+        else:
+            raise ValueError(f"Bad stage token '{token}' (expected name=value, in:<path> or out:<path>)")
+    return params, sorted(set(inputs)), sorted(set(outputs))
+
+
+def fingerprint(path):
+    """[size, mtime_ns] of a file, [files, total size, newest mtime_ns] of a directory, None if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not os.path.isdir(path):
+        return [stat.st_size, stat.st_mtime_ns]
+    files = size = newest = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            files += 1
+            size += stat.st_size
+            newest = max(newest, stat.st_mtime_ns)
+    return [files, size, newest]
+
+
+def expand_output(pattern, since_ns=None):
+    """Paths an output token stands for: itself, or for a glob the matches written since the stage started"""
+    if not glob.has_magic(pattern):
+        return [pattern]
+    paths = sorted(glob.glob(pattern))
+    if since_ns is not None:
+        paths = [path for path in paths if os.stat(path).st_mtime_ns >= since_ns]
+    return paths
+
+
+class StageManifests:
+    """The stage manifests of one working directory"""
+
+    def __init__(self, stage_dir):
+        self.stage_dir = stage_dir
+
+    def _path(self, stage, suffix='.json'):
+        # Stage names become file names, so never let one point outside the stage directory
+        if not STAGE_RE.match(stage):
+            raise ValueError(f"Invalid stage name '{stage}'")
+        return os.path.join(self.stage_dir, stage + suffix)
+
+    def load(self, stage):
+        try:
+            with open(self._path(stage)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def check(self, stage, tokens):
+        """(valid, reason): whether the stage can be skipped, and if not why"""
+        params, inputs, outputs = parse_tokens(tokens)
+        manifest = self.load(stage)
+        valid, reason = self._compare(manifest, params, inputs, outputs)
+        if not valid:
+            # Remember when this attempt started, so glob outputs only pick up what it writes
+            os.makedirs(self.stage_dir, exist_ok=True)
+            with open(self._path(stage, '.started'), 'w') as f:
+                f.write(str(time.time_ns()))
+        return valid, reason
+
+    def _compare(self, manifest, params, inputs, outputs):
+        if manifest is None:
+            return False, 'no manifest'
+        if manifest.get('version') != MANIFEST_VERSION:
+            return False, 'manifest from another version'
+        if manifest['params'] != params:
+            changed = sorted(set(params.items()) ^ set(manifest['params'].items()))
+            return False, f"parameters changed: {', '.join(sorted({name for name, _ in changed}))}"
+        if sorted(manifest['inputs']) != inputs:
+            return False, 'input list changed'
+        for path, recorded in manifest['inputs'].items():
+            if fingerprint(path) != recorded:
+                return False, f'input changed: {path}'
+        if sorted(manifest['output_patterns']) != outputs:
+            return False, 'output list changed'
+        for path, recorded in manifest['outputs'].items():
+            if fingerprint(path) != recorded:
+                return False, f'output missing or modified: {path}'
+        return True, 'up to date'
+
+    def record(self, stage, tokens):
+        """Write the manifest of a stage that just succeeded"""
+        params, inputs, outputs = parse_tokens(tokens)
+        started_path = self._path(stage, '.started')
+        try:
+            with open(started_path) as f:
+                since_ns = int(f.read())
+        except (FileNotFoundError, ValueError):
+            since_ns = None
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'stage': stage,
+            'params': params,
+            'inputs': {path: fingerprint(path) for path in inputs},
+            'output_patterns': outputs,
+            'outputs': {path: fingerprint(path)
+                        for pattern in outputs for path in expand_output(pattern, since_ns)},
+            'host': socket.gethostname(),
+            'started': since_ns / 1e9 if since_ns else None,
+            'recorded': time.time()
+        }
+        os.makedirs(self.stage_dir, exist_ok=True)
+        path = self._path(stage)
+        tmp_path = os.path.join(self.stage_dir, f'.{stage}.json.part')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+        if since_ns is not None:
+            os.remove(started_path)
+        return manifest
+
+    def clear(self, stage=None):
+        """Forget one stage, or every stage of the working directory; returns the count"""
+        if stage is not None:
+            stages = [stage]
+        elif os.path.isdir(self.stage_dir):
+            stages = [name[:-5] for name in os.listdir(self.stage_dir) if name.endswith('.json')]
+        else:
+            stages = []
+        cleared = 0
+        for name in stages:
+            for suffix in ('.json', '.started'):
+                try:
+                    os.remove(self._path(name, suffix))
+                    cleared += suffix == '.json'
+                except FileNotFoundError:
+                    pass
+        return cleared
+
+    def stages(self):
+        if not os.path.isdir(self.stage_dir):
+            return []
+        names = sorted(name[:-5] for name in os.listdir(self.stage_dir)
+                       if name.endswith('.json') and not name.startswith('.'))
+        return [manifest for manifest in map(self.load, names) if manifest]
+
+
+def main():
+    actions = ('check', 'record', 'list', 'clear')
+    if len(sys.argv) < 3 or sys.argv[1] not in actions:
+        print("Usage: stage_manifest.py check <stage_dir> <stage> [name=value|in:<path>|out:<path>] ...")
+        print("       stage_manifest.py record <stage_dir> <stage> [name=value|in:<path>|out:<path>] ...")
+        print("       stage_manifest.py list <stage_dir>")
+        print("       stage_manifest.py clear <stage_dir> [stage]")
+        sys.exit(2)
+
+    action = sys.argv[1]
+    manifests = StageManifests(sys.argv[2])
+    try:
+        if action in ('check', 'record') and len(sys.argv) >= 4:
+            stage, tokens = sys.argv[3], sys.argv[4:]
+            if action == 'check':
+                valid, reason = manifests.check(stage, tokens)
+                print(f"Stage {stage}: {'skipping, ' + reason if valid else 'running (' + reason + ')'}")
+                sys.exit(0 if valid else 1)
+            manifest = manifests.record(stage, tokens)
+            print(f"Stage {stage}: recorded {len(manifest['outputs'])} outputs")
+        elif action == 'list':
+            for manifest in manifests.stages():
+                recorded = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest['recorded']))
+                params = ' '.join(f'{name}={value}' for name, value in sorted(manifest['params'].items()))
+                print(f"{manifest['stage']}\t{recorded}\t{len(manifest['outputs'])} outputs\t{params}")
+        elif action == 'clear' and len(sys.argv) in (3, 4):
+            count = manifests.clear(sys.argv[3] if len(sys.argv) == 4 else None)
+            print(f"Cleared {count} stage manifests in {sys.argv[2]}")
+        else:
+            print(f"Invalid arguments for {action}")
+            sys.exit(2)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
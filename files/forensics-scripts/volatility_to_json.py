@@ -4,8 +4,45 @@ import sys
 import os
 import re
 from datetime import datetime
+from converter_stats import RunSummary
+from converter_schema import tool_schema, as_long
+from converter_records import Row
+from ndjson_io import NDJSONWriter, SHARED_FIELDS
 
-def parse_process_list(proc_file, case_id, memory_hash):
+SCHEMA = tool_schema({
+    'process_name': 'keyword',
+    'pid': 'long',
+    'ppid': 'long',
+    'threads': 'integer',
+    'handles': 'integer',
+    'protocol': 'keyword',
+    'local_addr': 'keyword',
+    'foreign_addr': 'keyword',
+    'state': 'keyword'
+})
+
+class ProcessRow(Row):
+    __slots__ = FIELDS = ('process_name', 'pid', 'ppid', 'threads', 'handles')
+    SOURCE = 'process_list'
+
+    def __init__(self, parts):
+        self.process_name = parts[1] if len(parts) > 1 else ''
+        self.pid = as_long(parts[2]) if len(parts) > 2 else None
+        self.ppid = as_long(parts[3]) if len(parts) > 3 else None
+        self.threads = as_long(parts[4]) if len(parts) > 4 else None
+        self.handles = as_long(parts[5]) if len(parts) > 5 else None
+
+class ConnectionRow(Row):
+    __slots__ = FIELDS = ('protocol', 'local_addr', 'foreign_addr', 'state')
+    SOURCE = 'network_connections'
+
+    def __init__(self, parts):
+        self.protocol = parts[0] if len(parts) > 0 else ''
+        self.local_addr = parts[1] if len(parts) > 1 else ''
+        self.foreign_addr = parts[2] if len(parts) > 2 else ''
+        self.state = parts[3] if len(parts) > 3 else ''
+
+def parse_process_list(proc_file):
     """Parse Volatility process list output"""
     results = []
     if os.path.exists(proc_file):
@@ -17,25 +54,12 @@ def parse_process_list(proc_file, case_id, memory_hash):
                         # Parse process information
                         parts = line.strip().split()
                         if len(parts) >= 6:
-                            result = {
-                                '@timestamp': datetime.now().isoformat(),
-                                'case_id': case_id,
-                                'evidence_hash': memory_hash,
-                                'type': 'volatility',
-                                'source': 'process_list',
-                                'process_name': parts[1] if len(parts) > 1 else '',
-                                'pid': parts[2] if len(parts) > 2 else '',
-                                'ppid': parts[3] if len(parts) > 3 else '',
-                                'threads': parts[4] if len(parts) > 4 else '',
-                                'handles': parts[5] if len(parts) > 5 else '',
-                                'processed_time': datetime.now().isoformat()
-                            }
-                            results.append(result)
+                            results.append(ProcessRow(parts))
         except Exception as e:
             print(f"Error processing process list: {e}")
     return results
 
-def parse_network_connections(net_file, case_id, memory_hash):
+def parse_network_connections(net_file):
     """Parse Volatility network connections"""
     results = []
     if os.path.exists(net_file):
@@ -46,19 +70,7 @@ def parse_network_connections(net_file, case_id, memory_hash):
                     if line.strip():
                         parts = line.strip().split()
                         if len(parts) >= 4:
-                            result = {
-                                '@timestamp': datetime.now().isoformat(),
-                                'case_id': case_id,
-                                'evidence_hash': memory_hash,
-                                'type': 'volatility',
-                                'source': 'network_connections',
-                                'protocol': parts[0] if len(parts) > 0 else '',
-                                'local_addr': parts[1] if len(parts) > 1 else '',
-                                'foreign_addr': parts[2] if len(parts) > 2 else '',
-                                'state': parts[3] if len(parts) > 3 else '',
-                                'processed_time': datetime.now().isoformat()
-                            }
-                            results.append(result)
+                            results.append(ConnectionRow(parts))
         except Exception as e:
             print(f"Error processing network connections: {e}")
     return results
@@ -76,7 +88,9 @@ def main():
     os.makedirs(json_dir, exist_ok=True)
     
     timestamp = int(datetime.now().timestamp())
+    processed_time = datetime.now().isoformat()
     all_results = []
+    summary = RunSummary(case_id, 'volatility', memory_hash)
     
     # Process different volatility outputs
     files_to_process = {
@@ -86,17 +100,30 @@ def main():
     
     for filename, parser_func in files_to_process.items():
         file_path = os.path.join(output_dir, filename)
-        results = parser_func(file_path, case_id, memory_hash)
-        all_results.extend(results)
+        results = parser_func(file_path)
+        if results:
+            all_results.append(results)
     
     if all_results:
-        output_file = os.path.join(json_dir, f'volatility_{case_id}_{timestamp}.json')
-        with open(output_file, 'w') as f:
-            for result in all_results:
-                f.write(json.dumps(result) + '\n')
-        print(f"Volatility data: {len(all_results)} entries written to {output_file}")
+        with NDJSONWriter(os.path.join(json_dir, f'volatility_{case_id}_{timestamp}.json'),
+                          shared_fields=SHARED_FIELDS) as writer:
+            # Each parser's rows share one source, so they go out as one batch run
+            for results in all_results:
+                for row in results:
+                    summary.observe(row)
+                writer.write_rows(results, {
+                    '@timestamp': processed_time,
+                    'case_id': case_id,
+                    'evidence_hash': memory_hash,
+                    'type': 'volatility',
+                    'source': results[0].SOURCE,
+                    'processed_time': processed_time
+                })
+        print(f"Volatility data: {writer.count} entries written to {writer.path}")
     else:
         print("No volatility data to process")
+    
+    summary.write(json_dir, timestamp)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
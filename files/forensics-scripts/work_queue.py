@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Shared work queue for evidence processing across several tool nodes.
+
+Jenkins enqueues one task per evidence file and a worker on each tool node
+leases tasks up to the capacity it declared, in total and per evidence
+type, and runs them with pipeline_runner.py. A lease lasts LEASE_SECONDS
+and the worker renews it with a heartbeat every HEARTBEAT_SECONDS while the
+task runs. If a node dies, its leases expire and the next lease call puts
+the tasks back in the queue for any node, up to MAX_ATTEMPTS times. Each
+lease carries a token, so a worker whose lease was given away can neither
+renew nor complete the task. Working directories live on the shared
+workspace (WORK_QUEUE_WORKSPACE), keyed by the evidence path as in
+forensicsCore.initEvidence, so a requeued task resumes from the stage
+manifests the previous node left.
+
+Which queued task a node gets is decided by the scheduler in _next_task:
+urgent tasks (URGENT in Jenkins) go before normal ones, evidence types can
+be capped across all nodes (type_caps, by default at most 2 memory dumps
+since volatility needs most of a node's RAM), and within a priority class
+investigators share the running slots in proportion to their weights
+(shares). An urgent task that has waited PREEMPT_AFTER_SECONDS for a slot
+preempts the most recently started normal task on the next node that
+heartbeats and has room for it once that task is gone; the preempted task
+goes back to the queue and resumes from its stage manifests later.
+
+The queue is a single SQLite database on the NFS-shared /data/queue
+(WORK_QUEUE_PATH), which relies on NFS locking (lockd). It uses the
+rollback journal rather than WAL, whose shared-memory index does not work
+across hosts, and every state change is one short BEGIN IMMEDIATE
+transaction.
+"""
+import hashlib
+import json
+import os
+import secrets
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import Counter
+
+QUEUE_PATH = os.environ.get('WORK_QUEUE_PATH', '/data/queue/work_queue.db')
+WORKSPACE = os.environ.get('WORK_QUEUE_WORKSPACE', '/data/cases/work')
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 5
+WAIT_POLL_SECONDS = 10
+EVIDENCE_TYPES = ('disk', 'memory', 'mobile', 'malware')
+ACTIVE_STATUSES = ('queued', 'leased')
+PRIORITY_CLASSES = ('urgent', 'normal')  # scheduling order
+PREEMPT_AFTER_SECONDS = 60
+DEFAULT_TYPE_CAPS = {'memory': 2}
+WAIT_REPORT_SECONDS = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    case_id TEXT NOT NULL,
+    evidence_type TEXT NOT NULL,
+    evidence_path TEXT NOT NULL,
+    analysis_level TEXT NOT NULL,
+    priority TEXT NOT NULL DEFAULT 'normal',
+    investigator TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    node TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    last_error TEXT,
+    preempted_at REAL,
+    preemptions INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE TABLE IF NOT EXISTS nodes (
+    name TEXT PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    type_capacity TEXT NOT NULL,
+    last_heartbeat REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS type_caps (
+    evidence_type TEXT PRIMARY KEY,
+    max_running INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shares (
+    investigator TEXT PRIMARY KEY,
+    weight REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Columns added after the first release of the queue, for databases created before them
+ADDED_TASK_COLUMNS = {
+    'priority': "TEXT NOT NULL DEFAULT 'normal'",
+    'investigator': "TEXT NOT NULL DEFAULT ''",
+    'preempted_at': 'REAL',
+    'preemptions': 'INTEGER NOT NULL DEFAULT 0'
+}
+
+TASK_COLUMNS = ('id', 'case_id', 'evidence_type', 'evidence_path', 'analysis_level', 'priority', 'investigator',
+                'status', 'node', 'lease_token', 'lease_expires', 'attempts', 'enqueued_at', 'started_at',
+                'finished_at', 'last_error', 'preempted_at', 'preemptions')
+
+
+def parse_capacity(spec):
+    """(total, {evidence_type: slots}) from '4' or '4,memory=1,disk=2'"""
+    total, type_capacity = None, {}
+    for part in spec.split(','):
+        part = part.strip()
+        if '=' in part:
+            evidence_type, slots = part.split('=', 1)
+            if evidence_type not in EVIDENCE_TYPES:
+                raise ValueError(f"Unknown evidence type '{evidence_type}' in capacity")
+            type_capacity[evidence_type] = int(slots)
+        elif part:
+            total = int(part)
+    if total is None:
+        total = sum(type_capacity.values()) or 1
+    return total, type_capacity
+
+
+def working_dir(case_id, evidence_type, evidence_path, workspace=WORKSPACE):
+    """Same working directory forensicsCore.initEvidence uses for this evidence"""
+    key = hashlib.sha1(evidence_path.encode()).hexdigest()[:12]
+    return os.path.join(workspace, case_id, f'{evidence_type}_{key}')
+
+
+class WorkQueue:
+    def __init__(self, db_path=QUEUE_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Autocommit mode; writes take the lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        with self._write():
+            new_caps = not self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'type_caps'").fetchone()
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self.conn.execute(statement)
+            existing = {row[1] for row in self.conn.execute('PRAGMA table_info(tasks)')}
+            for column, definition in ADDED_TASK_COLUMNS.items():
+                if column not in existing:
+                    self.conn.execute(f'ALTER TABLE tasks ADD COLUMN {column} {definition}')
+            if new_caps:
+                self.conn.executemany("INSERT INTO type_caps (evidence_type, max_running) VALUES (?, ?)",
+                                      DEFAULT_TYPE_CAPS.items())
+
+    def _write(self):
+        """Context for one write transaction"""
+        return _Transaction(self.conn)
+
+    def _task(self, row):
+        return dict(zip(TASK_COLUMNS, row)) if row else None
+
+    def get(self, task_id):
+        return self._task(self.conn.execute(
+            f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def enqueue(self, case_id, evidence_type, evidence_path, analysis_level='standard', investigator='',
+                priority='normal'):
+        """Queue an evidence file; returns the id of its task, reusing one already queued or running"""
+        if evidence_type not in EVIDENCE_TYPES:
+            raise ValueError(f"Unknown evidence type '{evidence_type}'")
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        evidence_path = os.path.abspath(evidence_path)
+        with self._write():
+            row = self.conn.execute(
+                "SELECT id, priority FROM tasks WHERE evidence_path = ? AND case_id = ? "
+                "AND status IN ('queued', 'leased')", (evidence_path, case_id)).fetchone()
+            if row:
+                # Queuing the same evidence again as urgent raises the existing task
+                if PRIORITY_CLASSES.index(priority) < PRIORITY_CLASSES.index(row[1]):
+                    self.conn.execute("UPDATE tasks SET priority = ? WHERE id = ?", (priority, row[0]))
+                return row[0]
+            return self.conn.execute(
+                "INSERT INTO tasks (case_id, evidence_type, evidence_path, analysis_level, priority, investigator, "
+                "status, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (case_id, evidence_type, evidence_path, analysis_level, priority, investigator,
+                 time.time())).lastrowid
+
+    def reprioritize(self, task_id, priority):
+        """Move a queued or running task to another priority class"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        with self._write():
+            return self.conn.execute(
+                "UPDATE tasks SET priority = ? WHERE id = ? AND status IN ('queued', 'leased')",
+                (priority, task_id)).rowcount == 1
+
+    def set_type_cap(self, evidence_type, max_running):
+        """Limit how many tasks of an evidence type run across all nodes; None removes the cap"""
+        if evidence_type not in EVIDENCE_TYPES:
+            raise ValueError(f"Unknown evidence type '{evidence_type}'")
+        with self._write():
+            if max_running is None:
+                self.conn.execute("DELETE FROM type_caps WHERE evidence_type = ?", (evidence_type,))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO type_caps (evidence_type, max_running) VALUES (?, ?)",
+                                  (evidence_type, max_running))
+
+    def set_share(self, investigator, weight):
+        """Weight of an investigator's fair share of running slots (default 1)"""
+        if weight <= 0:
+            raise ValueError('Share weight must be positive')
+        with self._write():
+            self.conn.execute("INSERT OR REPLACE INTO shares (investigator, weight) VALUES (?, ?)",
+                              (investigator, weight))
+
+    def register(self, node, capacity, type_capacity=None):
+        """Declare how many tasks (in total and per evidence type) a node takes at once"""
+        with self._write():
+            self.conn.execute(
+                "INSERT INTO nodes (name, capacity, type_capacity, last_heartbeat) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET capacity = excluded.capacity, "
+                "type_capacity = excluded.type_capacity, last_heartbeat = excluded.last_heartbeat",
+                (node, capacity, json.dumps(type_capacity or {}), time.time()))
+
+    def _requeue_expired(self, now):
+        """Inside a write transaction: return expired leases to the queue, or fail them after MAX_ATTEMPTS"""
+        self.conn.execute(
+            "UPDATE tasks SET status = 'failed', finished_at = ?, node = NULL, lease_token = NULL, "
+            "last_error = 'lease expired ' || attempts || ' times' "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, MAX_ATTEMPTS))
+        return self.conn.execute(
+            "UPDATE tasks SET status = 'queued', node = NULL, lease_token = NULL, lease_expires = NULL, "
+            "last_error = 'lease expired' WHERE status = 'leased' AND lease_expires < ?", (now,)).rowcount
+
+    def requeue_expired(self):
+        with self._write():
+            return self._requeue_expired(time.time())
+
+    def _schedule_state(self, node):
+        """Inside a write transaction: the node's capacity and what is running, for placing tasks"""
+        row = self.conn.execute("SELECT capacity, type_capacity FROM nodes WHERE name = ?", (node,)).fetchone()
+        if row is None:
+            raise ValueError(f"Node {node} has not registered its capacity")
+        state = {
+            'capacity': row[0],
+            'type_capacity': json.loads(row[1]),
+            'type_caps': dict(self.conn.execute("SELECT evidence_type, max_running FROM type_caps").fetchall()),
+            'weights': dict(self.conn.execute("SELECT investigator, weight FROM shares").fetchall()),
+            'node_running': Counter(),
+            'type_running': Counter(),
+            'investigator_running': Counter()
+        }
+        for task_node, evidence_type, investigator in self.conn.execute(
+                "SELECT node, evidence_type, investigator FROM tasks WHERE status = 'leased'"):
+            state['type_running'][evidence_type] += 1
+            state['investigator_running'][investigator] += 1
+            if task_node == node:
+                state['node_running'][evidence_type] += 1
+        return state
+
+    def _fits(self, state, evidence_type, victim=None):
+        """Whether the node has room for a task of this type, optionally once the victim task is gone"""
+        node_running = state['node_running'].copy()
+        type_running = state['type_running'].copy()
+        if victim is not None:
+            node_running[victim['evidence_type']] -= 1
+            type_running[victim['evidence_type']] -= 1
+        if sum(node_running.values()) >= state['capacity']:
+            return False
+        if node_running[evidence_type] >= state['type_capacity'].get(evidence_type, state['capacity']):
+            return False
+        return type_running[evidence_type] < state['type_caps'].get(evidence_type, float('inf'))
+
+    def _next_task(self, node, now):
+        """Inside a write transaction: the queued task to give the node next, or None.
+
+        Highest priority class first, then the investigator using the smallest
+        share of running slots relative to their weight, then the oldest task.
+        """
+        state = self._schedule_state(node)
+        if sum(state['node_running'].values()) >= state['capacity']:
+            return None
+        candidates = [task for task in map(self._task, self.conn.execute(
+            f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE status = 'queued'"))
+            if self._fits(state, task['evidence_type'])]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda task: (
+            PRIORITY_CLASSES.index(task['priority']),
+            state['investigator_running'][task['investigator']] / state['weights'].get(task['investigator'], 1.0),
+            task['id']))
+
+    def _preempt(self, node, now):
+        """Inside a write transaction: give an urgent task that has waited too long a slot on this node
+        by requeueing the node's most recently started normal task. Returns the preempted task id or None."""
+        # One preemption at a time, so nodes do not all evict work for the same urgent task
+        if self.conn.execute("SELECT 1 FROM tasks WHERE preempted_at > ?", (now - HEARTBEAT_SECONDS,)).fetchone():
+            return None
+        waiting = self.conn.execute(
+            "SELECT id, evidence_type FROM tasks WHERE status = 'queued' AND priority = 'urgent' "
+            "AND enqueued_at <= ? ORDER BY id", (now - PREEMPT_AFTER_SECONDS,)).fetchall()
+        if not waiting:
+            return None
+        state = self._schedule_state(node)
+        victims = [self._task(row) for row in self.conn.execute(
+            f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE status = 'leased' AND node = ? "
+            "AND priority = 'normal' ORDER BY started_at DESC", (node,))]
+        for urgent_id, evidence_type in waiting:
+            if self._fits(state, evidence_type):
+                # This node can take it without evicting anything
+                return None
+            victim = next((task for task in victims if self._fits(state, evidence_type, task)), None)
+            if victim is not None:
+                self.conn.execute(
+                    "UPDATE tasks SET status = 'queued', node = NULL, lease_token = NULL, lease_expires = NULL, "
+                    "attempts = attempts - 1, preempted_at = ?, preemptions = preemptions + 1, "
+                    "last_error = ? WHERE id = ?", (now, f'preempted by urgent task {urgent_id}', victim['id']))
+                return victim['id']
+        return None
+
+    def lease(self, node):
+        """Lease the next task this node has capacity for; returns the task with its lease token, or None"""
+        now = time.time()
+        with self._write():
+            self._requeue_expired(now)
+            task = self._next_task(node, now)
+            if task is None:
+                return None
+            token = secrets.token_hex(8)
+            self.conn.execute(
+                "UPDATE tasks SET status = 'leased', node = ?, lease_token = ?, lease_expires = ?, "
+                "attempts = attempts + 1, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (node, token, now + LEASE_SECONDS, now, task['id']))
+        return self.get(task['id'])
+
+    def heartbeat(self, node, leases):
+        """Renew a node's leases, given as (task_id, token); returns the ids it still holds"""
+        now = time.time()
+        held = set()
+        with self._write():
+            self.conn.execute("UPDATE nodes SET last_heartbeat = ? WHERE name = ?", (now, node))
+            self._preempt(node, now)
+            for task_id, token in leases:
+                if self.conn.execute(
+                        "UPDATE tasks SET lease_expires = ? WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                        (now + LEASE_SECONDS, task_id, token)).rowcount:
+                    held.add(task_id)
+        return held
+
+    def complete(self, task_id, token, error=None):
+        """Finish a leased task; returns False if the lease was lost in the meantime"""
+        with self._write():
+            return self.conn.execute(
+                "UPDATE tasks SET status = ?, finished_at = ?, lease_token = NULL, lease_expires = NULL, "
+                "last_error = ? WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                ('failed' if error else 'done', time.time(), error, task_id, token)).rowcount == 1
+
+    def release(self, task_id, token):
+        """Give a leased task back to the queue without counting the attempt (worker shutdown)"""
+        with self._write():
+            return self.conn.execute(
+                "UPDATE tasks SET status = 'queued', node = NULL, lease_token = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (task_id, token)).rowcount == 1
+
+    def retry(self, task_id):
+        """Put a failed task back in the queue with a fresh attempt budget"""
+        with self._write():
+            return self.conn.execute(
+                "UPDATE tasks SET status = 'queued', attempts = 0, node = NULL, finished_at = NULL "
+                "WHERE id = ? AND status = 'failed'", (task_id,)).rowcount == 1
+
+    def tasks(self, status=None, limit=100):
+        query = f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks"
+        args = []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        args.append(limit)
+        return [self._task(row) for row in self.conn.execute(query + " ORDER BY id DESC LIMIT ?", args)]
+
+    def wait_times(self, since_seconds=WAIT_REPORT_SECONDS):
+        """Queue wait per priority class: for tasks started in the window (first start minus
+        enqueue time) and for the tasks still waiting now"""
+        now = time.time()
+        report = {}
+        for priority in PRIORITY_CLASSES:
+            waits = sorted(row[0] for row in self.conn.execute(
+                "SELECT started_at - enqueued_at FROM tasks WHERE priority = ? AND started_at >= ?",
+                (priority, now - since_seconds)))
+            queued = [now - row[0] for row in self.conn.execute(
+                "SELECT enqueued_at FROM tasks WHERE priority = ? AND status = 'queued'", (priority,))]
+            report[priority] = {
+                'started': len(waits),
+                'mean_wait_seconds': round(sum(waits) / len(waits), 1) if waits else None,
+                'p95_wait_seconds': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else None,
+                'max_wait_seconds': round(waits[-1], 1) if waits else None,
+                'queued': len(queued),
+                'oldest_queued_seconds': round(max(queued), 1) if queued else None
+            }
+        return report
+
+    def stats(self):
+        now = time.time()
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        running = dict(self.conn.execute(
+            "SELECT node, COUNT(*) FROM tasks WHERE status = 'leased' GROUP BY node").fetchall())
+        nodes = [{
+            'node': name,
+            'capacity': capacity,
+            'type_capacity': json.loads(type_capacity),
+            'running': running.get(name, 0),
+            'heartbeat_age_seconds': round(now - last_heartbeat, 1)
+        } for name, capacity, type_capacity, last_heartbeat in self.conn.execute(
+            "SELECT name, capacity, type_capacity, last_heartbeat FROM nodes ORDER BY name")]
+        return {
+            'tasks_by_status': counts,
+            'nodes': nodes,
+            'type_caps': dict(self.conn.execute("SELECT evidence_type, max_running FROM type_caps").fetchall()),
+            'shares': dict(self.conn.execute("SELECT investigator, weight FROM shares").fetchall()),
+            'wait_by_class': self.wait_times()
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+class Worker:
+    """Lease tasks for one node, run each with pipeline_runner.py and keep their leases alive"""
+
+    def __init__(self, queue, node, capacity, type_capacity=None, workspace=WORKSPACE):
+        self.queue = queue
+        self.node = node
+        self.capacity = capacity
+        self.type_capacity = type_capacity or {}
+        self.workspace = workspace
+        self.running = {}  # task id -> (token, process, task)
+        self.stopping = False
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _start(self, task):
+        directory = working_dir(task['case_id'], task['evidence_type'], task['evidence_path'], self.workspace)
+        os.makedirs(os.path.join(directory, 'logs'), exist_ok=True)
+        log = open(os.path.join(directory, 'logs', 'pipeline.log'), 'a')
+        log.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] task {task['id']} attempt {task['attempts']} "
+                  f"on {self.node}\n")
+        log.flush()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'pipeline_runner.py'), 'run', task['evidence_type'],
+             task['evidence_path'], directory, task['case_id'], task['analysis_level']],
+            stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        log.close()
+        self.running[task['id']] = (task['lease_token'], process, task)
+        print(f"Started task {task['id']}: {task['evidence_type']} {task['evidence_path']} ({task['case_id']})",
+              flush=True)
+
+    def _terminate(self, process):
+        # The pipeline runs in its own session; stop the tools it started along with it
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+    def _reap(self):
+        for task_id, (token, process, task) in list(self.running.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            del self.running[task_id]
+            error = f'pipeline exited with {code}' if code else None
+            if self.queue.complete(task_id, token, error):
+                print(f"Task {task_id}: {'failed (' + error + ')' if error else 'done'}", flush=True)
+            else:
+                print(f"Task {task_id}: lease lost before completion, result discarded", flush=True)
+
+    def _heartbeat(self):
+        held = self.queue.heartbeat(self.node, [(task_id, token) for task_id, (token, _, _) in self.running.items()])
+        for task_id in set(self.running) - held:
+            # Another node owns this task now; stop duplicating its work
+            token, process, _ = self.running.pop(task_id)
+            self._terminate(process)
+            print(f"Task {task_id}: lease lost or preempted, stopped", flush=True)
+
+    def run(self, once=False):
+        """Process tasks until SIGTERM/SIGINT (or, with once, until the queue is empty)"""
+        self.queue.register(self.node, self.capacity, self.type_capacity)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        last_heartbeat = next_poll = 0
+        while not self.stopping:
+            self._reap()
+            now = time.time()
+            if now >= next_poll:
+                while len(self.running) < self.capacity:
+                    task = self.queue.lease(self.node)
+                    if task is None:
+                        # Nothing we have room for; back off before asking again
+                        next_poll = now + IDLE_POLL_SECONDS
+                        break
+                    self._start(task)
+            if now - last_heartbeat >= HEARTBEAT_SECONDS:
+                self._heartbeat()
+                last_heartbeat = now
+            if once and not self.running and next_poll > now:
+                break
+            time.sleep(1)
+
+        # Shutting down: stop running pipelines and hand their tasks straight back
+        for task_id, (token, process, _) in self.running.items():
+            self._terminate(process)
+            self.queue.release(task_id, token)
+            print(f"Task {task_id}: released for another node", flush=True)
+        self.running.clear()
+
+
+def open_queue(db_path=QUEUE_PATH):
+    """Open the shared queue, or return None if it is unavailable on this host"""
+    try:
+        return WorkQueue(db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Work queue unavailable ({db_path}): {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    actions = ('enqueue', 'workdir', 'worker', 'wait', 'retry', 'requeue', 'priority', 'cap', 'share', 'list',
+               'stats', 'waits')
+    if len(sys.argv) < 2 or sys.argv[1] not in actions:
+        print("Usage: work_queue.py enqueue <case_id> <evidence_type> <evidence_path> "
+              "[analysis_level] [investigator] [urgent|normal]")
+        print("       work_queue.py workdir <case_id> <evidence_type> <evidence_path> [analysis_level]")
+        print("       work_queue.py worker <capacity> [node_name] [--once]   (capacity: 4 or 4,memory=1,disk=2)")
+        print("       work_queue.py wait <task_id>")
+        print("       work_queue.py retry <task_id>")
+        print("       work_queue.py requeue")
+        print("       work_queue.py priority <task_id> <urgent|normal>")
+        print("       work_queue.py cap <evidence_type> <max_running|none>")
+        print("       work_queue.py share <investigator> <weight>")
+        print("       work_queue.py list [status]")
+        print("       work_queue.py stats")
+        print("       work_queue.py waits [hours]")
+        sys.exit(1)
+
+    action, args = sys.argv[1], sys.argv[2:]
+    once = '--once' in args
+    args = [arg for arg in args if arg != '--once']
+    queue = WorkQueue()
+    try:
+        if action == 'enqueue' and 3 <= len(args) <= 6:
+            task_id = queue.enqueue(*args)
+            print(task_id)
+        elif action == 'workdir' and len(args) in (3, 4):
+            print(working_dir(args[0], args[1], os.path.abspath(args[2])))
+        elif action == 'worker' and len(args) in (1, 2):
+            capacity, type_capacity = parse_capacity(args[0])
+            node = args[1] if len(args) == 2 else socket.gethostname()
+            print(f"Worker {node}: capacity {capacity} {type_capacity or ''}", flush=True)
+            Worker(queue, node, capacity, type_capacity).run(once)
+        elif action == 'wait' and len(args) == 1:
+            task = queue.get(int(args[0]))
+            while task and task['status'] in ACTIVE_STATUSES:
+                time.sleep(WAIT_POLL_SECONDS)
+                task = queue.get(task['id'])
+            if task is None:
+                print(f"No task {args[0]}")
+                sys.exit(1)
+            print(f"Task {task['id']}: {task['status']} on {task['node']} after {task['attempts']} attempts"
+                  f"{' (' + task['last_error'] + ')' if task['last_error'] else ''}")
+            sys.exit(0 if task['status'] == 'done' else 1)
+        elif action == 'retry' and len(args) == 1:
+            print(f"Task {args[0]}: {'queued again' if queue.retry(int(args[0])) else 'not failed'}")
+        elif action == 'requeue':
+            print(f"Requeued {queue.requeue_expired()} expired leases")
+        elif action == 'priority' and len(args) == 2:
+            changed = queue.reprioritize(int(args[0]), args[1])
+            print(f"Task {args[0]}: {args[1] if changed else 'not queued or running'}")
+        elif action == 'cap' and len(args) == 2:
+            queue.set_type_cap(args[0], None if args[1] == 'none' else int(args[1]))
+            print(f"{args[0]}: {'no cap' if args[1] == 'none' else 'at most ' + args[1] + ' running'}")
+        elif action == 'share' and len(args) == 2:
+            queue.set_share(args[0], float(args[1]))
+            print(f"{args[0]}: share weight {args[1]}")
+        elif action == 'list' and len(args) <= 1:
+            for task in queue.tasks(args[0] if args else None):
+                print(f"{task['id']}\t{task['status']}\t{task['priority']}\t{task['evidence_type']}\t"
+                      f"{task['case_id']}\t{task['investigator'] or '-'}\t{task['node'] or '-'}\t"
+                      f"{task['attempts']}\t{task['evidence_path']}")
+        elif action == 'stats':
+            print(json.dumps(queue.stats(), indent=2))
+        elif action == 'waits' and len(args) <= 1:
+            hours = float(args[0]) if args else WAIT_REPORT_SECONDS / 3600
+            print(json.dumps(queue.wait_times(hours * 3600), indent=2))
+        else:
+            print(f"Invalid arguments for {action}")
+            sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Direct Elasticsearch bulk loader for converter output.
+
+Streams the NDJSON written by the *_to_json converters into the _bulk API
+in batches bounded by document count and payload size, with several
+requests in flight. 429 responses (whole-request or per-item) slow every
+worker down through a shared backoff and are retried; successes let the
+delay decay again. Document _ids are derived from case, source, evidence
+hash and line, so loading the same output twice overwrites instead of
+duplicating. Documents go to the per-tool rollover alias with routing set
+to the case (see es_index_manager.py); once a tool's alias has rolled over,
+each batch first looks its _ids up across the tool's backing indices and
+writes documents that already exist back to the index holding them, so a
+reload after a rollover still overwrites. Committed offsets are recorded in the
+ingest ledger, so a restarted load resumes each file where it stopped and
+already-loaded files are skipped. gzip and zstd output (.json.gz, .json.zst)
+is read through ndjson_io and resumed by decompressed offset. Envelope
+files (a shared-field header line followed by short rows) are expanded back
+into full documents as they are batched.
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+# Import lab configuration
+try:
+    from lab_config import ELASTICSEARCH_URL
+except ImportError:
+    # Fallback to default if config not available
+    ELASTICSEARCH_URL = "http://10.128.0.19:9200"
+from ingest_ledger import open_ledger
+# The shared NDJSON reader lives with the converters
+try:
+    from ndjson_io import open_ndjson, is_compressed, expand, NDJSON_SUFFIXES, ENVELOPE_KEY, ENVELOPE_PREFIX
+except ImportError:
+    sys.path.append('/opt/forensics/scripts')
+    from ndjson_io import open_ndjson, is_compressed, expand, NDJSON_SUFFIXES, ENVELOPE_KEY, ENVELOPE_PREFIX
+
+MAX_BATCH_DOCS = 1000
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_WORKERS = 4
+MAX_RETRIES = 8
+BACKOFF_MIN = 0.25       # seconds added after the first 429
+BACKOFF_MAX = 30.0
+BACKOFF_DECAY = 0.5      # delay multiplier after a clean batch
+PROGRESS_INTERVAL = 5.0
+BACKING_CACHE_SECONDS = 300  # how long a tool's backing index count is trusted
+SKIP_CHUNK_BYTES = 1024 * 1024  # read size when skipping to a resume point in a compressed file
+INDEX_PREFIX = 'forensics'
+EVENT_TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%a %b %d %Y %H:%M:%S']
+# Tags the Logstash file inputs used to attach per tool
+TOOL_TAGS = {
+    'autopsy': ['forensics', 'autopsy'],
+    'volatility': ['forensics', 'memory'],
+    'andriller': ['forensics', 'mobile'],
+    'cape': ['forensics', 'malware']
+}
+
+
+class Backpressure:
+    """Delay shared by all workers: grows on 429s, decays on successful batches"""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    def throttled(self):
+        with self.lock:
+            self.delay = min(BACKOFF_MAX, max(BACKOFF_MIN, self.delay * 2))
+
+    def succeeded(self):
+        with self.lock:
+            self.delay = self.delay * BACKOFF_DECAY if self.delay > BACKOFF_MIN else 0.0
+
+    def pause(self):
+        delay = self.delay
+        if delay:
+            time.sleep(random.uniform(delay / 2, delay))
+
+
+def document_id(doc, line_number):
+    """Deterministic _id from case, source, evidence hash and line"""
+    evidence = doc.get('evidence_hash') or doc.get('sample_hash') or ''
+    line = doc.get('line_number', line_number)
+    key = f"{doc.get('case_id', '')}|{doc.get('type', '')}|{doc.get('source', '')}|{evidence}|{line}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def enrich(doc):
+    """Derived fields the Logstash forensics pipeline used to add"""
+    if doc.get('type') == 'autopsy' and doc.get('timestamp'):
+        for time_format in EVENT_TIME_FORMATS:
+            try:
+                doc['@timestamp'] = datetime.strptime(doc['timestamp'], time_format).isoformat()
+                break
+            except (TypeError, ValueError):
+                continue
+    file_path = doc.get('file_path')
+    if file_path and '/' in file_path:
+        doc['file_directory'], doc['file_name'] = file_path.rsplit('/', 1)
+        if '.' in doc['file_name']:
+            doc['file_extension'] = doc['file_name'].rsplit('.', 1)[1]
+    if doc.get('type') == 'volatility' and doc.get('process_name') and doc.get('pid'):
+        doc['process_key'] = f"{doc['process_name']}-{doc['pid']}"
+    if doc.get('type') in TOOL_TAGS:
+        doc.setdefault('tags', TOOL_TAGS[doc['type']])
+    if doc.get('case_id'):
+        doc['lab_processed'] = True
+        doc.setdefault('processing_time', doc.get('@timestamp'))
+    return doc
+
+
+def index_name(doc):
+    """Per-tool rollover write alias, forensics-<type>"""
+    return f"{INDEX_PREFIX}-{doc.get('type', 'unknown')}"
+
+
+def iter_ndjson_files(paths, ledger=None):
+    """Expand inputs into (path, inode, size, offset, lines) with data still to load, in a stable order"""
+    for path in paths:
+        if os.path.isdir(path):
+            if ledger is not None:
+                yield from ledger.scan(path)
+                continue
+            for name in sorted(os.listdir(path)):
+                if name.endswith(NDJSON_SUFFIXES) and not name.startswith('.'):
+                    stat = os.stat(os.path.join(path, name))
+                    yield os.path.join(path, name), stat.st_ino, stat.st_size, 0, 0
+        elif os.path.exists(path):
+            stat = os.stat(path)
+            offset, lines, needs_load = ledger.position(path, stat) if ledger is not None else (0, 0, True)
+            if needs_load:
+                yield os.path.abspath(path), stat.st_ino, stat.st_size, offset, lines
+        else:
+            print(f"Skipping missing input {path}", file=sys.stderr)
+
+
+def skip_to(f, offset, compressed):
+    """Advance f to a resume offset and return the envelope header in force there, if any"""
+    if offset == 0:
+        return None
+    first = f.readline()
+    if not first.startswith(ENVELOPE_PREFIX):
+        if compressed:
+            # Compressed streams cannot seek, so decompress and discard up to the resume point
+            remaining = offset - len(first)
+            while remaining > 0:
+                chunk = f.read(min(remaining, SKIP_CHUNK_BYTES))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        else:
+            f.seek(offset)
+        return None
+
+    # Rows after the resume point need the last header before it
+    envelope = json.loads(first)[ENVELOPE_KEY]
+    position = len(first)
+    while position < offset:
+        raw = f.readline()
+        if not raw:
+            break
+        position += len(raw)
+        if raw.startswith(ENVELOPE_PREFIX):
+            envelope = json.loads(raw)[ENVELOPE_KEY]
+    return envelope
+
+
+def iter_actions(files):
+    """Yield (id, action_line, position) per document, plus an end-of-file marker with no action.
+
+    position is (path, inode, size, end_offset, line_number, complete) just after the
+    document, which is what the ingest ledger commits once the document is acknowledged.
+    Offsets of compressed files count decompressed bytes and they are read to the end.
+    Envelope header lines are not documents and do not count towards line_number.
+    """
+    for path, inode, size, offset, line_number in files:
+        compressed = is_compressed(path)
+        with open_ndjson(path) as f:
+            envelope = skip_to(f, offset, compressed)
+            while compressed or offset < size:
+                raw = f.readline()
+                if not raw:
+                    break
+                offset += len(raw)
+                if raw.startswith(ENVELOPE_PREFIX):
+                    envelope = json.loads(raw)[ENVELOPE_KEY]
+                    continue
+                line_number += 1
+                line = raw.decode('utf-8', errors='replace')
+                if not line.strip():
+                    continue
+                try:
+                    doc = enrich(expand(envelope, json.loads(line)))
+                except ValueError:
+                    print(f"{path}:{line_number}: invalid JSON, skipped", file=sys.stderr)
+                    continue
+                doc_id = document_id(doc, line_number)
+                header = json.dumps({"index": {"_index": index_name(doc), "_id": doc_id,
+                                               "routing": doc.get('case_id', '')}})
+                yield doc_id, f"{header}\n{json.dumps(doc)}\n", \
+                    (path, inode, size, offset, line_number, not compressed and offset >= size)
+        yield None, None, (path, inode, size, offset, line_number, True)
+
+
+def iter_batches(actions, max_docs=MAX_BATCH_DOCS, max_bytes=MAX_BATCH_BYTES):
+    """Group actions into (items, marks) batches bounded by document count and encoded size.
+
+    marks maps each file in the batch to its position after the batch's last document.
+    """
+    batch = []
+    marks = {}
+    size = 0
+    for doc_id, action, position in actions:
+        if action is None:
+            marks[position[0]] = position
+            continue
+        action_size = len(action.encode())
+        if batch and (len(batch) >= max_docs or size + action_size > max_bytes):
+            yield batch, marks
+            batch = []
+            marks = {}
+            size = 0
+        batch.append((doc_id, action))
+        marks[position[0]] = position
+        size += action_size
+    if batch or marks:
+        yield batch, marks
+
+
+class OffsetTracker:
+    """Commits per-file offsets to the ledger once every earlier batch of that file succeeded"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.pending = {}   # path -> deque of (seq, position), in submission order
+        self.results = {}   # seq -> True if the batch was fully handled
+
+    def submitted(self, seq, marks):
+        for path, position in marks.items():
+            self.pending.setdefault(path, deque()).append((seq, position))
+
+    def finished(self, seq, ok, marks):
+        self.results[seq] = ok
+        for path in marks:
+            queue = self.pending[path]
+            committed = None
+            # A failed batch blocks its file: the next run resumes from before it
+            while queue and self.results.get(queue[0][0]) is True:
+                committed = queue.popleft()[1]
+            if committed:
+                path, inode, size, offset, lines, complete = committed
+                self.ledger.commit(path, inode, offset, lines, size, complete)
+            if not queue:
+                del self.pending[path]
+
+
+class BulkLoader:
+    def __init__(self, es_url=ELASTICSEARCH_URL, max_workers=MAX_WORKERS, ledger=None):
+        self.bulk_url = f"{es_url.rstrip('/')}/_bulk"
+        self.max_workers = max_workers
+        self.ledger = ledger
+        self.es_url = es_url.rstrip('/')
+        self.backpressure = Backpressure()
+        self.retries = 0
+        self._backing = {}  # write alias -> (backing index count, checked at)
+        self._backing_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/x-ndjson'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _rolled_over(self, alias):
+        """True if the write alias has more than one backing index (cached for a while)"""
+        with self._backing_lock:
+            count, checked = self._backing.get(alias, (0, 0.0))
+            if time.time() - checked > BACKING_CACHE_SECONDS:
+                response = self.session.get(f"{self.es_url}/_cat/indices/{alias}-*",
+                                            params={'h': 'index', 'format': 'json'}, timeout=60)
+                if response.status_code not in (200, 404):
+                    raise RuntimeError(f"Listing {alias} indices failed: {response.status_code}")
+                count = len(response.json()) if response.status_code == 200 else 0
+                self._backing[alias] = (count, time.time())
+            return count > 1
+
+    def route_existing(self, batch):
+        """Point actions whose _id already exists in a backing index of their tool at that index.
+
+        Deterministic _ids only overwrite within one index, so without this a reload after
+        a rollover would add second copies to the new write index. Documents in write-blocked
+        (compacted) indices are rejected per item until the case is reopened.
+        """
+        groups = {}
+        for position, (doc_id, action) in enumerate(batch):
+            header = json.loads(action.split('\n', 1)[0])['index']
+            groups.setdefault((header['_index'], header.get('routing', '')), []).append(position)
+
+        routed = list(batch)
+        for (alias, routing), positions in groups.items():
+            if not self._rolled_over(alias):
+                continue
+            ids = [batch[position][0] for position in positions]
+            response = self.session.post(
+                f"{self.es_url}/{alias}-*/_search",
+                params={'routing': routing, 'ignore_unavailable': 'true'},
+                data=json.dumps({"query": {"ids": {"values": ids}}, "_source": False, "size": len(ids)}),
+                headers={'Content-Type': 'application/json'}, timeout=300)
+            if response.status_code != 200:
+                # Sending without the lookup could duplicate documents, so fail the batch instead
+                raise RuntimeError(f"_id lookup in {alias}-* failed: {response.status_code}")
+            existing = {hit['_id']: hit['_index'] for hit in response.json()['hits']['hits']}
+            for position in positions:
+                doc_id, action = batch[position]
+                if doc_id in existing:
+                    header, document = action.split('\n', 1)
+                    header = json.loads(header)
+                    header['index']['_index'] = existing[doc_id]
+                    routed[position] = (doc_id, f"{json.dumps(header)}\n{document}")
+        return routed
+
+    def send_routed(self, batch):
+        """send_batch after routing documents that already exist to their index"""
+        return self.send_batch(self.route_existing(batch))
+
+    def send_batch(self, batch):
+        """Send one batch, retrying throttled documents; returns (indexed, errors, complete).
+
+        complete is False when documents were given up on, or the whole request was
+        rejected, and should be resent by a later run; permanent per-document rejections
+        do not count. Batches over the request size limit (413) are split and resent.
+        """
+        pending = batch
+        indexed = 0
+        errors = []
+        if not pending:
+            return indexed, errors, True
+        for attempt in range(MAX_RETRIES):
+            self.backpressure.pause()
+            body = ''.join(action for _, action in pending)
+            try:
+                response = self.session.post(self.bulk_url, data=body.encode(), timeout=300)
+            except requests.RequestException as e:
+                self.backpressure.throttled()
+                self.retries += 1
+                error = str(e)
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                self.backpressure.throttled()
+                self.retries += 1
+                error = f"_bulk returned {response.status_code}"
+                continue
+            if response.status_code == 413:
+                if len(pending) == 1:
+                    # A single document over http.max_content_length can never be indexed
+                    return indexed, errors + [f"{pending[0][0]}: larger than the _bulk request size limit"], True
+                # Over the request size limit: send each half on its own
+                middle = len(pending) // 2
+                first = self.send_batch(pending[:middle])
+                second = self.send_batch(pending[middle:])
+                return indexed + first[0] + second[0], errors + first[1] + second[1], first[2] and second[2]
+            if response.status_code != 200:
+                # Nothing in the batch was indexed (bad auth, malformed request...): a later run resends it
+                return indexed, errors + [f"_bulk rejected batch: {response.status_code} {response.text[:200]}"], False
+
+            # Per-item results: retry only the documents rejected for load
+            throttled = []
+            for (doc_id, action), item in zip(pending, response.json().get('items', [])):
+                result = next(iter(item.values()))
+                status = result.get('status', 500)
+                if status < 300:
+                    indexed += 1
+                elif status == 429:
+                    throttled.append((doc_id, action))
+                else:
+                    errors.append(f"{doc_id}: {result.get('error')}")
+
+            if not throttled:
+                self.backpressure.succeeded()
+                return indexed, errors, True
+            self.backpressure.throttled()
+            self.retries += 1
+            pending = throttled
+            error = f"{len(throttled)} documents throttled"
+
+        return indexed, errors + [f"Gave up on {len(pending)} documents after {MAX_RETRIES} attempts: {error}"], False
+
+    def load(self, paths):
+        """Load every document under the given files/directories and return a summary"""
+        files = list(iter_ndjson_files(paths, self.ledger))
+        resumed = sum(1 for _, _, _, offset, _ in files if offset)
+        started = time.time()
+        last_report = started
+        indexed = failed = 0
+        errors = []
+        batches = iter_batches(iter_actions(files))
+        tracker = OffsetTracker(self.ledger) if self.ledger is not None else None
+        in_flight = {}
+        seq = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            exhausted = False
+            while in_flight or not exhausted:
+                # Bounded window of submitted batches so memory does not grow with input size
+                while not exhausted and len(in_flight) < self.max_workers * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    items, marks = batch
+                    if tracker:
+                        tracker.submitted(seq, marks)
+                    in_flight[executor.submit(self.send_routed, items)] = (seq, len(items), marks)
+                    seq += 1
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch_seq, batch_size, marks = in_flight.pop(future)
+                    try:
+                        batch_indexed, batch_errors, complete = future.result()
+                    except Exception as e:
+                        batch_indexed, batch_errors, complete = 0, [str(e)], False
+                    if tracker:
+                        tracker.finished(batch_seq, complete, marks)
+                    indexed += batch_indexed
+                    failed += batch_size - batch_indexed
+                    errors.extend(batch_errors[:max(0, 10 - len(errors))])
+
+                now = time.time()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    print(f"Bulk load: {indexed} indexed, {failed} failed, "
+                          f"{indexed / (now - started):.0f} docs/s", file=sys.stderr)
+                    last_report = now
+
+        elapsed = time.time() - started
+        return {
+            'files': len(files),
+            'resumed_files': resumed,
+            'indexed': indexed,
+            'failed': failed,
+            'retries': self.retries,
+            'elapsed_seconds': round(elapsed, 2),
+            'docs_per_second': round(indexed / elapsed, 1) if elapsed > 0 else 0.0,
+            'errors': errors
+        }
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: es_bulk_loader.py <elasticsearch_url> <ndjson_file_or_dir> [...]")
+        sys.exit(1)
+
+    ledger = open_ledger()
+    loader = BulkLoader(sys.argv[1], ledger=ledger)
+    try:
+        summary = loader.load(sys.argv[2:])
+    finally:
+        if ledger is not None:
+            ledger.close()
+    print(json.dumps(summary))
+    if summary['failed']:
+        print(f"Bulk load: {summary['failed']} documents failed: {summary['errors']}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
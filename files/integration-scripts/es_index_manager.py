@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Index layout manager for forensic case data.
+
+Documents are written through one rollover alias per tool (forensics-<tool>)
+with routing=case_id, so a case's documents sit on a single shard of each
+index. Every case gets a filtered, routed read alias (case-<case_id>) so
+case-scoped queries touch only that case's shards. An ILM policy rolls the
+write indices over by size, and once every case in a rolled-over index is
+closed the index is force-merged, write-blocked and optionally closed so it
+stops costing heap (the freeze API no longer exists in Elasticsearch 8).
+"""
+import json
+import sys
+import requests
+# Import lab configuration
+try:
+    from lab_config import ELASTICSEARCH_URL
+except ImportError:
+    # Fallback to default if config not available
+    ELASTICSEARCH_URL = "http://10.128.0.19:9200"
+
+TOOLS = ['autopsy', 'volatility', 'andriller', 'cape']
+INDEX_PREFIX = 'forensics'
+CASE_ALIAS_PREFIX = 'case-'
+CASE_STATE_INDEX = 'forensics_case_state'  # outside forensics-* so case queries never see it
+ROLLOVER_POLICY = 'forensics-rollover'
+ROLLOVER_MAX_SHARD_SIZE = '30gb'
+COMPOSITE_PAGE_SIZE = 1000
+
+
+def write_alias(tool):
+    return f"{INDEX_PREFIX}-{tool}"
+
+
+def case_alias(case_id):
+    return f"{CASE_ALIAS_PREFIX}{case_id}".lower()
+
+
+class IndexManager:
+    def __init__(self, es_url=ELASTICSEARCH_URL):
+        self.es_url = es_url.rstrip('/')
+        self.session = requests.Session()
+
+    def _request(self, method, path, body=None, allow=(200,)):
+        response = self.session.request(method, f"{self.es_url}{path}", json=body, timeout=300)
+        if response.status_code not in allow:
+            raise RuntimeError(f"{method} {path} failed: {response.status_code} {response.text[:300]}")
+        return response
+
+    def setup(self):
+        """Install the rollover policy and bootstrap a write index behind each tool alias"""
+        self._request('PUT', f"/_ilm/policy/{ROLLOVER_POLICY}", {
+            "policy": {"phases": {"hot": {"actions": {
+                "rollover": {"max_primary_shard_size": ROLLOVER_MAX_SHARD_SIZE}
+            }}}}
+        })
+        for tool in TOOLS:
+            alias = write_alias(tool)
+            if self._request('HEAD', f"/_alias/{alias}", allow=(200, 404)).status_code == 200:
+                continue
+            # The first index must match the forensics-<tool>-* template so it gets the rollover settings
+            self._request('PUT', f"/{alias}-000001", {
+                "aliases": {alias: {"is_write_index": True}}
+            })
+            print(f"Bootstrapped {alias}-000001 behind write alias {alias}")
+
+    def ensure_case_alias(self, case_id):
+        """Point case-<id> at every forensics index, filtered and routed to the case"""
+        self._request('POST', "/_aliases", {"actions": [{
+            "add": {
+                "index": f"{INDEX_PREFIX}-*",
+                "alias": case_alias(case_id),
+                "filter": {"term": {"case_id": case_id}},
+                "routing": case_id
+            }
+        }]})
+        self._request('PUT', f"/{CASE_STATE_INDEX}/_doc/{case_id}?op_type=create",
+                      {"case_id": case_id, "status": "open"}, allow=(200, 201, 409))
+
+    def set_case_status(self, case_id, status):
+        self._request('PUT', f"/{CASE_STATE_INDEX}/_doc/{case_id}?refresh=true",
+                      {"case_id": case_id, "status": status}, allow=(200, 201))
+
+    def closed_cases(self):
+        """Case IDs explicitly marked closed; cases with no recorded state count as active"""
+        response = self._request('POST', f"/{CASE_STATE_INDEX}/_search", {
+            "size": 10000, "query": {"term": {"status": "closed"}}, "_source": ["case_id"]
+        }, allow=(200, 404))
+        if response.status_code == 404:
+            return set()
+        return {hit['_source']['case_id'] for hit in response.json()['hits']['hits']}
+
+    def index_cases(self, index):
+        """Every case_id present in an index, paged with a composite aggregation"""
+        cases = set()
+        after_key = None
+        while True:
+            composite = {"size": COMPOSITE_PAGE_SIZE, "sources": [{"case": {"terms": {"field": "case_id"}}}]}
+            if after_key:
+                composite["after"] = after_key
+            data = self._request('POST', f"/{index}/_search", {
+                "size": 0, "aggs": {"cases": {"composite": composite}}
+            }).json()
+            buckets = data['aggregations']['cases']['buckets']
+            cases.update(bucket['key']['case'] for bucket in buckets)
+            after_key = data['aggregations']['cases'].get('after_key')
+            if not buckets or not after_key:
+                return cases
+
+    def indices(self):
+        """Open forensics indices with their write-index flag and write block"""
+        data = self._request('GET', f"/{INDEX_PREFIX}-*/_settings/index.blocks.write?expand_wildcards=open").json()
+        write_indices = set()
+        for tool in TOOLS:
+            response = self._request('GET', f"/_alias/{write_alias(tool)}", allow=(200, 404))
+            if response.status_code == 200:
+                for index, info in response.json().items():
+                    if info['aliases'][write_alias(tool)].get('is_write_index'):
+                        write_indices.add(index)
+        result = []
+        for index, settings in sorted(data.items()):
+            blocked = settings.get('settings', {}).get('index', {}).get('blocks', {}).get('write') == 'true'
+            result.append({'index': index, 'write_index': index in write_indices, 'write_blocked': blocked})
+        return result
+
+    def compact(self, close_indices=False):
+        """Force-merge and write-block rolled-over indices whose cases are all closed"""
+        closed_cases = self.closed_cases()
+        compacted = []
+        for info in self.indices():
+            if info['write_index'] or info['write_blocked']:
+                continue
+            index = info['index']
+            try:
+                if not self.index_cases(index) <= closed_cases:
+                    continue
+            except RuntimeError as e:
+                # Daily indices from before the typed templates map case_id as text
+                print(f"Skipping {index}: {e}", file=sys.stderr)
+                continue
+            self._request('PUT', f"/{index}/_settings", {"index.blocks.write": True})
+            self._request('POST', f"/{index}/_forcemerge?max_num_segments=1")
+            if close_indices:
+                self._request('POST', f"/{index}/_close")
+            compacted.append(index)
+            print(f"Compacted {index}{' and closed it' if close_indices else ''}")
+        return compacted
+
+    def close_case(self, case_id, close_indices=False):
+        """Mark a case closed and compact any index that now holds only closed cases"""
+        self.set_case_status(case_id, 'closed')
+        return self.compact(close_indices)
+
+    def reopen_case(self, case_id):
+        """Mark a case open again and reopen the compacted indices that hold its documents"""
+        self.set_case_status(case_id, 'open')
+        closed = [entry['index'] for entry in self._request(
+            'GET', f"/_cat/indices/{INDEX_PREFIX}-*?h=index,status&format=json&expand_wildcards=all").json()
+            if entry['status'] == 'close']
+        # A closed index cannot be searched, so open them all and close again the ones without the case
+        if closed:
+            self._request('POST', f"/{','.join(closed)}/_open")
+        for info in self.indices():
+            if not info['write_blocked']:
+                continue
+            if case_id in self.index_cases(info['index']):
+                self._request('PUT', f"/{info['index']}/_settings", {"index.blocks.write": False})
+                print(f"Reopened {info['index']} for case {case_id}")
+            elif info['index'] in closed:
+                self._request('POST', f"/{info['index']}/_close")
+
+
+def main():
+    actions = ('setup', 'case', 'close', 'reopen', 'compact', 'status')
+    if len(sys.argv) < 3 or sys.argv[1] not in actions:
+        print("Usage: es_index_manager.py setup <elasticsearch_url>")
+        print("       es_index_manager.py case <elasticsearch_url> <case_id>")
+        print("       es_index_manager.py close <elasticsearch_url> <case_id> [--close-indices]")
+        print("       es_index_manager.py reopen <elasticsearch_url> <case_id>")
+        print("       es_index_manager.py compact <elasticsearch_url> [--close-indices]")
+        print("       es_index_manager.py status <elasticsearch_url>")
+        sys.exit(1)
+
+    action = sys.argv[1]
+    manager = IndexManager(sys.argv[2])
+    close_indices = '--close-indices' in sys.argv
+    args = [arg for arg in sys.argv[3:] if arg != '--close-indices']
+
+    if action == 'setup':
+        manager.setup()
+    elif action == 'status':
+        print(json.dumps(manager.indices(), indent=2))
+    elif action == 'compact':
+        manager.compact(close_indices)
+    elif not args:
+        print(f"{action} requires a case_id")
+        sys.exit(1)
+    elif action == 'case':
+        manager.ensure_case_alias(args[0])
+    elif action == 'close':
+        manager.close_case(args[0], close_indices)
+    elif action == 'reopen':
+        manager.reopen_case(args[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Ingest ledger for converter NDJSON in /data/processed.
+
+One SQLite row per file records its inode, last seen size and the byte
+offset (and line count) up to which documents have been committed to
+Elasticsearch. es_bulk_loader.py resumes each file from its committed
+offset, and the cleanup commands only compress or archive files the
+ledger marks complete. For compressed converter output the offset counts
+decompressed bytes and a file is complete once the loader reaches the end
+of its stream. A directory whose mtime has not changed since a scan
+found everything complete is skipped outright; otherwise the rescan lists
+it with scandir and compares inodes against one ranged SELECT, so completed
+files are never stat'ed.
+"""
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+# Import lab configuration
+try:
+    from lab_config import INGEST_LEDGER_PATH
+except ImportError:
+    # Fallback to default if config not available
+    INGEST_LEDGER_PATH = "/var/lib/forensics/ingest_ledger.db"
+
+NDJSON_SUFFIXES = ('.json', '.json.gz', '.json.zst')
+ARCHIVE_MIN_AGE = 24 * 3600  # seconds a file must have been complete before archiving
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    committed_offset INTEGER NOT NULL DEFAULT 0,
+    committed_lines INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    archive_path TEXT,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_status ON files (status);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    clean INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+DONE_STATUSES = ('complete', 'archived')
+
+
+def index_path(path):
+    """Hidden sidecar index ndjson_io.NDJSONWriter leaves next to converter output"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.idx')
+
+
+class IngestLedger:
+    def __init__(self, db_path=INGEST_LEDGER_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _row(self, path):
+        row = self.conn.execute(
+            "SELECT inode, size, committed_offset, committed_lines, status FROM files WHERE path = ?",
+            (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('inode', 'size', 'committed_offset', 'committed_lines', 'status'), row))
+
+    def position(self, path, stat=None):
+        """(offset, lines, pending) to resume a file from; starts over if unknown, replaced or truncated"""
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        row = self._row(path)
+        if row is None or row['inode'] != stat.st_ino or stat.st_size < row['size']:
+            return 0, 0, stat.st_size > 0
+        pending = row['status'] not in DONE_STATUSES or stat.st_size > row['size']
+        return row['committed_offset'], row['committed_lines'], pending
+
+    def commit(self, path, inode, offset, lines, size, complete=None):
+        """Record that everything before offset (lines documents) is in Elasticsearch"""
+        if complete is None:
+            complete = offset >= size
+        status = 'complete' if complete else 'partial'
+        self.conn.execute(
+            "INSERT INTO files (path, inode, size, committed_offset, committed_lines, status, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET inode = excluded.inode, size = excluded.size, "
+            "committed_offset = excluded.committed_offset, committed_lines = excluded.committed_lines, "
+            "status = excluded.status, updated_at = excluded.updated_at",
+            (os.path.abspath(path), inode, size, offset, lines, status, time.time()))
+        self.conn.commit()
+
+    def scan(self, directory, suffixes=NDJSON_SUFFIXES):
+        """Files in a directory with uningested data, as (path, inode, size, offset, lines)"""
+        directory = os.path.abspath(directory)
+        # Files are only ever added, renamed or removed here, and each of those bumps the directory mtime
+        mtime_ns = os.stat(directory).st_mtime_ns
+        row = self.conn.execute("SELECT mtime_ns, clean FROM directories WHERE path = ?", (directory,)).fetchone()
+        if row and row[0] == mtime_ns and row[1]:
+            return []
+
+        # Every ledger row for this directory in one ranged primary-key lookup ('0' sorts after '/')
+        known = {path: (inode, status) for path, inode, status in self.conn.execute(
+            "SELECT path, inode, status FROM files WHERE path > ? AND path < ?",
+            (directory + '/', directory + '0'))}
+
+        pending = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffixes):
+                    continue
+                path = entry.path
+                inode_status = known.get(path)
+                # Converters never append to a finished file, so a known inode needs no stat
+                if inode_status and inode_status[1] in DONE_STATUSES and inode_status[0] == entry.inode():
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                offset, lines, needs_load = self.position(path, stat)
+                if needs_load:
+                    pending.append((path, stat.st_ino, stat.st_size, offset, lines))
+        pending.sort()
+
+        # Record the mtime seen before listing, so files created during the scan force another one
+        self.conn.execute(
+            "INSERT INTO directories (path, mtime_ns, clean) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, clean = excluded.clean",
+            (directory, mtime_ns, 0 if pending else 1))
+        self.conn.commit()
+        return pending
+
+    def archive(self, directory, archive_dir, min_age=ARCHIVE_MIN_AGE, compress=True):
+        """Gzip (or move) completed files of a directory into archive_dir; returns the count"""
+        directory = os.path.abspath(directory)
+        os.makedirs(archive_dir, exist_ok=True)
+        cutoff = time.time() - min_age
+        rows = self.conn.execute(
+            "SELECT path, inode, size FROM files WHERE status = 'complete' AND updated_at < ? "
+            "AND path > ? AND path < ?", (cutoff, directory + '/', directory + '0')).fetchall()
+
+        archived = 0
+        for path, inode, size in rows:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # Never archive a file that changed after it was marked complete
+            if stat.st_ino != inode or stat.st_size != size:
+                continue
+            # Converter output written with NDJSON_COMPRESSION is already compressed
+            gzip_it = compress and not path.endswith(('.gz', '.zst'))
+            target = os.path.join(archive_dir, os.path.basename(path) + ('.gz' if gzip_it else ''))
+            tmp_target = target + '.tmp'
+            if gzip_it:
+                with open(path, 'rb') as src, gzip.open(tmp_target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(tmp_target, target)
+                os.remove(path)
+            else:
+                shutil.move(path, target)
+            # The hidden paging index only stays valid while the bytes it points into are unchanged
+            sidecar = index_path(path)
+            if os.path.exists(sidecar):
+                if gzip_it:
+                    os.remove(sidecar)
+                else:
+                    shutil.move(sidecar, index_path(target))
+            self.conn.execute("UPDATE files SET status = 'archived', archive_path = ?, updated_at = ? "
+                              "WHERE path = ?", (target, time.time(), path))
+            self.conn.commit()
+            archived += 1
+        return archived
+
+    def prune(self):
+        """Forget rows for files that no longer exist and were never archived"""
+        missing = [(path,) for path, status in self.conn.execute("SELECT path, status FROM files")
+                   if status != 'archived' and not os.path.exists(path)]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", missing)
+        self.conn.commit()
+        return len(missing)
+
+    def stats(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+        committed = self.conn.execute("SELECT COALESCE(SUM(committed_offset), 0) FROM files").fetchone()[0]
+        return {'files_by_status': counts, 'committed_bytes': committed}
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def open_ledger(db_path=INGEST_LEDGER_PATH):
+    """Open the shared ledger, or return None if it is unavailable on this host"""
+    try:
+        return IngestLedger(db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Ingest ledger unavailable ({db_path}): {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    actions = ('scan', 'archive', 'prune', 'stats')
+    if len(sys.argv) < 2 or sys.argv[1] not in actions:
+        print("Usage: ingest_ledger.py scan <directory>")
+        print("       ingest_ledger.py archive <directory> <archive_dir> [min_age_hours]")
+        print("       ingest_ledger.py prune")
+        print("       ingest_ledger.py stats")
+        sys.exit(1)
+
+    action = sys.argv[1]
+    ledger = IngestLedger()
+    try:
+        if action == 'scan' and len(sys.argv) == 3:
+            started = time.time()
+            pending = ledger.scan(sys.argv[2])
+            for path, _, size, offset, _ in pending:
+                print(f"{path}\t{offset}/{size}")
+            print(f"{len(pending)} files pending ({(time.time() - started) * 1000:.1f} ms)", file=sys.stderr)
+        elif action == 'archive' and len(sys.argv) in (4, 5):
+            min_age = float(sys.argv[4]) * 3600 if len(sys.argv) == 5 else ARCHIVE_MIN_AGE
+            count = ledger.archive(sys.argv[2], sys.argv[3], min_age)
+            print(f"Archived {count} completed files to {sys.argv[3]}")
+        elif action == 'prune':
+            print(f"Removed {ledger.prune()} ledger entries for missing files")
+        elif action == 'stats':
+            print(json.dumps(ledger.stats(), indent=2))
+        else:
+            print(f"Invalid arguments for {action}")
+            sys.exit(1)
+    finally:
+        ledger.close()
+
+
+if __name__ == '__main__':
+    main()
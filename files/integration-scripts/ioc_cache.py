@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Persistent IOC verdict cache for MISP lookups.
+
+Verdicts are keyed by (MISP attribute type, value) in a local SQLite file.
+Hits and misses have separate TTLs, the table is bounded by LRU eviction,
+and hit/miss counters are kept so the cache's effect can be measured.
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+# Import lab configuration
+try:
+    from lab_config import IOC_CACHE_PATH
+except ImportError:
+    # Fallback to default if config not available
+    IOC_CACHE_PATH = "/var/lib/forensics/ioc_cache.db"
+
+HIT_TTL = 7 * 24 * 3600      # positive verdicts: 7 days
+MISS_TTL = 6 * 3600          # negative verdicts: 6 hours
+MAX_ENTRIES = 1000000
+TOUCH_INTERVAL = 300         # only rewrite last_access when it is older than this
+EVICT_CHECK_INTERVAL = 1000  # puts between size checks
+LOOKUP_CHUNK = 500           # values per IN (...) query
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    ioc_type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    hit INTEGER NOT NULL,
+    attributes TEXT,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (ioc_type, value)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS verdicts_last_access ON verdicts (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+
+class IOCCache:
+    def __init__(self, db_path=IOC_CACHE_PATH, hit_ttl=HIT_TTL, miss_ttl=MISS_TTL, max_entries=MAX_ENTRIES):
+        self.db_path = db_path
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_check = 0
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get(self, ioc_type, value):
+        """Return cached attributes for a value ([] for a cached miss), or None if not cached"""
+        return self.get_many(ioc_type, [value]).get(value)
+
+    def get_many(self, ioc_type, values):
+        """Return {value: attributes} for every value with a live cached verdict"""
+        now = time.time()
+        values = list(values)
+        found = {}
+        stale_access = []
+
+        for i in range(0, len(values), LOOKUP_CHUNK):
+            chunk = values[i:i + LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT value, hit, attributes, last_access FROM verdicts "
+                f"WHERE ioc_type = ? AND value IN ({placeholders}) AND expires_at > ?",
+                [ioc_type] + chunk + [now]
+            )
+            for value, hit, attributes, last_access in rows:
+                found[value] = json.loads(attributes) if hit else []
+                if now - last_access > TOUCH_INTERVAL:
+                    stale_access.append((now, ioc_type, value))
+
+        if stale_access:
+            self.conn.executemany(
+                "UPDATE verdicts SET last_access = ? WHERE ioc_type = ? AND value = ?", stale_access)
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(set(values)) - len(found)
+        return found
+
+    def put(self, ioc_type, value, attributes):
+        """Store the verdict for one value; an empty attribute list records a miss"""
+        self.put_many(ioc_type, {value: attributes})
+
+    def put_many(self, ioc_type, verdicts):
+        """Store verdicts from a {value: attributes} mapping"""
+        now = time.time()
+        rows = []
+        for value, attributes in verdicts.items():
+            if attributes:
+                rows.append((ioc_type, value, 1, json.dumps(attributes), now + self.hit_ttl, now))
+            else:
+                rows.append((ioc_type, value, 0, None, now + self.miss_ttl, now))
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO verdicts (ioc_type, value, hit, attributes, expires_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+        self._puts_since_check += len(rows)
+        if self._puts_since_check >= EVICT_CHECK_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """Drop expired verdicts, then least recently used ones beyond max_entries"""
+        self._puts_since_check = 0
+        expired = self.conn.execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),)).rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        evicted = 0
+        if count > self.max_entries:
+            # Evict down to 90% so eviction is not triggered on every put
+            excess = count - int(self.max_entries * 0.9)
+            evicted = self.conn.execute(
+                "DELETE FROM verdicts WHERE (ioc_type, value) IN "
+                "(SELECT ioc_type, value FROM verdicts ORDER BY last_access LIMIT ?)", (excess,)
+            ).rowcount
+        self.conn.commit()
+        return expired, evicted
+
+    def stats(self):
+        """Return entry counts and hit ratios for this session and all time"""
+        totals = dict(self.conn.execute("SELECT name, count FROM stats").fetchall())
+        total_hits = totals.get('hits', 0) + self.hits
+        total_misses = totals.get('misses', 0) + self.misses
+        entries, positive = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(hit), 0) FROM verdicts").fetchone()
+        return {
+            'entries': entries,
+            'positive_entries': positive,
+            'session_hits': self.hits,
+            'session_misses': self.misses,
+            'session_hit_ratio': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            'total_hits': total_hits,
+            'total_misses': total_misses,
+            'total_hit_ratio': total_hits / (total_hits + total_misses) if total_hits + total_misses else 0.0
+        }
+
+    def close(self):
+        """Persist the session counters and close the database"""
+        if self.conn is None:
+            return
+        for name, count in (('hits', self.hits), ('misses', self.misses)):
+            self.conn.execute(
+                "INSERT INTO stats (name, count) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET count = count + excluded.count", (name, count))
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+
+def open_cache(db_path=IOC_CACHE_PATH):
+    """Open the shared cache, or return None if it is unavailable on this host"""
+    try:
+        return IOCCache(db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"IOC cache unavailable ({db_path}): {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    if len(sys.argv) not in (2, 3) or sys.argv[1] not in ('stats', 'prune', 'clear'):
+        print("Usage: ioc_cache.py <stats|prune|clear> [cache_db]")
+        sys.exit(1)
+
+    action = sys.argv[1]
+    cache = IOCCache(sys.argv[2] if len(sys.argv) == 3 else IOC_CACHE_PATH)
+
+    try:
+        if action == 'stats':
+            print(json.dumps(cache.stats(), indent=2))
+        elif action == 'prune':
+            expired, evicted = cache.evict()
+            print(f"Removed {expired} expired and {evicted} least recently used verdicts")
+        elif action == 'clear':
+            cache.conn.execute("DELETE FROM verdicts")
+            cache.conn.execute("DELETE FROM stats")
+            cache.conn.commit()
+            print("IOC cache cleared")
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
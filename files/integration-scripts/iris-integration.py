@@ -1,20 +1,35 @@
 #!/usr/bin/env python3
 import requests
 import json
+import os
+import socket
 import sys
+import threading
+import time
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 # Import lab configuration
 try:
-    from lab_config import IRIS_URL, IRIS_SERVER
+    from lab_config import IRIS_URL, IRIS_SERVER, IRIS_DAEMON_SOCKET
 except ImportError:
     # Fallback to default if config not available
     IRIS_URL = "https://10.128.0.19:443"
     IRIS_SERVER = "10.128.0.19"
+    IRIS_DAEMON_SOCKET = "/run/forensics/iris.sock"
+
+SESSION_POOL_SIZE = 16
 
 class IRISIntegration:
     def __init__(self, iris_url, username, password):
         self.iris_url = iris_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.logged_in_at = 0
+        self.login_lock = threading.Lock()
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.login(username, password)
     
     def login(self, username, password):
@@ -28,18 +43,34 @@ class IRISIntegration:
         try:
             response = self.session.post(login_url, data=login_data)
             if response.status_code != 200:
-                print(f"IRIS login failed: {response.status_code}")
+                print(f"IRIS login failed: {response.status_code}", file=sys.stderr)
             else:
-                print("Successfully logged into IRIS")
+                self.logged_in_at = time.time()
+                print("Successfully logged into IRIS", file=sys.stderr)
         except Exception as e:
-            print(f"Error logging into IRIS: {e}")
+            print(f"Error logging into IRIS: {e}", file=sys.stderr)
+    
+    def relogin(self, seen_login_at):
+        """Refresh an expired session once, even if several threads notice at the same time"""
+        with self.login_lock:
+            if self.logged_in_at == seen_login_at:
+                self.login(self.username, self.password)
+    
+    def _post(self, url, payload):
+        """POST JSON, logging in again and retrying once if the session has expired"""
+        seen_login_at = self.logged_in_at
+        response = self.session.post(url, json=payload)
+        if response.status_code in [401, 403] or response.url.rstrip('/').endswith('/login'):
+            self.relogin(seen_login_at)
+            response = self.session.post(url, json=payload)
+        return response
     
     def create_case(self, case_data):
         """Create a new case in IRIS"""
         url = f"{self.iris_url}/case/add"
         
         try:
-            response = self.session.post(url, json=case_data)
+            response = self._post(url, case_data)
             return response.json() if response.status_code in [200, 201] else None
         except Exception as e:
             print(f"Error creating IRIS case: {e}")
@@ -50,7 +81,7 @@ class IRISIntegration:
         url = f"{self.iris_url}/case/{case_id}/evidence/add"
         
         try:
-            response = self.session.post(url, json=evidence_data)
+            response = self._post(url, evidence_data)
             return response.json() if response.status_code in [200, 201] else None
         except Exception as e:
             print(f"Error adding evidence to IRIS: {e}")
@@ -61,7 +92,7 @@ class IRISIntegration:
         url = f"{self.iris_url}/case/{case_id}/timeline/add"
         
         try:
-            response = self.session.post(url, json=timeline_data)
+            response = self._post(url, timeline_data)
             return response.json() if response.status_code in [200, 201] else None
         except Exception as e:
             print(f"Error creating IRIS timeline entry: {e}")
@@ -77,79 +108,121 @@ class IRISIntegration:
         }
         
         try:
-            response = self.session.post(url, json=update_data)
+            response = self._post(url, update_data)
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Error updating IRIS case: {e}")
             return None
 
-def main():
-    if len(sys.argv) < 5:
-        print("Usage: iris_integration.py <iris_url> <username> <password> <action> [args...]")
-        print("Actions:")
-        print("  create_case <name> <description> <investigator>")
-        print("  add_evidence <case_id> <evidence_name> <evidence_type> <evidence_path>")
-        print("  update_status <case_id> <status> <notes>")
-        sys.exit(1)
-    
-    iris_url = sys.argv[1]
-    username = sys.argv[2]
-    password = sys.argv[3]
-    action = sys.argv[4]
-    
-    iris = IRISIntegration(iris_url, username, password)
-    
+def build_action(action, args):
+    """Turn CLI action arguments into (method name, positional args); raises ValueError on bad usage"""
     if action == 'create_case':
-        if len(sys.argv) != 8:
-            print("Usage: create_case <name> <description> <investigator>")
-            sys.exit(1)
+        if len(args) != 3:
+            raise ValueError("Usage: create_case <name> <description> <investigator>")
         
         case_data = {
-            'case_name': sys.argv[5],
-            'case_description': sys.argv[6],
+            'case_name': args[0],
+            'case_description': args[1],
             'case_customer': 1,  # Default customer
             'case_classification': 'internal',
-            'case_owner': sys.argv[7],
+            'case_owner': args[2],
             'case_opening_date': datetime.now().strftime('%Y-%m-%d'),
             'case_severity': 'medium'
         }
-        
-        result = iris.create_case(case_data)
-        print(json.dumps(result) if result else "Case creation failed")
+        return 'create_case', [case_data], "Case creation failed"
     
     elif action == 'add_evidence':
-        if len(sys.argv) != 9:
-            print("Usage: add_evidence <case_id> <evidence_name> <evidence_type> <evidence_path>")
-            sys.exit(1)
+        if len(args) != 4:
+            raise ValueError("Usage: add_evidence <case_id> <evidence_name> <evidence_type> <evidence_path>")
         
-        case_id = sys.argv[5]
         evidence_data = {
-            'filename': sys.argv[6],
-            'file_description': f"Evidence: {sys.argv[7]}",
-            'file_path': sys.argv[8],
+            'filename': args[1],
+            'file_description': f"Evidence: {args[2]}",
+            'file_path': args[3],
             'file_hash': '',  # Would be calculated
             'file_size': 0,   # Would be calculated
             'added_by': 'automation'
         }
-        
-        result = iris.add_evidence(case_id, evidence_data)
-        print(json.dumps(result) if result else "Evidence addition failed")
+        return 'add_evidence', [args[0], evidence_data], "Evidence addition failed"
     
     elif action == 'update_status':
-        if len(sys.argv) != 8:
-            print("Usage: update_status <case_id> <status> <notes>")
-            sys.exit(1)
-        
-        case_id = sys.argv[5]
-        status = sys.argv[6]
-        notes = sys.argv[7]
-        
-        result = iris.update_case_status(case_id, status, notes)
-        print(json.dumps(result) if result else "Status update failed")
+        if len(args) != 3:
+            raise ValueError("Usage: update_status <case_id> <status> <notes>")
+        return 'update_case_status', [args[0], args[1], args[2]], "Status update failed"
+    
+    raise ValueError(f"Unknown action: {action}")
+
+def run_action(iris, action, args):
+    """Run a CLI action against an IRISIntegration and return the text the CLI prints"""
+    method, method_args, failure_message = build_action(action, args)
+    result = getattr(iris, method)(*method_args)
+    return json.dumps(result) if result else failure_message
+
+def daemon_request(socket_path, request):
+    """Send one request to iris_daemon.py and return its decoded reply"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(300)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b'\n')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        client.close()
+    return json.loads(reply)
+
+def main():
+    if len(sys.argv) < 5:
+        print("Usage: iris_integration.py <iris_url> <username> <password> <action> [args...]")
+        print("Actions:")
+        print("  create_case <name> <description> <investigator>")
+        print("  add_evidence <case_id> <evidence_name> <evidence_type> <evidence_path>")
+        print("  update_status <case_id> <status> <notes>")
+        sys.exit(1)
+    
+    iris_url = sys.argv[1]
+    username = sys.argv[2]
+    password = sys.argv[3]
+    action = sys.argv[4]
+    args = sys.argv[5:]
     
-    else:
-        print(f"Unknown action: {action}")
+    try:
+        build_action(action, args)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
+    
+    # Hand the action to the sidecar daemon when it is running, so the
+    # login and TLS handshake are not repeated for every call
+    socket_path = os.environ.get('IRIS_DAEMON_SOCKET', IRIS_DAEMON_SOCKET)
+    if os.path.exists(socket_path):
+        try:
+            reply = daemon_request(socket_path, {
+                'iris_url': iris_url,
+                'username': username,
+                'password': password,
+                'action': action,
+                'args': args
+            })
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            print(f"IRIS daemon unavailable, connecting directly: {e}", file=sys.stderr)
+        except (OSError, ValueError) as e:
+            # The request may already have reached IRIS, so never replay it directly
+            print(f"IRIS daemon request failed: {e}")
+            sys.exit(1)
+        else:
+            if not reply.get('ok'):
+                print(f"IRIS daemon error: {reply.get('error')}")
+                sys.exit(1)
+            print(reply['output'])
+            return
+    
+    iris = IRISIntegration(iris_url, username, password)
+    print(run_action(iris, action, args))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
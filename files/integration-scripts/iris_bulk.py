@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Bulk IRIS client.
+
+Pushes batches of timeline events, IOCs and notes into an IRIS case over a
+pooled keep-alive session, with bounded concurrency, a token-bucket rate
+limit and jittered retries. irisAPI.groovy calls it once per stage instead
+of issuing one httpRequest per item.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Import lab configuration
+try:
+    from lab_config import IRIS_URL
+except ImportError:
+    # Fallback to default if config not available
+    IRIS_URL = "https://10.128.0.19:443"
+
+MAX_WORKERS = 8          # concurrent requests
+RATE_LIMIT = 25.0        # requests per second
+RATE_BURST = 50          # token bucket capacity
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5   # seconds, doubled per attempt before jitter
+RETRY_MAX_DELAY = 30.0
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+
+# Same mapping as irisAPI.getIOCTypeId
+IOC_TYPE_IDS = {
+    'ip': 1,
+    'domain': 2,
+    'url': 3,
+    'file_hash': 4,
+    'email': 5,
+    'filename': 6,
+    'registry_key': 7,
+    'process': 8
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate across workers"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class IRISBulkClient:
+    def __init__(self, iris_url, api_key, max_workers=MAX_WORKERS, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.iris_url = iris_url.rstrip('/')
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, payload):
+        """POST one item, retrying 429/5xx and connection errors with exponential backoff and full jitter"""
+        url = f"{self.iris_url}{path}"
+        error = None
+        for attempt in range(MAX_RETRIES):
+            self.bucket.acquire()
+            try:
+                response = self.session.post(url, json=payload, timeout=60)
+                if response.status_code in [200, 201]:
+                    return response
+                if response.status_code != 429 and response.status_code < 500:
+                    raise RuntimeError(f"IRIS rejected request: {response.status_code}")
+                error = RuntimeError(f"IRIS request failed: {response.status_code}")
+                retry_after = response.headers.get('Retry-After')
+            except requests.RequestException as e:
+                error = e
+                retry_after = None
+
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(random.uniform(0, delay))
+        raise error
+
+    def send_all(self, path, payloads, label):
+        """Send payloads with bounded in-flight requests and report progress and throughput"""
+        started = time.time()
+        last_report = started
+        sent = failed = 0
+        errors = []
+        payloads = iter(payloads)
+        in_flight = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep a bounded window of submitted work so large inputs are never all queued
+                while not exhausted and len(in_flight) < self.max_workers * 2:
+                    payload = next(payloads, None)
+                    if payload is None:
+                        exhausted = True
+                        break
+                    in_flight.add(executor.submit(self.post, path, payload))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        future.result()
+                        sent += 1
+                    except Exception as e:
+                        failed += 1
+                        if len(errors) < 10:
+                            errors.append(str(e))
+
+                now = time.time()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    print(f"IRIS {label}: {sent} sent, {failed} failed, "
+                          f"{sent / (now - started):.1f}/s", file=sys.stderr)
+                    last_report = now
+
+        elapsed = time.time() - started
+        return {
+            'type': label,
+            'sent': sent,
+            'failed': failed,
+            'elapsed_seconds': round(elapsed, 2),
+            'per_second': round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+            'errors': errors
+        }
+
+    def add_timeline(self, case_id, events):
+        """Add timeline events (title, description, timestamp, tags) to a case"""
+        payloads = ({
+            'event_title': event.get('title'),
+            'event_content': event.get('description'),
+            'event_date': event.get('timestamp'),
+            'event_tags': event.get('tags') or ['automated'],
+            'case_id': case_id
+        } for event in events)
+        return self.send_all('/case/timeline/events/add', payloads, 'timeline')
+
+    def add_iocs(self, case_id, iocs):
+        """Add IOCs (value, type, description) to a case"""
+        payloads = ({
+            'ioc_value': ioc.get('value'),
+            'ioc_type_id': IOC_TYPE_IDS.get(ioc.get('type'), 4),  # Default to file_hash
+            'ioc_description': ioc.get('description') or 'Automatically extracted IOC',
+            'ioc_tags': ['automated', 'extracted'],
+            'case_id': case_id
+        } for ioc in iocs)
+        return self.send_all('/case/ioc/add', payloads, 'iocs')
+
+    def add_notes(self, case_id, findings):
+        """Add automated findings (type, description) to a case as notes"""
+        payloads = ({
+            'note_title': f"Automated Finding: {finding.get('type')}",
+            'note_content': finding.get('description'),
+            'note_tags': ['automated', 'ioc', finding.get('type')],
+            'case_id': case_id
+        } for finding in findings)
+        return self.send_all('/case/notes/add', payloads, 'notes')
+
+
+def main():
+    if len(sys.argv) != 5 or sys.argv[2] not in ('timeline', 'iocs', 'notes'):
+        print("Usage: iris_bulk.py <iris_api_url> <timeline|iocs|notes> <case_id> <items_json>")
+        print("The IRIS API key is read from the IRIS_API_KEY environment variable")
+        sys.exit(1)
+
+    iris_url = sys.argv[1]
+    item_type = sys.argv[2]
+    case_id = sys.argv[3]
+    items_file = sys.argv[4]
+
+    api_key = os.environ.get('IRIS_API_KEY')
+    if not api_key:
+        print("IRIS_API_KEY is not set")
+        sys.exit(1)
+
+    with open(items_file, 'r') as f:
+        items = json.load(f)
+
+    client = IRISBulkClient(iris_url, api_key)
+    if item_type == 'timeline':
+        summary = client.add_timeline(case_id, items)
+    elif item_type == 'iocs':
+        summary = client.add_iocs(case_id, items)
+    else:
+        summary = client.add_notes(case_id, items)
+
+    print(json.dumps(summary))
+    if summary['failed']:
+        print(f"IRIS {item_type}: {summary['failed']} items failed: {summary['errors']}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
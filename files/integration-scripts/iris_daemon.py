@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+IRIS sidecar daemon.
+
+Holds one authenticated IRISIntegration per (IRIS URL, username) and serves
+iris-integration.py actions over a Unix socket, so pipeline steps and
+concurrent builds reuse logged-in sessions and their connection pool instead
+of logging in for every call. Sessions are refreshed when IRIS rejects them
+and proactively after SESSION_MAX_AGE.
+
+Protocol: one JSON request line per connection
+    {"iris_url", "username", "password", "action", "args"}
+answered by one JSON line {"ok": true, "output": ...} or {"ok": false, "error": ...}.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+# iris-integration.py is not importable by name because of the hyphen
+_spec = importlib.util.spec_from_file_location(
+    'iris_integration', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iris-integration.py'))
+iris_integration = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(iris_integration)
+
+SESSION_MAX_AGE = 3600  # seconds before a session is proactively refreshed
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(iris_url, username, password):
+    """Return the shared IRISIntegration for these credentials, logging in if needed"""
+    key = (iris_url.rstrip('/'), username, hashlib.sha256(password.encode()).hexdigest())
+    with _sessions_lock:
+        iris = _sessions.get(key)
+        if iris is None:
+            iris = iris_integration.IRISIntegration(iris_url, username, password)
+            _sessions[key] = iris
+    if time.time() - iris.logged_in_at > SESSION_MAX_AGE:
+        iris.relogin(iris.logged_in_at)
+    return iris
+
+
+class IRISRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            iris = get_session(request['iris_url'], request['username'], request['password'])
+            output = iris_integration.run_action(iris, request['action'], request.get('args', []))
+            reply = {'ok': True, 'output': output}
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class IRISDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    if len(sys.argv) > 2:
+        print("Usage: iris_daemon.py [socket_path]")
+        sys.exit(1)
+
+    socket_path = sys.argv[1] if len(sys.argv) == 2 else os.environ.get(
+        'IRIS_DAEMON_SOCKET', iris_integration.IRIS_DAEMON_SOCKET)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = IRISDaemon(socket_path, IRISRequestHandler)
+    # Owner and group only: requests carry IRIS credentials
+    os.chmod(socket_path, 0o660)
+    print(f"IRIS daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    main()
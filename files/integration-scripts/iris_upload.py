@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Streaming report uploader for IRIS.
+
+Sends a report from disk as multipart/form-data without reading it into
+memory. IRIS takes the file in a single request, so a failed upload is
+retried as a whole with a freshly opened stream.
+"""
+import json
+import os
+import random
+import sys
+import time
+import uuid
+import requests
+import urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+UPLOAD_PATH = '/datastore/file/add-interactive'
+READ_SIZE = 1024 * 1024  # bytes read from disk per block
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+
+class MultipartFileStream:
+    """Iterable multipart body for a file, with a known length"""
+
+    def __init__(self, path, fields, file_field, filename):
+        self.path = path
+        self.length = os.path.getsize(path)
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        parts = []
+        for name, value in fields.items():
+            parts.append(f'--{self.boundary}\r\n'
+                         f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                         f'{value}\r\n')
+        parts.append(f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n')
+        self.preamble = ''.join(parts).encode()
+        self.epilogue = f'\r\n--{self.boundary}--\r\n'.encode()
+
+    def __len__(self):
+        return len(self.preamble) + self.length + len(self.epilogue)
+
+    def __iter__(self):
+        yield self.preamble
+        remaining = self.length
+        with open(self.path, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(READ_SIZE, remaining))
+                if not block:
+                    raise IOError(f"{self.path} shrank during upload")
+                remaining -= len(block)
+                yield block
+        yield self.epilogue
+
+
+class IRISUploader:
+    def __init__(self, iris_url, api_key):
+        self.iris_url = iris_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f'Bearer {api_key}'})
+        self.session.verify = False
+
+    def _send(self, url, make_stream):
+        """POST a freshly built stream, retrying transient failures with jittered backoff"""
+        error = None
+        for attempt in range(MAX_RETRIES):
+            stream = make_stream()
+            try:
+                response = self.session.post(url, data=stream,
+                                             headers={'Content-Type': stream.content_type}, timeout=600)
+                if response.status_code in [200, 201]:
+                    return response
+                if response.status_code != 429 and response.status_code < 500:
+                    raise RuntimeError(f"IRIS rejected upload: {response.status_code} {response.text[:200]}")
+                error = RuntimeError(f"IRIS upload failed: {response.status_code}")
+            except (requests.RequestException, IOError) as e:
+                error = e
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            print(f"Upload attempt {attempt + 1} failed ({error}), retrying", file=sys.stderr)
+            time.sleep(random.uniform(delay / 2, delay))
+        raise error
+
+    def upload(self, case_id, report_path, description='Automated forensic analysis report'):
+        """Upload a report to a case"""
+        url = f"{self.iris_url}{UPLOAD_PATH}?cid={case_id}"
+        filename = os.path.basename(report_path)
+        total = os.path.getsize(report_path)
+        fields = {
+            'file_original_name': filename,
+            'file_description': description,
+            'file_tags': 'report,automated,forensics',
+            'file_password': '',
+            'file_is_evidence': 'n',
+            'file_is_ioc': 'n'
+        }
+        started = time.time()
+
+        response = self._send(url, lambda: MultipartFileStream(
+            report_path, fields, 'file_content', filename))
+
+        elapsed = time.time() - started
+        print(f"Uploaded {filename} ({total} bytes) to IRIS case {case_id} in {elapsed:.1f}s "
+              f"({total / elapsed / 1048576 if elapsed > 0 else 0:.1f} MiB/s)", file=sys.stderr)
+        try:
+            return response.json()
+        except ValueError:
+            return {'status': 'success'}
+
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: iris_upload.py <iris_api_url> <case_id> <report_path>")
+        print("The IRIS API key is read from the IRIS_API_KEY environment variable")
+        sys.exit(1)
+
+    api_key = os.environ.get('IRIS_API_KEY')
+    if not api_key:
+        print("IRIS_API_KEY is not set")
+        sys.exit(1)
+
+    uploader = IRISUploader(sys.argv[1], api_key)
+    try:
+        result = uploader.upload(sys.argv[2], sys.argv[3])
+    except Exception as e:
+        print(f"Error uploading report to IRIS: {e}")
+        sys.exit(2)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -28,3 +28,11 @@ SSH_USER = "olusecc"
 EVIDENCE_PATH = "/data/evidence"
 PROCESSED_PATH = "/data/processed"
 CASES_PATH = "/data/cases"
+
+# Local caches
+IOC_CACHE_PATH = "/var/lib/forensics/ioc_cache.db"
+MISP_MIRROR_PATH = "/var/lib/forensics/misp_mirror"
+INGEST_LEDGER_PATH = "/var/lib/forensics/ingest_ledger.db"
+
+# Local services
+IRIS_DAEMON_SOCKET = "/run/forensics/iris.sock"
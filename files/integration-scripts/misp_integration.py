@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 import requests
+import hashlib
 import json
+import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 import urllib3
+from urllib3.util.retry import Retry
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from ioc_cache import open_cache
+from misp_mirror import MISPMirror, MISP_MIRROR_PATH
 # Import lab configuration
 try:
     from lab_config import MISP_URL, MISP_SERVER
@@ -13,18 +22,67 @@ except ImportError:
     MISP_URL = "http://10.128.0.19:80"
     MISP_SERVER = "10.128.0.19"
 
+# Bulk lookup tuning
+SEARCH_BATCH_SIZE = 200   # IOC values per restSearch request
+SEARCH_PAGE_LIMIT = 1000  # attributes per restSearch page
+SEARCH_WORKERS = 4        # concurrent restSearch requests
+ENRICH_WINDOW = 5000      # findings resolved together before being emitted
+HIGH_VALUE_SCORE = 5      # findings scoring above this are published to MISP
+
+# Event publishing tuning
+EVENT_BATCH_SIZE = 500    # attributes per /attributes/add request
+EVENT_WORKERS = 4         # concurrent /attributes/add requests
+EVENT_RETRIES = 3         # attempts per attribute batch
+
+HASH_TYPES = ('md5', 'sha1', 'sha256')
+
+# Jenkins forensicsCore.detectIOCType names -> MISP attribute types
+IOC_TYPE_MAP = {
+    'ip': 'ip-dst',
+    'domain': 'domain',
+    'email': 'email-src',
+    'md5_hash': 'md5',
+    'sha1_hash': 'sha1',
+    'sha256_hash': 'sha256'
+}
+
 class MISPIntegration:
-    def __init__(self, misp_url, api_key):
+    def __init__(self, misp_url, api_key, max_workers=SEARCH_WORKERS, cache=None):
         self.misp_url = misp_url.rstrip('/')
         self.api_key = api_key
+        self.max_workers = max_workers
+        self.cache = cache
         self.headers = {
             'Authorization': api_key,
             'Accept': 'application/json',
             'Content-type': 'application/json'
         }
+        
+        # Keep-alive pools sized for the worker count. Only restSearch is a read, so only
+        # search_session replays 502/503/504 at the transport level; event creation and
+        # attribute adds go through session, where a replayed POST would duplicate the event
+        search_retries = Retry(total=3, backoff_factor=0.5,
+                               status_forcelist=[502, 503, 504],
+                               allowed_methods=frozenset(['GET', 'POST']))
+        self.session = self._open_session(max_workers, retries=0)
+        self.search_session = self._open_session(max_workers, retries=search_retries)
+    
+    def _open_session(self, pool_size, retries):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
     
     def search_attributes(self, ioc_value, ioc_type='hash-sha256'):
         """Search for IOCs in MISP"""
+        if self.cache is not None:
+            cached = self.cache.get(ioc_type, ioc_value)
+            if cached is not None:
+                return {'response': {'Attribute': cached}}
+        
         search_url = f"{self.misp_url}/attributes/restSearch"
         search_data = {
             'value': ioc_value,
@@ -34,14 +92,15 @@ class MISPIntegration:
         }
         
         try:
-            response = requests.post(search_url, 
-                                   headers=self.headers,
-                                   data=json.dumps(search_data),
-                                   verify=False,
-                                   timeout=30)
+            response = self.search_session.post(search_url,
+                                                data=json.dumps(search_data),
+                                                timeout=30)
             
             if response.status_code == 200:
-                return response.json()
+                result = response.json()
+                if self.cache is not None:
+                    self.cache.put(ioc_type, ioc_value, result.get('response', {}).get('Attribute', []))
+                return result
             else:
                 print(f"MISP search failed: {response.status_code}")
                 return None
@@ -50,31 +109,87 @@ class MISPIntegration:
             print(f"Error searching MISP: {e}")
             return None
     
-    def create_event(self, case_id, findings):
-        """Create MISP event from forensic findings"""
-        event_data = {
-            'Event': {
-                'info': f'Forensic Analysis - Case {case_id}',
-                'threat_level_id': '2',  # Medium
-                'analysis': '1',  # Ongoing
-                'distribution': '1',  # This community only
-                'published': False,
-                'Attribute': []
+    def _search_batch(self, values, ioc_type):
+        """Run one multi-value restSearch, following pages until exhausted"""
+        search_url = f"{self.misp_url}/attributes/restSearch"
+        attributes = []
+        page = 1
+        
+        while True:
+            search_data = {
+                'value': values,
+                'type': ioc_type,
+                'limit': SEARCH_PAGE_LIMIT,
+                'page': page
             }
-        }
+            response = self.search_session.post(search_url,
+                                                data=json.dumps(search_data),
+                                                timeout=60)
+            if response.status_code != 200:
+                raise RuntimeError(f"MISP search failed: {response.status_code}")
+            
+            page_attributes = response.json().get('response', {}).get('Attribute', [])
+            attributes.extend(page_attributes)
+            if len(page_attributes) < SEARCH_PAGE_LIMIT:
+                return attributes
+            page += 1
+    
+    def search_attributes_bulk(self, ioc_values, ioc_type='sha256', batch_size=SEARCH_BATCH_SIZE):
+        """Look up many IOC values with batched, concurrent restSearch calls.
+        
+        Returns a dict mapping each matched value to its MISP attributes.
+        """
+        values = sorted(set(ioc_values))
+        matches = {}
+        
+        # Serve what we can from the local verdict cache
+        if self.cache is not None:
+            cached = self.cache.get_many(ioc_type, values)
+            for value, attributes in cached.items():
+                if attributes:
+                    matches[value] = attributes
+            values = [value for value in values if value not in cached]
+        
+        batches = [values[i:i + batch_size] for i in range(0, len(values), batch_size)]
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._search_batch, batch, ioc_type): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    attributes = future.result()
+                except Exception as e:
+                    print(f"Error searching MISP batch of {len(futures[future])} {ioc_type} values: {e}")
+                    continue
+                batch_matches = {}
+                for attribute in attributes:
+                    value = attribute.get('value', '')
+                    if ioc_type in HASH_TYPES:
+                        value = value.lower()
+                    batch_matches.setdefault(value, []).append(attribute)
+                matches.update(batch_matches)
+                
+                # Only completed batches are cached, so failures never become false misses
+                if self.cache is not None:
+                    self.cache.put_many(ioc_type, {value: batch_matches.get(value, []) for value in futures[future]})
+        
+        return matches
+    
+    def build_event_attributes(self, case_id, findings):
+        """Build the deduplicated, deterministically ordered attribute list for a case"""
+        attributes = {}
         
         # Add attributes from findings
         for finding in findings:
             if 'file_hash' in finding and finding['file_hash']:
-                event_data['Event']['Attribute'].append({
+                attributes.setdefault(('sha256', finding['file_hash'].lower()), {
                     'category': 'Payload delivery',
                     'type': 'sha256',
-                    'value': finding['file_hash'],
+                    'value': finding['file_hash'].lower(),
                     'comment': f"Found in case {case_id} - {finding.get('source', 'unknown')}"
                 })
             
             if 'ip_address' in finding and finding['ip_address']:
-                event_data['Event']['Attribute'].append({
+                attributes.setdefault(('ip-dst', finding['ip_address']), {
                     'category': 'Network activity',
                     'type': 'ip-dst',
                     'value': finding['ip_address'],
@@ -82,98 +197,292 @@ class MISPIntegration:
                 })
             
             if 'url' in finding and finding['url']:
-                event_data['Event']['Attribute'].append({
+                attributes.setdefault(('url', finding['url']), {
                     'category': 'Network activity',
                     'type': 'url',
                     'value': finding['url'],
                     'comment': f"URL from case {case_id}"
                 })
         
-        create_url = f"{self.misp_url}/events"
-        try:
-            response = requests.post(create_url,
-                                   headers=self.headers,
-                                   data=json.dumps(event_data),
-                                   verify=False,
-                                   timeout=30)
+        return [attributes[key] for key in sorted(attributes)]
+    
+    def _add_attributes(self, event_id, batch):
+        """Add one batch of attributes to an event, retrying transient failures"""
+        add_url = f"{self.misp_url}/attributes/add/{event_id}"
+        for attempt in range(1, EVENT_RETRIES + 1):
+            try:
+                response = self.session.post(add_url, data=json.dumps(batch), timeout=120)
+                if response.status_code in [200, 201]:
+                    return len(batch)
+                if response.status_code < 500 and response.status_code != 429:
+                    raise RuntimeError(f"MISP rejected attribute batch: {response.status_code}")
+                error = RuntimeError(f"MISP attribute batch failed: {response.status_code}")
+            except requests.RequestException as e:
+                error = e
+            if attempt < EVENT_RETRIES:
+                time.sleep(2 ** attempt)
+        raise error
+    
+    def create_event(self, case_id, findings, state_file=None):
+        """Create MISP event from forensic findings.
+        
+        The event shell is created first and attributes are then added in
+        concurrent batches. Progress is recorded in state_file, so rerunning
+        after a failure reuses the event and only sends the missing batches.
+        """
+        started = time.time()
+        attributes = self.build_event_attributes(case_id, findings)
+        batches = [attributes[i:i + EVENT_BATCH_SIZE] for i in range(0, len(attributes), EVENT_BATCH_SIZE)]
+        
+        state = {}
+        if state_file and os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+            if state.get('case_id') != case_id:
+                state = {}
+        
+        def save_state():
+            if state_file:
+                with open(state_file + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.replace(state_file + '.tmp', state_file)
+        
+        event = state.get('event')
+        if event is None:
+            event_data = {
+                'Event': {
+                    'info': f'Forensic Analysis - Case {case_id}',
+                    'threat_level_id': '2',  # Medium
+                    'analysis': '1',  # Ongoing
+                    'distribution': '1',  # This community only
+                    'published': False
+                }
+            }
             
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
-                print(f"MISP event creation failed: {response.status_code}")
-                return None
+            create_url = f"{self.misp_url}/events"
+            try:
+                response = self.session.post(create_url,
+                                             data=json.dumps(event_data),
+                                             timeout=30)
                 
-        except Exception as e:
-            print(f"Error creating MISP event: {e}")
+                if response.status_code not in [200, 201]:
+                    print(f"MISP event creation failed: {response.status_code}")
+                    return None
+                event = response.json()
+                
+            except Exception as e:
+                print(f"Error creating MISP event: {e}")
+                return None
+            
+            state = {'case_id': case_id, 'event': event, 'done': []}
+            save_state()
+        
+        event_id = event['Event']['id']
+        done = set(state.get('done', []))
+        fingerprints = [hashlib.sha1('\n'.join(f"{a['type']}|{a['value']}" for a in batch).encode()).hexdigest()
+                        for batch in batches]
+        pending = [i for i, fingerprint in enumerate(fingerprints) if fingerprint not in done]
+        added = 0
+        failed = 0
+        
+        with ThreadPoolExecutor(max_workers=EVENT_WORKERS) as executor:
+            futures = {executor.submit(self._add_attributes, event_id, batches[i]): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    added += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Error adding attribute batch {i + 1}/{len(batches)} to MISP event {event_id}: {e}")
+                    continue
+                done.add(fingerprints[i])
+                state['done'] = sorted(done)
+                save_state()
+        
+        elapsed = time.time() - started
+        rate = added / elapsed if elapsed > 0 else 0
+        print(f"MISP event {event_id}: {added} attributes added in {len(pending) - failed} batches "
+              f"({len(batches) - len(pending)} already present) in {elapsed:.1f}s, {rate:.0f} attributes/s",
+              file=sys.stderr)
+        
+        if failed:
+            print(f"MISP event {event_id}: {failed} batches failed; rerun to resume from {state_file}",
+                  file=sys.stderr)
             return None
+        
+        if state_file and os.path.exists(state_file):
+            os.remove(state_file)
+        return event
+
+def collect_iocs(findings):
+    """Collect the distinct hash and IP values referenced by a batch of findings"""
+    hashes = set()
+    ips = set()
+    for finding in findings:
+        if finding.get('file_hash'):
+            hashes.add(finding['file_hash'].lower())
+        if finding.get('ip_address'):
+            ips.add(finding['ip_address'])
+    return hashes, ips
+
+def enrich_finding(finding, hash_matches, ip_matches):
+    """Apply MISP lookup results to a single finding"""
+    ioc_found = False
+    
+    if finding.get('file_hash'):
+        attributes = hash_matches.get(finding['file_hash'].lower())
+        if attributes:
+            finding['misp_match'] = True
+            finding['threat_intel'] = attributes
+            finding['threat_score'] = 8  # High score for hash match
+            ioc_found = True
+    
+    if finding.get('ip_address'):
+        attributes = ip_matches.get(finding['ip_address'])
+        if attributes:
+            finding['misp_match'] = True
+            finding['threat_intel'] = attributes
+            finding['threat_score'] = finding.get('threat_score', 0) + 5
+            ioc_found = True
+    
+    if not ioc_found:
+        finding['misp_match'] = False
+        finding['threat_score'] = 1  # Low baseline score
+    
+    return finding
+
+def _enrich_window(misp, window):
+    """Resolve one window of findings with deduped bulk lookups and yield them enriched"""
+    hashes, ips = collect_iocs(window)
+    hash_matches = misp.search_attributes_bulk(hashes, 'sha256') if hashes else {}
+    ip_matches = misp.search_attributes_bulk(ips, 'ip-dst') if ips else {}
+    for finding in window:
+        yield enrich_finding(finding, hash_matches, ip_matches)
 
-def process_forensic_findings(findings_file, misp_url, api_key):
-    """Process forensic findings and enrich with MISP data"""
-    misp = MISPIntegration(misp_url, api_key)
-    enriched_findings = []
+def process_forensic_findings(findings_file, misp_url, api_key, cache=None, mirror=None, window_size=ENRICH_WINDOW):
+    """Enrich forensic findings with MISP data, yielding each one as its window is resolved.
+    
+    Only one window of findings is held in memory. Values repeated across
+    windows are served by the verdict cache rather than MISP. When an offline
+    mirror is given, lookups are answered locally instead of by MISP.
+    """
+    misp = mirror if mirror is not None else MISPIntegration(misp_url, api_key, cache=cache)
+    window = []
     
     try:
         with open(findings_file, 'r') as f:
             for line in f:
                 if line.strip():
-                    finding = json.loads(line.strip())
-                    
-                    # Check for IOC matches
-                    ioc_found = False
-                    
-                    if 'file_hash' in finding and finding['file_hash']:
-                        result = misp.search_attributes(finding['file_hash'], 'sha256')
-                        if result and result.get('response', {}).get('Attribute'):
-                            finding['misp_match'] = True
-                            finding['threat_intel'] = result['response']['Attribute']
-                            finding['threat_score'] = 8  # High score for hash match
-                            ioc_found = True
-                    
-                    if 'ip_address' in finding and finding['ip_address']:
-                        result = misp.search_attributes(finding['ip_address'], 'ip-dst')
-                        if result and result.get('response', {}).get('Attribute'):
-                            finding['misp_match'] = True
-                            finding['threat_intel'] = result['response']['Attribute']
-                            finding['threat_score'] = finding.get('threat_score', 0) + 5
-                            ioc_found = True
-                    
-                    if not ioc_found:
-                        finding['misp_match'] = False
-                        finding['threat_score'] = 1  # Low baseline score
-                    
-                    enriched_findings.append(finding)
+                    window.append(json.loads(line.strip()))
+                    if len(window) >= window_size:
+                        yield from _enrich_window(misp, window)
+                        window = []
+        if window:
+            yield from _enrich_window(misp, window)
                     
     except Exception as e:
-        print(f"Error processing findings: {e}")
-        return []
+        print(f"Error processing findings: {e}", file=sys.stderr)
+
+def iter_spilled_findings(spill):
+    """Read high-value findings back from the spill file"""
+    spill.seek(0)
+    for line in spill:
+        yield json.loads(line)
+
+def correlate_iocs(iocs_file, misp_url, api_key, cache=None):
+    """Correlate IOCs extracted by the Jenkins IOC Correlation stage against MISP"""
+    misp = MISPIntegration(misp_url, api_key, cache=cache)
+    with open(iocs_file, 'r') as f:
+        iocs = json.load(f)
     
-    return enriched_findings
+    values_by_type = {}
+    for ioc in iocs:
+        misp_type = IOC_TYPE_MAP.get(ioc.get('type'))
+        if misp_type and ioc.get('value'):
+            value = ioc['value'].lower() if misp_type in HASH_TYPES else ioc['value']
+            values_by_type.setdefault(misp_type, set()).add(value)
+    
+    correlations = []
+    for misp_type, values in values_by_type.items():
+        matches = misp.search_attributes_bulk(values, misp_type)
+        for value, attributes in sorted(matches.items()):
+            event_ids = sorted({str(attribute.get('event_id')) for attribute in attributes})
+            correlations.append({
+                'type': misp_type,
+                'value': value,
+                'description': f"{misp_type} {value} matches MISP event(s) {', '.join(event_ids)}",
+                'misp_events': event_ids
+            })
+    return correlations
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: misp_integration.py <misp_url> <api_key> <findings_file>")
+    if len(sys.argv) == 5 and sys.argv[1] == 'correlate':
+        cache = open_cache()
+        try:
+            correlations = correlate_iocs(sys.argv[4], sys.argv[2], sys.argv[3], cache)
+        finally:
+            if cache is not None:
+                print(f"IOC cache: {json.dumps(cache.stats())}", file=sys.stderr)
+                cache.close()
+        print(json.dumps(correlations))
+        return
+    
+    if len(sys.argv) not in (4, 5):
+        print("Usage: misp_integration.py <misp_url> <api_key> <findings_file> [output_file|-]")
+        print("       misp_integration.py correlate <misp_url> <api_key> <iocs_json>")
         print("Example: misp_integration.py http://10.128.0.19 API_KEY /data/processed/findings.json")
         sys.exit(1)
     
     misp_url = sys.argv[1]
     api_key = sys.argv[2]
     findings_file = sys.argv[3]
+    output_path = sys.argv[4] if len(sys.argv) == 5 else '-'
+    
+    # Prefer the local mirror (see misp_mirror.py sync); otherwise query MISP
+    # live, reusing cached verdicts from earlier cases
+    mirror = MISPMirror(MISP_MIRROR_PATH) if MISPMirror.available(MISP_MIRROR_PATH) else None
+    cache = open_cache() if mirror is None else None
+    output = sys.stdout if output_path == '-' else open(output_path, 'w')
+    spill_dir = os.path.dirname(os.path.abspath(output_path)) if output_path != '-' else None
+    spill = tempfile.TemporaryFile(mode='w+', dir=spill_dir, prefix='misp_high_value_')
+    total = matched = high_value = 0
+    case_id = 'UNKNOWN'
     
-    # Process and enrich findings
-    enriched_findings = process_forensic_findings(findings_file, misp_url, api_key)
-    
-    # Output enriched findings
-    for finding in enriched_findings:
-        print(json.dumps(finding))
-    
-    # Create MISP event if high-value IOCs found
-    high_value_findings = [f for f in enriched_findings if f.get('threat_score', 0) > 5]
-    if high_value_findings:
-        case_id = high_value_findings[0].get('case_id', 'UNKNOWN')
-        misp = MISPIntegration(misp_url, api_key)
-        event = misp.create_event(case_id, high_value_findings)
-        if event:
-            print(f"Created MISP event for case {case_id}")
+    try:
+        # Write enriched findings as they are produced; only high-value ones
+        # are kept, spilled to disk for MISP event creation
+        for finding in process_forensic_findings(findings_file, misp_url, api_key, cache, mirror):
+            output.write(json.dumps(finding) + '\n')
+            total += 1
+            if finding.get('misp_match'):
+                matched += 1
+            if finding.get('threat_score', 0) > HIGH_VALUE_SCORE:
+                if not high_value:
+                    case_id = finding.get('case_id', 'UNKNOWN')
+                spill.write(json.dumps(finding) + '\n')
+                high_value += 1
+        output.flush()
+        
+        print(f"Enriched {total} findings: {matched} MISP matches, {high_value} high-value", file=sys.stderr)
+        
+        # Create MISP event if high-value IOCs found
+        if high_value:
+            misp = MISPIntegration(misp_url, api_key, max_workers=EVENT_WORKERS)
+            state_dir = spill_dir or tempfile.gettempdir()
+            state_file = os.path.join(state_dir, f"misp_event_{case_id}.state.json")
+            event = misp.create_event(case_id, iter_spilled_findings(spill), state_file)
+            if event:
+                print(f"Created MISP event for case {case_id}", file=sys.stderr)
+    finally:
+        spill.close()
+        if output is not sys.stdout:
+            output.close()
+        if mirror is not None:
+            print(f"Matched findings against offline MISP mirror at {MISP_MIRROR_PATH}", file=sys.stderr)
+            mirror.close()
+        if cache is not None:
+            print(f"IOC cache: {json.dumps(cache.stats())}", file=sys.stderr)
+            cache.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
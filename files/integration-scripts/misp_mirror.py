@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Offline MISP attribute mirror.
+
+`sync` pulls attributes from MISP into a local SQLite store (incrementally,
+using restSearch timestamp filters) and compiles compact match indexes:
+
+    md5.bin / sha1.bin / sha256.bin - sorted raw digests, mmap + binary search
+    ipv4.bin                        - sorted exact IPv4 addresses (uint32)
+    ipv6.bin                        - sorted exact IPv6 addresses (16 bytes, big-endian)
+    prefixes.txt                    - CIDR ranges, loaded into a radix trie
+    names.bin                       - sorted 64-bit hashes of domains, hostnames and URLs
+
+IP attributes also keep their canonical network (10.1.2.3/8 is stored as
+10.0.0.0/8, 2001:DB8::1 as 2001:db8::1/128); IP matches are reported and
+fetched by that network, whatever notation the attribute was entered in.
+
+MISPMirror answers the same bulk lookups as MISPIntegration, so findings
+can be enriched at memory speed and while MISP is unreachable.
+"""
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from bisect import bisect_left
+# Import lab configuration
+try:
+    from lab_config import MISP_URL, MISP_MIRROR_PATH
+except ImportError:
+    # Fallback to default if config not available
+    MISP_URL = "http://10.128.0.19:80"
+    MISP_MIRROR_PATH = "/var/lib/forensics/misp_mirror"
+
+SYNC_TYPES = ['md5', 'sha1', 'sha256', 'ip-src', 'ip-dst', 'domain', 'hostname', 'url']
+SYNC_PAGE_LIMIT = 5000
+
+# MISP attribute type -> index family
+TYPE_FAMILIES = {
+    'md5': 'md5',
+    'sha1': 'sha1',
+    'sha256': 'sha256',
+    'ip-src': 'ip',
+    'ip-dst': 'ip',
+    'domain': 'domain',
+    'hostname': 'domain',
+    'url': 'url'
+}
+DIGEST_SIZES = {'md5': 16, 'sha1': 20, 'sha256': 32}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attributes (
+    uuid TEXT PRIMARY KEY,
+    event_id TEXT,
+    type TEXT NOT NULL,
+    category TEXT,
+    value TEXT NOT NULL,
+    family TEXT NOT NULL,
+    ip_int INTEGER,
+    network TEXT,
+    name_hash INTEGER,
+    timestamp INTEGER,
+    comment TEXT
+);
+CREATE INDEX IF NOT EXISTS attributes_value ON attributes (family, value);
+CREATE INDEX IF NOT EXISTS attributes_ip ON attributes (family, ip_int);
+CREATE INDEX IF NOT EXISTS attributes_network ON attributes (family, network);
+CREATE INDEX IF NOT EXISTS attributes_name ON attributes (family, name_hash);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def normalize_value(family, value):
+    """Canonical form used for storage and lookups"""
+    value = value.strip()
+    if family in DIGEST_SIZES or family == 'domain':
+        value = value.lower().rstrip('.')
+    return value
+
+
+def name_hash(family, value):
+    """Signed 64-bit hash of a domain/URL, ordered the same way in SQLite and array('q')"""
+    digest = hashlib.blake2b(f"{family}:{value}".encode('utf-8', 'ignore'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def exact_ipv4(value):
+    """Return the integer form of a plain IPv4 address, or None for ranges and IPv6"""
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return int(address) if address.version == 4 else None
+
+
+def ip_network(value):
+    """Canonical network of an IP attribute (an address becomes a /32 or /128), or None"""
+    try:
+        return str(ipaddress.ip_network(value, strict=False))
+    except ValueError:
+        return None
+
+
+def open_store(mirror_dir):
+    """Open (creating if needed) the mirror's SQLite attribute store"""
+    os.makedirs(mirror_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(mirror_dir, 'mirror.db'), timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(attributes)')}
+    if columns and 'network' not in columns:
+        # Stores synced before the network column existed
+        conn.execute('ALTER TABLE attributes ADD COLUMN network TEXT')
+        conn.executemany("UPDATE attributes SET network = ? WHERE uuid = ?", [
+            (ip_network(value), uuid)
+            for uuid, value in conn.execute("SELECT uuid, value FROM attributes WHERE family = 'ip'").fetchall()])
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _store_attributes(conn, attributes):
+    """Upsert a page of MISP attributes; soft-deleted ones are removed"""
+    upserts = []
+    deletes = []
+    latest = 0
+    for attribute in attributes:
+        timestamp = int(attribute.get('timestamp') or 0)
+        latest = max(latest, timestamp)
+        family = TYPE_FAMILIES.get(attribute.get('type'))
+        if family is None:
+            continue
+        if attribute.get('deleted') in (True, '1', 1):
+            deletes.append((attribute.get('uuid'),))
+            continue
+        value = normalize_value(family, attribute.get('value', ''))
+        upserts.append((
+            attribute.get('uuid'),
+            str(attribute.get('event_id', '')),
+            attribute.get('type'),
+            attribute.get('category'),
+            value,
+            family,
+            exact_ipv4(value) if family == 'ip' else None,
+            ip_network(value) if family == 'ip' else None,
+            name_hash(family, value) if family in ('domain', 'url') else None,
+            timestamp,
+            attribute.get('comment', '')
+        ))
+
+    conn.executemany("""
+        INSERT OR REPLACE INTO attributes
+            (uuid, event_id, type, category, value, family, ip_int, network, name_hash, timestamp, comment)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", upserts)
+    conn.executemany("DELETE FROM attributes WHERE uuid = ?", deletes)
+    conn.commit()
+    return len(upserts), len(deletes), latest
+
+
+def sync(misp, mirror_dir=MISP_MIRROR_PATH, full=False):
+    """Pull new and changed attributes since the last sync, then recompile the indexes"""
+    conn = open_store(mirror_dir)
+    row = conn.execute("SELECT value FROM state WHERE key = 'last_timestamp'").fetchone()
+    since = 0 if full or row is None else int(row[0])
+    if full:
+        # Reset the watermark too, so an interrupted full sync is retried in full
+        conn.execute("DELETE FROM attributes")
+        conn.execute("DELETE FROM state WHERE key = 'last_timestamp'")
+        conn.commit()
+
+    search_url = f"{misp.misp_url}/attributes/restSearch"
+    page = 1
+    total_upserts = total_deletes = 0
+    watermark = since
+    started = time.time()
+
+    try:
+        while True:
+            search_data = {
+                'returnFormat': 'json',
+                'type': SYNC_TYPES,
+                'deleted': [0, 1],
+                'limit': SYNC_PAGE_LIMIT,
+                'page': page
+            }
+            if since:
+                search_data['timestamp'] = since
+            response = misp.search_session.post(search_url, data=json.dumps(search_data), timeout=300)
+            if response.status_code != 200:
+                raise RuntimeError(f"MISP sync failed: {response.status_code}")
+
+            attributes = response.json().get('response', {}).get('Attribute', [])
+            upserts, deletes, latest = _store_attributes(conn, attributes)
+            total_upserts += upserts
+            total_deletes += deletes
+            watermark = max(watermark, latest)
+            if len(attributes) < SYNC_PAGE_LIMIT:
+                break
+            page += 1
+
+        # Only advance the watermark once every page has been stored
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('last_timestamp', ?)", (str(watermark),))
+        conn.commit()
+    finally:
+        conn.close()
+
+    counts = compile_indexes(mirror_dir)
+    print(f"MISP mirror sync: {total_upserts} attributes updated, {total_deletes} removed "
+          f"since timestamp {since} in {time.time() - started:.1f}s")
+    return counts
+
+
+def _write_atomic(path, chunks):
+    """Write an index file through a temporary name so readers never see a partial file"""
+    tmp_path = path + '.tmp'
+    written = 0
+    with open(tmp_path, 'wb', buffering=1024 * 1024) as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += 1
+    os.replace(tmp_path, path)
+    return written
+
+
+def compile_indexes(mirror_dir=MISP_MIRROR_PATH):
+    """Rebuild the compact match indexes from the attribute store, streaming in sorted order"""
+    conn = open_store(mirror_dir)
+    counts = {}
+    try:
+        for family, size in DIGEST_SIZES.items():
+            # Lowercase hex sorts in the same order as the raw digests
+            rows = conn.execute(
+                "SELECT DISTINCT value FROM attributes WHERE family = ? AND length(value) = ? "
+                "AND value NOT GLOB '*[^0-9a-f]*' ORDER BY value",
+                (family, size * 2))
+            digests = (bytes.fromhex(value) for (value,) in rows)
+            counts[family] = _write_atomic(os.path.join(mirror_dir, f'{family}.bin'), digests)
+
+        ipv4 = array('I', (ip for (ip,) in conn.execute(
+            "SELECT DISTINCT ip_int FROM attributes WHERE family = 'ip' AND ip_int IS NOT NULL ORDER BY ip_int")))
+        _write_atomic(os.path.join(mirror_dir, 'ipv4.bin'), [ipv4.tobytes()])
+        counts['ipv4'] = len(ipv4)
+
+        networks = [ipaddress.ip_network(network) for (network,) in conn.execute(
+            "SELECT DISTINCT network FROM attributes WHERE family = 'ip' AND ip_int IS NULL AND network IS NOT NULL")]
+        ipv6 = sorted(int(network.network_address) for network in networks
+                      if network.version == 6 and network.prefixlen == 128)
+        _write_atomic(os.path.join(mirror_dir, 'ipv6.bin'), (ip.to_bytes(16, 'big') for ip in ipv6))
+        counts['ipv6'] = len(ipv6)
+
+        prefixes = [str(network) for network in networks if network.version == 4 or network.prefixlen < 128]
+        _write_atomic(os.path.join(mirror_dir, 'prefixes.txt'), ['\n'.join(prefixes).encode()])
+        counts['prefixes'] = len(prefixes)
+
+        names = array('q', (h for (h,) in conn.execute(
+            "SELECT DISTINCT name_hash FROM attributes WHERE name_hash IS NOT NULL ORDER BY name_hash")))
+        _write_atomic(os.path.join(mirror_dir, 'names.bin'), [names.tobytes()])
+        counts['names'] = len(names)
+    finally:
+        conn.close()
+    return counts
+
+
+class PrefixTrie:
+    """Binary radix trie over IP networks, stored as parallel child arrays"""
+
+    def __init__(self):
+        self.zero = array('i', [-1])
+        self.one = array('i', [-1])
+        self.network = [None]
+
+    def insert(self, network):
+        node = 0
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            children = self.one if (bits >> (width - 1 - i)) & 1 else self.zero
+            if children[node] == -1:
+                children[node] = len(self.network)
+                self.zero.append(-1)
+                self.one.append(-1)
+                self.network.append(None)
+            node = children[node]
+        self.network[node] = str(network)
+
+    def lookup(self, address):
+        """Return every stored network containing address, shortest prefix first, in canonical form"""
+        matches = []
+        node = 0
+        bits = int(address)
+        width = address.max_prefixlen
+        for i in range(width + 1):
+            if self.network[node] is not None:
+                matches.append(self.network[node])
+            if i == width:
+                break
+            node = (self.one if (bits >> (width - 1 - i)) & 1 else self.zero)[node]
+            if node == -1:
+                break
+        return matches
+
+
+class MISPMirror:
+    def __init__(self, mirror_dir=MISP_MIRROR_PATH):
+        self.mirror_dir = mirror_dir
+        # Brings an older store up to the current schema
+        open_store(mirror_dir).close()
+        self.conn = sqlite3.connect(os.path.join(mirror_dir, 'mirror.db'), timeout=30, check_same_thread=False)
+
+        self._hash_files = {}
+        self._hash_maps = {}
+        for family in DIGEST_SIZES:
+            path = os.path.join(mirror_dir, f'{family}.bin')
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                f = open(path, 'rb')
+                self._hash_files[family] = f
+                self._hash_maps[family] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._ipv4 = array('I')
+        with open(os.path.join(mirror_dir, 'ipv4.bin'), 'rb') as f:
+            self._ipv4.frombytes(f.read())
+
+        # Absent in mirrors compiled before IPv6 addresses had their own index
+        ipv6_path = os.path.join(mirror_dir, 'ipv6.bin')
+        self._ipv6 = b''
+        if os.path.exists(ipv6_path):
+            with open(ipv6_path, 'rb') as f:
+                self._ipv6 = f.read()
+
+        self._names = array('q')
+        with open(os.path.join(mirror_dir, 'names.bin'), 'rb') as f:
+            self._names.frombytes(f.read())
+
+        self._tries = {4: PrefixTrie(), 6: PrefixTrie()}
+        with open(os.path.join(mirror_dir, 'prefixes.txt'), 'r') as f:
+            for line in f:
+                try:
+                    network = ipaddress.ip_network(line.strip(), strict=False)
+                except ValueError:
+                    continue
+                self._tries[network.version].insert(network)
+
+    @staticmethod
+    def available(mirror_dir=MISP_MIRROR_PATH):
+        """True if a compiled mirror exists in mirror_dir"""
+        return all(os.path.exists(os.path.join(mirror_dir, name))
+                   for name in ('mirror.db', 'ipv4.bin', 'names.bin', 'prefixes.txt'))
+
+    def _contains_digest(self, family, value):
+        mm = self._hash_maps.get(family)
+        size = DIGEST_SIZES[family]
+        if mm is None or len(value) != size * 2:
+            return False
+        try:
+            digest = bytes.fromhex(value)
+        except ValueError:
+            return False
+        return self._contains_fixed(mm, size, digest)
+
+    def _contains_fixed(self, data, size, key):
+        """Binary search for key in sorted fixed-size records"""
+        lo, hi = 0, len(data) // size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = data[mid * size:(mid + 1) * size]
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def _contains_sorted(self, values, key):
+        i = bisect_left(values, key)
+        return i < len(values) and values[i] == key
+
+    def match(self, family, value):
+        """Return the stored values that match: the value itself, or for IPs the canonical
+        networks (including the address's own /32 or /128) that contain it"""
+        value = normalize_value(family, value)
+        if family in DIGEST_SIZES:
+            return [value] if self._contains_digest(family, value) else []
+        if family == 'ip':
+            try:
+                address = ipaddress.ip_address(value)
+            except ValueError:
+                return []
+            matches = self._tries[address.version].lookup(address)
+            if address.version == 4:
+                exact = self._contains_sorted(self._ipv4, int(address))
+            else:
+                exact = self._contains_fixed(self._ipv6, 16, int(address).to_bytes(16, 'big'))
+            own_network = str(ipaddress.ip_network(address))
+            if exact and own_network not in matches:
+                matches.append(own_network)
+            return matches
+        if family in ('domain', 'url'):
+            return [value] if self._contains_sorted(self._names, name_hash(family, value)) else []
+        return []
+
+    def attributes(self, family, values):
+        """Fetch full attribute records for matched values (canonical networks for IPs) from the store"""
+        placeholders = ','.join('?' * len(values))
+        column = 'network' if family == 'ip' else 'value'
+        rows = self.conn.execute(
+            f"SELECT uuid, event_id, type, category, value, timestamp, comment FROM attributes "
+            f"WHERE family = ? AND {column} IN ({placeholders})", [family] + list(values))
+        return [{
+            'uuid': uuid, 'event_id': event_id, 'type': attr_type, 'category': category,
+            'value': value, 'timestamp': str(timestamp), 'comment': comment
+        } for uuid, event_id, attr_type, category, value, timestamp, comment in rows]
+
+    def search_attributes_bulk(self, ioc_values, ioc_type='sha256'):
+        """Drop-in replacement for MISPIntegration.search_attributes_bulk"""
+        family = TYPE_FAMILIES.get(ioc_type)
+        matches = {}
+        if family is None:
+            return matches
+        for value in set(ioc_values):
+            matched = self.match(family, value)
+            if matched:
+                # Names are confirmed against the store to rule out 64-bit hash collisions
+                attributes = self.attributes(family, matched)
+                if attributes:
+                    matches[value] = attributes
+        return matches
+
+    def close(self):
+        for mm in self._hash_maps.values():
+            mm.close()
+        for f in self._hash_files.values():
+            f.close()
+        self.conn.close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('sync', 'compile', 'lookup'):
+        print("Usage: misp_mirror.py sync <misp_url> <api_key> [mirror_dir] [--full]")
+        print("       misp_mirror.py compile [mirror_dir]")
+        print("       misp_mirror.py lookup <misp_type> <value> [mirror_dir]")
+        sys.exit(1)
+
+    action = sys.argv[1]
+
+    if action == 'sync':
+        args = [arg for arg in sys.argv[2:] if arg != '--full']
+        if len(args) not in (2, 3):
+            print("Usage: misp_mirror.py sync <misp_url> <api_key> [mirror_dir] [--full]")
+            sys.exit(1)
+        from misp_integration import MISPIntegration
+        misp = MISPIntegration(args[0], args[1])
+        counts = sync(misp, args[2] if len(args) == 3 else MISP_MIRROR_PATH, '--full' in sys.argv)
+        print(json.dumps(counts))
+
+    elif action == 'compile':
+        print(json.dumps(compile_indexes(sys.argv[2] if len(sys.argv) > 2 else MISP_MIRROR_PATH)))
+
+    elif action == 'lookup':
+        if len(sys.argv) not in (4, 5):
+            print("Usage: misp_mirror.py lookup <misp_type> <value> [mirror_dir]")
+            sys.exit(1)
+        mirror = MISPMirror(sys.argv[4] if len(sys.argv) == 5 else MISP_MIRROR_PATH)
+        try:
+            print(json.dumps(mirror.search_attributes_bulk([sys.argv[3]], sys.argv[2]), indent=2))
+        finally:
+            mirror.close()
+
+
+if __name__ == '__main__':
+    main()
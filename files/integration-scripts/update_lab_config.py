@@ -30,7 +30,11 @@ INFRASTRUCTURE_CONFIG = {
     # Paths
     'EVIDENCE_PATH': '/data/evidence',
     'PROCESSED_PATH': '/data/processed', 
-    'CASES_PATH': '/data/cases'
+    'CASES_PATH': '/data/cases',
+    'IOC_CACHE_PATH': '/var/lib/forensics/ioc_cache.db',
+    'MISP_MIRROR_PATH': '/var/lib/forensics/misp_mirror',
+    'INGEST_LEDGER_PATH': '/var/lib/forensics/ingest_ledger.db',
+    'IRIS_DAEMON_SOCKET': '/run/forensics/iris.sock'
 }
 
 def generate_integration_script_config():
@@ -65,6 +69,14 @@ SSH_USER = "{INFRASTRUCTURE_CONFIG['SSH_USER']}"
 EVIDENCE_PATH = "{INFRASTRUCTURE_CONFIG['EVIDENCE_PATH']}"
 PROCESSED_PATH = "{INFRASTRUCTURE_CONFIG['PROCESSED_PATH']}"
 CASES_PATH = "{INFRASTRUCTURE_CONFIG['CASES_PATH']}"
+
+# Local caches
+IOC_CACHE_PATH = "{INFRASTRUCTURE_CONFIG['IOC_CACHE_PATH']}"
+MISP_MIRROR_PATH = "{INFRASTRUCTURE_CONFIG['MISP_MIRROR_PATH']}"
+INGEST_LEDGER_PATH = "{INFRASTRUCTURE_CONFIG['INGEST_LEDGER_PATH']}"
+
+# Local services
+IRIS_DAEMON_SOCKET = "{INFRASTRUCTURE_CONFIG['IRIS_DAEMON_SOCKET']}"
 """
     return config
 
@@ -3,6 +3,18 @@ import json
 import sys
 import os
 from datetime import datetime
+# Shared converter helpers, deployed alongside this script in /opt/forensics/scripts
+from converter_stats import RunSummary
+from converter_schema import tool_schema, coerce
+from ndjson_io import NDJSONWriter
+
+SCHEMA = tool_schema({
+    'sample_hash': 'keyword',
+    'content': 'text',
+    'file_size': 'long',
+    'yara_matches': 'boolean',
+    'malware_detected': 'boolean'
+})
 
 def process_malware_analysis(output_dir, case_id, sample_hash):
     """Process malware analysis results"""
@@ -57,17 +69,20 @@ def main():
     json_dir = '/data/processed/cape'
     os.makedirs(json_dir, exist_ok=True)
     
+    summary = RunSummary(case_id, 'cape', sample_hash)
     results = process_malware_analysis(output_dir, case_id, sample_hash)
+    timestamp = int(datetime.now().timestamp())
     
     if results:
-        timestamp = int(datetime.now().timestamp())
-        output_file = os.path.join(json_dir, f'malware_{case_id}_{timestamp}.json')
-        with open(output_file, 'w') as f:
+        with NDJSONWriter(os.path.join(json_dir, f'malware_{case_id}_{timestamp}.json')) as writer:
             for result in results:
-                f.write(json.dumps(result) + '\n')
-        print(f"Malware analysis: {len(results)} entries written to {output_file}")
+                summary.observe(result)
+                writer.write(coerce(result, SCHEMA))
+        print(f"Malware analysis: {len(results)} entries written to {writer.path}")
     else:
         print("No malware analysis data to process")
+    
+    summary.write(json_dir, timestamp)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
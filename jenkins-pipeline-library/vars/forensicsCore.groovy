@@ -1,26 +1,63 @@
 // Digital Forensics Processing Functions for Jenkins
 // Contains all forensic tool integrations and processing logic
 
-def initEvidence(String caseId, String evidenceType, String evidencePath) {
+def initEvidence(String caseId, String evidenceType, String evidencePath, boolean rerunAll = false) {
     script {
         def timestamp = new Date().format('yyyy-MM-dd_HH-mm-ss')
-        def workingDir = "${env.FORENSICS_WORKSPACE}/${caseId}/${evidenceType}_${timestamp}"
+        // One working directory per evidence file, so a rebuild finds the outputs and stage manifests of earlier runs
+        def evidenceKey = sh(
+            script: "printf '%s' ${shellQuote(evidencePath)} | sha1sum | cut -c1-12",
+            returnStdout: true
+        ).trim()
+        def workingDir = "${env.FORENSICS_WORKSPACE}/${caseId}/${evidenceType}_${evidenceKey}"
         
         // Create working directory structure
         sh """
             mkdir -p ${workingDir}/{input,output,temp,logs}
-            echo "Evidence Type: ${evidenceType}" > ${workingDir}/metadata.txt
-            echo "Evidence Path: ${evidencePath}" >> ${workingDir}/metadata.txt
-            echo "Processing Started: ${timestamp}" >> ${workingDir}/metadata.txt
-            echo "Case ID: ${caseId}" >> ${workingDir}/metadata.txt
+            if [ ! -f ${workingDir}/metadata.txt ]; then
+                echo "Evidence Type: ${evidenceType}" > ${workingDir}/metadata.txt
+                echo "Evidence Path: ${evidencePath}" >> ${workingDir}/metadata.txt
+                echo "Case ID: ${caseId}" >> ${workingDir}/metadata.txt
+            fi
+            echo "Processing Started: ${timestamp} (build ${env.BUILD_NUMBER})" >> ${workingDir}/metadata.txt
         """
         
+        if (rerunAll) {
+            sh "python3 /opt/forensics/scripts/stage_manifest.py clear ${workingDir}/.stages"
+        }
+        
         env.WORKING_DIR = workingDir
         echo "✅ Initialized evidence processing workspace: ${workingDir}"
         return workingDir
     }
 }
 
+def shellQuote(String value) {
+    return "'" + value.replace("'", "'\\''") + "'"
+}
+
+def toolVersion(String command) {
+    def version = sh(script: "${command} 2>&1 | head -1", returnStdout: true).trim()
+    return version ?: 'unknown'
+}
+
+// Runs body unless the stage manifest in WORKING_DIR/.stages shows the same parameters,
+// unchanged inputs and untouched outputs (tokens: name=value, in:<path>, out:<path>).
+// Returns true if the stage ran.
+def cachedStage(String stage, List tokens, Closure body) {
+    script {
+        def args = (["${env.WORKING_DIR}/.stages", stage] + tokens).collect { shellQuote(it.toString()) }.join(' ')
+        def manifest = "python3 /opt/forensics/scripts/stage_manifest.py"
+        if (sh(script: "${manifest} check ${args}", returnStatus: true) == 0) {
+            echo "⏭️ ${stage} is unchanged since the last run, skipping"
+            return false
+        }
+        body()
+        sh "${manifest} record ${args}"
+        return true
+    }
+}
+
 def validateEvidence(String evidencePath) {
     script {
         echo "🔍 Validating evidence integrity: ${evidencePath}"
@@ -38,21 +75,27 @@ def validateEvidence(String evidencePath) {
             fi
         """
         
-        // Generate file hashes for integrity verification
-        def hashes = sh(
-            script: """
-                echo "=== File Integrity Verification ==="
-                echo "File: ${evidencePath}"
-                echo "Size: \$(stat -f%z "${evidencePath}" 2>/dev/null || stat -c%s "${evidencePath}")"
-                echo "MD5: \$(md5sum "${evidencePath}" | cut -d' ' -f1)"
-                echo "SHA1: \$(sha1sum "${evidencePath}" | cut -d' ' -f1)"
-                echo "SHA256: \$(sha256sum "${evidencePath}" | cut -d' ' -f1)"
-            """,
-            returnStdout: true
-        ).trim()
-        
-        // Save hashes to working directory
-        writeFile file: "${env.WORKING_DIR}/evidence_hashes.txt", text: hashes
+        // Generate file hashes for integrity verification; an unchanged evidence file is not read again
+        def hashFile = "${env.WORKING_DIR}/evidence_hashes.txt"
+        cachedStage('evidence_hashes', ["in:${evidencePath}", "out:${hashFile}"]) {
+            def computed = sh(
+                script: """
+                    echo "=== File Integrity Verification ==="
+                    echo "File: ${evidencePath}"
+                    echo "Size: \$(stat -f%z "${evidencePath}" 2>/dev/null || stat -c%s "${evidencePath}")"
+                    echo "MD5: \$(md5sum "${evidencePath}" | cut -d' ' -f1)"
+                    echo "SHA1: \$(sha1sum "${evidencePath}" | cut -d' ' -f1)"
+                    echo "SHA256: \$(sha256sum "${evidencePath}" | cut -d' ' -f1)"
+                """,
+                returnStdout: true
+            ).trim()
+            
+            // Save hashes to working directory
+            writeFile file: hashFile, text: computed
+        }
+        def hashes = readFile(hashFile).trim()
+        // Later stages are keyed by the evidence hash
+        env.EVIDENCE_SHA256 = hashes.readLines().find { it.startsWith('SHA256: ') }?.substring(8)?.trim() ?: 'unknown'
         echo "✅ Evidence validation completed"
         return hashes
     }
@@ -62,31 +105,34 @@ def generateMetadata(String evidencePath, String caseId) {
     script {
         echo "📋 Generating evidence metadata"
         
-        def metadata = sh(
-            script: """
-                echo "=== Evidence Metadata ==="
-                echo "File: ${evidencePath}"
-                echo "Type: \$(file "${evidencePath}")"
-                echo "Size: \$(stat -f%z "${evidencePath}" 2>/dev/null || stat -c%s "${evidencePath}") bytes"
-                echo "Created: \$(stat -f%SB "${evidencePath}" 2>/dev/null || stat -c%y "${evidencePath}")"
-                echo "Modified: \$(stat -f%Sm "${evidencePath}" 2>/dev/null || stat -c%y "${evidencePath}")"
-                echo "Permissions: \$(stat -f%Mp%Lp "${evidencePath}" 2>/dev/null || stat -c%a "${evidencePath}")"
+        def metadataFile = "${env.WORKING_DIR}/evidence_metadata.txt"
+        cachedStage('evidence_metadata', ["in:${evidencePath}", "out:${metadataFile}"]) {
+            def metadata = sh(
+                script: """
+                    echo "=== Evidence Metadata ==="
+                    echo "File: ${evidencePath}"
+                    echo "Type: \$(file "${evidencePath}")"
+                    echo "Size: \$(stat -f%z "${evidencePath}" 2>/dev/null || stat -c%s "${evidencePath}") bytes"
+                    echo "Created: \$(stat -f%SB "${evidencePath}" 2>/dev/null || stat -c%y "${evidencePath}")"
+                    echo "Modified: \$(stat -f%Sm "${evidencePath}" 2>/dev/null || stat -c%y "${evidencePath}")"
+                    echo "Permissions: \$(stat -f%Mp%Lp "${evidencePath}" 2>/dev/null || stat -c%a "${evidencePath}")"
                 
-                # Additional file analysis
-                if command -v hexdump >/dev/null; then
-                    echo "Header (hex): \$(hexdump -C "${evidencePath}" | head -3)"
-                fi
+                    # Additional file analysis
+                    if command -v hexdump >/dev/null; then
+                        echo "Header (hex): \$(hexdump -C "${evidencePath}" | head -3)"
+                    fi
                 
-                if command -v strings >/dev/null; then
-                    echo "Strings preview: \$(strings "${evidencePath}" | head -10)"
-                fi
-            """,
-            returnStdout: true
-        ).trim()
-        
-        writeFile file: "${env.WORKING_DIR}/evidence_metadata.txt", text: metadata
+                    if command -v strings >/dev/null; then
+                        echo "Strings preview: \$(strings "${evidencePath}" | head -10)"
+                    fi
+                """,
+                returnStdout: true
+            ).trim()
+        
+            writeFile file: metadataFile, text: metadata
+        }
         echo "✅ Evidence metadata generated"
-        return metadata
+        return readFile(metadataFile).trim()
     }
 }
 
@@ -98,35 +144,41 @@ def processDiskImage(String evidencePath, String caseId, String analysisLevel =
         def logFile = "${env.WORKING_DIR}/logs/disk_processing.log"
         
         // Run Autopsy analysis
-        sh """
-            echo "Starting Autopsy disk image analysis..." >> ${logFile}
-            cd ${outputDir}
+        cachedStage('autopsy', ["evidence_hash=${env.EVIDENCE_SHA256}", "analysis_level=${analysisLevel}",
+                                "out:${outputDir}/autopsy"]) {
+            sh """
+                echo "Starting Autopsy disk image analysis..." >> ${logFile}
+                cd ${outputDir}
             
-            # Create Autopsy case
-            python3 /opt/autopsy/bin/autopsy_cli.py \\
-                --case-name "${caseId}_disk_analysis" \\
-                --case-dir ${outputDir}/autopsy \\
-                --image "${evidencePath}" \\
-                --analysis-level ${analysisLevel} \\
-                >> ${logFile} 2>&1
-        """
+                # Create Autopsy case
+                python3 /opt/autopsy/bin/autopsy_cli.py \\
+                    --case-name "${caseId}_disk_analysis" \\
+                    --case-dir ${outputDir}/autopsy \\
+                    --image "${evidencePath}" \\
+                    --analysis-level ${analysisLevel} \\
+                    >> ${logFile} 2>&1
+            """
+        }
         
         // Run Sleuth Kit analysis
-        sh """
-            echo "Running Sleuth Kit analysis..." >> ${logFile}
-            mkdir -p ${outputDir}/sleuthkit
+        cachedStage('sleuthkit', ["evidence_hash=${env.EVIDENCE_SHA256}", "analysis_level=${analysisLevel}",
+                                  "tool=${toolVersion('fls -V')}", "out:${outputDir}/sleuthkit"]) {
+            sh """
+                echo "Running Sleuth Kit analysis..." >> ${logFile}
+                mkdir -p ${outputDir}/sleuthkit
             
-            # File system analysis
-            fsstat "${evidencePath}" > ${outputDir}/sleuthkit/filesystem_info.txt 2>&1 || true
+                # File system analysis
+                fsstat "${evidencePath}" > ${outputDir}/sleuthkit/filesystem_info.txt 2>&1 || true
             
-            # Generate timeline
-            if [ "${analysisLevel}" != "basic" ]; then
-                fls -r -m / "${evidencePath}" > ${outputDir}/sleuthkit/timeline.csv 2>&1 || true
-            fi
+                # Generate timeline
+                if [ "${analysisLevel}" != "basic" ]; then
+                    fls -r -m / "${evidencePath}" > ${outputDir}/sleuthkit/timeline.csv 2>&1 || true
+                fi
             
-            # Extract file list
-            fls -r "${evidencePath}" > ${outputDir}/sleuthkit/file_list.txt 2>&1 || true
-        """
+                # Extract file list
+                fls -r "${evidencePath}" > ${outputDir}/sleuthkit/file_list.txt 2>&1 || true
+            """
+        }
         
         // Process results for ELK ingestion
         processForELK("disk", outputDir, caseId)
@@ -144,33 +196,37 @@ def processMemoryDump(String evidencePath, String caseId, String analysisLevel =
         def logFile = "${env.WORKING_DIR}/logs/memory_processing.log"
         
         // Run Volatility3 analysis
-        sh """
-            echo "Starting Volatility3 memory analysis..." >> ${logFile}
-            cd ${outputDir}
-            mkdir -p volatility3
+        cachedStage('volatility3', ["evidence_hash=${env.EVIDENCE_SHA256}", "analysis_level=${analysisLevel}",
+                                    "tool=${toolVersion('python3 /opt/volatility3/vol.py -h')}",
+                                    "out:${outputDir}/volatility3"]) {
+            sh """
+                echo "Starting Volatility3 memory analysis..." >> ${logFile}
+                cd ${outputDir}
+                mkdir -p volatility3
             
-            # Activate forensics Python environment
-            source /var/lib/jenkins/forensics/forensics-env/bin/activate
+                # Activate forensics Python environment
+                source /var/lib/jenkins/forensics/forensics-env/bin/activate
             
-            # Basic analysis
-            python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.info > volatility3/system_info.txt 2>&1 || true
-            python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.pslist > volatility3/process_list.txt 2>&1 || true
-            python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.netstat > volatility3/network_connections.txt 2>&1 || true
+                # Basic analysis
+                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.info > volatility3/system_info.txt 2>&1 || true
+                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.pslist > volatility3/process_list.txt 2>&1 || true
+                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.netstat > volatility3/network_connections.txt 2>&1 || true
             
-            if [ "${analysisLevel}" != "basic" ]; then
-                # Advanced analysis
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.malfind > volatility3/malfind.txt 2>&1 || true
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.filescan > volatility3/file_scan.txt 2>&1 || true
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.handles > volatility3/handles.txt 2>&1 || true
-            fi
+                if [ "${analysisLevel}" != "basic" ]; then
+                    # Advanced analysis
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.malfind > volatility3/malfind.txt 2>&1 || true
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.filescan > volatility3/file_scan.txt 2>&1 || true
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.handles > volatility3/handles.txt 2>&1 || true
+                fi
             
-            if [ "${analysisLevel}" == "comprehensive" ]; then
-                # Comprehensive analysis
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.registry.hivelist > volatility3/registry_hives.txt 2>&1 || true
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.cmdline > volatility3/command_lines.txt 2>&1 || true
-                python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.dumpfiles --virtaddr 0x1000 > volatility3/extracted_files.txt 2>&1 || true
-            fi
-        """
+                if [ "${analysisLevel}" == "comprehensive" ]; then
+                    # Comprehensive analysis
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.registry.hivelist > volatility3/registry_hives.txt 2>&1 || true
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.cmdline > volatility3/command_lines.txt 2>&1 || true
+                    python3 /opt/volatility3/vol.py -f "${evidencePath}" windows.dumpfiles --virtaddr 0x1000 > volatility3/extracted_files.txt 2>&1 || true
+                fi
+            """
+        }
         
         // Process results for ELK ingestion
         processForELK("memory", outputDir, caseId)
@@ -188,22 +244,25 @@ def processMobileData(String evidencePath, String caseId, String analysisLevel =
         def logFile = "${env.WORKING_DIR}/logs/mobile_processing.log"
         
         // Run Andriller analysis
-        sh """
-            echo "Starting Andriller mobile analysis..." >> ${logFile}
-            cd ${outputDir}
-            mkdir -p andriller
+        cachedStage('andriller', ["evidence_hash=${env.EVIDENCE_SHA256}", "analysis_level=${analysisLevel}",
+                                  "out:${outputDir}/andriller"]) {
+            sh """
+                echo "Starting Andriller mobile analysis..." >> ${logFile}
+                cd ${outputDir}
+                mkdir -p andriller
             
-            # Activate forensics Python environment
-            source /var/lib/jenkins/forensics/forensics-env/bin/activate
+                # Activate forensics Python environment
+                source /var/lib/jenkins/forensics/forensics-env/bin/activate
             
-            # Run Andriller processing
-            python3 /opt/andriller/andriller.py \\
-                --input "${evidencePath}" \\
-                --output andriller/ \\
-                --case-id "${caseId}" \\
-                --analysis-level ${analysisLevel} \\
-                >> ${logFile} 2>&1 || true
-        """
+                # Run Andriller processing
+                python3 /opt/andriller/andriller.py \\
+                    --input "${evidencePath}" \\
+                    --output andriller/ \\
+                    --case-id "${caseId}" \\
+                    --analysis-level ${analysisLevel} \\
+                    >> ${logFile} 2>&1 || true
+            """
+        }
         
         // Process results for ELK ingestion
         processForELK("mobile", outputDir, caseId)
@@ -221,33 +280,40 @@ def processMalwareSample(String evidencePath, String caseId, String analysisLeve
         def logFile = "${env.WORKING_DIR}/logs/malware_processing.log"
         
         // Static analysis
-        sh """
-            echo "Starting static malware analysis..." >> ${logFile}
-            cd ${outputDir}
-            mkdir -p malware/{static,dynamic}
+        cachedStage('malware_static', ["evidence_hash=${env.EVIDENCE_SHA256}", "out:${outputDir}/malware/static/file_type.txt",
+                                       "out:${outputDir}/malware/static/hashes.txt", "out:${outputDir}/malware/static/strings.txt",
+                                       "out:${outputDir}/malware/static/hexdump.txt"]) {
+            sh """
+                echo "Starting static malware analysis..." >> ${logFile}
+                cd ${outputDir}
+                mkdir -p malware/{static,dynamic}
             
-            # File type and basic info
-            file "${evidencePath}" > malware/static/file_type.txt
+                # File type and basic info
+                file "${evidencePath}" > malware/static/file_type.txt
             
-            # Hashes
-            md5sum "${evidencePath}" > malware/static/hashes.txt
-            sha1sum "${evidencePath}" >> malware/static/hashes.txt
-            sha256sum "${evidencePath}" >> malware/static/hashes.txt
+                # Hashes
+                md5sum "${evidencePath}" > malware/static/hashes.txt
+                sha1sum "${evidencePath}" >> malware/static/hashes.txt
+                sha256sum "${evidencePath}" >> malware/static/hashes.txt
             
-            # Strings extraction
-            strings "${evidencePath}" > malware/static/strings.txt 2>&1 || true
+                # Strings extraction
+                strings "${evidencePath}" > malware/static/strings.txt 2>&1 || true
             
-            # Hex dump (first 1MB)
-            xxd "${evidencePath}" | head -1000 > malware/static/hexdump.txt 2>&1 || true
-        """
+                # Hex dump (first 1MB)
+                xxd "${evidencePath}" | head -1000 > malware/static/hexdump.txt 2>&1 || true
+            """
+        }
         
-        // Yara scanning if available
-        sh """
-            if command -v yara >/dev/null && [ -d /opt/yara-rules ]; then
-                echo "Running Yara rule scanning..." >> ${logFile}
-                yara -r /opt/yara-rules/ "${evidencePath}" > ${outputDir}/malware/static/yara_matches.txt 2>&1 || true
-            fi
-        """
+        // Yara scanning if available; updated rules in /opt/yara-rules rescan the sample
+        cachedStage('yara', ["evidence_hash=${env.EVIDENCE_SHA256}", "in:/opt/yara-rules",
+                             "out:${outputDir}/malware/static/yara_matches.txt"]) {
+            sh """
+                if command -v yara >/dev/null && [ -d /opt/yara-rules ]; then
+                    echo "Running Yara rule scanning..." >> ${logFile}
+                    yara -r /opt/yara-rules/ "${evidencePath}" > ${outputDir}/malware/static/yara_matches.txt 2>&1 || true
+                fi
+            """
+        }
         
         // TODO: CAPE Sandbox integration would go here
         // For now, we'll simulate dynamic analysis results
@@ -265,6 +331,64 @@ def processMalwareSample(String evidencePath, String caseId, String analysisLeve
     }
 }
 
+// Runs every processing step of an evidence type as one local DAG (pipeline_runner.py):
+// independent steps such as hashing, fsstat, fls, the IOC scan and YARA run concurrently
+// under CPU and I/O slot limits (PIPELINE_CPU_SLOTS / PIPELINE_IO_SLOTS on the node).
+def runPipeline(String evidenceType, String evidencePath, String caseId, String analysisLevel = 'standard') {
+    script {
+        echo "⚙️ Running ${evidenceType} processing pipeline with ${analysisLevel} analysis"
+        
+        def outputDir = "${env.WORKING_DIR}/output"
+        def args = [evidenceType, evidencePath, env.WORKING_DIR, caseId, analysisLevel].collect { shellQuote(it) }.join(' ')
+        def status = sh(
+            script: "python3 /opt/forensics/scripts/pipeline_runner.py run ${args} >> ${env.WORKING_DIR}/logs/pipeline.log 2>&1",
+            returnStatus: true
+        )
+        if (status != 0) {
+            error("Processing pipeline failed (exit ${status}), see logs/pipeline.log")
+        }
+        
+        // Process results for ELK ingestion
+        processForELK(evidenceType, outputDir, caseId)
+        
+        echo "✅ Processing pipeline completed"
+        return outputDir
+    }
+}
+
+// Hands the evidence to the shared work queue (work_queue.py) instead of processing it on
+// this agent: a worker on any tool node leases it, runs the pipeline in the shared workspace
+// and renews its lease while it runs; if the node dies the task goes back to the queue.
+// Urgent evidence is scheduled ahead of normal work and investigators share the nodes fairly.
+def queueEvidence(String evidenceType, String evidencePath, String caseId, String analysisLevel = 'standard',
+                  String investigator = '', boolean urgent = false) {
+    script {
+        // Group-writable files, so the workers (same group) can keep using the queue database
+        def queue = "umask 0007 && python3 /opt/forensics/scripts/work_queue.py"
+        def args = [caseId, evidenceType, evidencePath, analysisLevel].collect { shellQuote(it) }.join(' ')
+        def priority = urgent ? 'urgent' : 'normal'
+        def taskId = sh(
+            script: "${queue} enqueue ${args} ${shellQuote(investigator ?: '')} ${priority}",
+            returnStdout: true
+        ).trim()
+        echo "📥 Queued ${evidenceType} evidence as ${priority} task ${taskId}, waiting for a tool node"
+
+        def status = sh(script: "${queue} wait ${taskId}", returnStatus: true)
+        if (status != 0) {
+            error("Queued processing of task ${taskId} failed, see logs/pipeline.log in its working directory")
+        }
+
+        // Results are in the task's working directory on the shared workspace
+        def workingDir = sh(script: "${queue} workdir ${args}", returnStdout: true).trim()
+        env.WORKING_DIR = workingDir
+        def outputDir = "${workingDir}/output"
+        processForELK(evidenceType, outputDir, caseId)
+
+        echo "✅ Queued processing completed"
+        return outputDir
+    }
+}
+
 def processForELK(String evidenceType, String outputDir, String caseId) {
     script {
         echo "📊 Processing results for ELK ingestion"
@@ -286,15 +410,47 @@ def processForELK(String evidenceType, String outputDir, String caseId) {
 EOF
         """
         
-        // Send to Logstash via HTTP
+        // Bulk load the converter NDJSON for this case straight into Elasticsearch.
+        // Document IDs are deterministic, so reloading earlier runs overwrites instead of duplicating.
+        def toolDirs = [disk: 'autopsy', memory: 'volatility', mobile: 'andriller', malware: 'cape']
+        def toolDir = toolDirs[evidenceType] ?: evidenceType
+        def processedDir = "/data/processed/${toolDir}"
+        def scriptsDir = env.INTEGRATION_SCRIPTS ?: '/opt/scripts'
+        def elkUrl = env.ELK_URL ?: 'http://10.128.0.19:9200'
+
+        // Case-local SQLite search index, so lookups keep working when Elasticsearch is down
         sh """
-            if command -v curl >/dev/null; then
-                find ${outputDir} -name "*.txt" -o -name "*.csv" | while read file; do
-                    echo "Sending \$file to ELK..." >> ${env.WORKING_DIR}/logs/elk_ingestion.log
-                    # TODO: Implement actual Logstash HTTP input
-                    # curl -X POST "${env.ELK_URL}/_bulk" -H "Content-Type: application/json" --data-binary @\$file
-                done
-            fi
+            python3 /opt/forensics/scripts/case_index.py build "${caseId}" >> ${env.WORKING_DIR}/logs/case_index.log 2>&1 || \
+                echo "Warning: case search index build failed for ${caseId}" >> ${env.WORKING_DIR}/logs/case_index.log
+        """
+
+        // Typed index templates must exist before the rollover write indices are bootstrapped
+        sh """
+            python3 /opt/forensics/scripts/converter_schema.py install "${elkUrl}" >> ${env.WORKING_DIR}/logs/elk_ingestion.log 2>&1 && \
+            python3 ${scriptsDir}/es_index_manager.py setup "${elkUrl}" >> ${env.WORKING_DIR}/logs/elk_ingestion.log 2>&1 || \
+                echo "Warning: index template/layout setup failed" >> ${env.WORKING_DIR}/logs/elk_ingestion.log
+        """
+
+        def status = sh(
+            script: """
+                # Exact name match, so case C1 does not load the output of case A_C1
+                files=\$(python3 /opt/forensics/scripts/case_index.py files "${caseId}" "${toolDir}")
+                if [ -z "\$files" ]; then
+                    echo "No converter output for ${caseId} in ${processedDir}" >> ${env.WORKING_DIR}/logs/elk_ingestion.log
+                    exit 0
+                fi
+                python3 ${scriptsDir}/es_bulk_loader.py "${elkUrl}" \$files >> ${env.WORKING_DIR}/logs/elk_ingestion.log
+            """,
+            returnStatus: true
+        )
+        if (status != 0) {
+            echo "⚠️ ELK bulk load reported failures (exit ${status}), see logs/elk_ingestion.log"
+        }
+
+        // Case-scoped alias so reports and Kibana only touch this case's shards
+        sh """
+            python3 ${scriptsDir}/es_index_manager.py case "${elkUrl}" "${caseId}" >> ${env.WORKING_DIR}/logs/elk_ingestion.log 2>&1 || \
+                echo "Warning: could not update case alias for ${caseId}" >> ${env.WORKING_DIR}/logs/elk_ingestion.log
         """
         
         echo "✅ ELK processing completed"
@@ -307,28 +463,34 @@ def extractIOCs(String evidencePath, String evidenceType) {
         
         def iocs = []
         
-        // Extract different IOC types based on evidence type
-        def iocData = sh(
-            script: """
-                case "${evidenceType}" in
-                    "disk"|"memory")
-                        # Extract IP addresses
-                        grep -oE '([0-9]{1,3}\\.){3}[0-9]{1,3}' "${evidencePath}" 2>/dev/null | head -100 || true
+        // Extract different IOC types based on evidence type; a rerun reuses the last extraction
+        def iocFile = "${env.WORKING_DIR}/output/iocs.txt"
+        cachedStage('ioc_extraction', ["evidence_hash=${env.EVIDENCE_SHA256}", "evidence_type=${evidenceType}",
+                                       "out:${iocFile}"]) {
+            def extracted = sh(
+                script: """
+                    case "${evidenceType}" in
+                        "disk"|"memory")
+                            # Extract IP addresses
+                            grep -oE '([0-9]{1,3}\\.){3}[0-9]{1,3}' "${evidencePath}" 2>/dev/null | head -100 || true
                         
-                        # Extract domain names
-                        grep -oE '[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}' "${evidencePath}" 2>/dev/null | head -100 || true
+                            # Extract domain names
+                            grep -oE '[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}' "${evidencePath}" 2>/dev/null | head -100 || true
                         
-                        # Extract email addresses
-                        grep -oE '[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}' "${evidencePath}" 2>/dev/null | head -50 || true
-                        ;;
-                    "malware")
-                        # Extract file hashes
-                        strings "${evidencePath}" | grep -oE '[a-fA-F0-9]{32}|[a-fA-F0-9]{40}|[a-fA-F0-9]{64}' | head -50 || true
-                        ;;
-                esac
-            """,
-            returnStdout: true
-        ).trim()
+                            # Extract email addresses
+                            grep -oE '[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}' "${evidencePath}" 2>/dev/null | head -50 || true
+                            ;;
+                        "malware")
+                            # Extract file hashes
+                            strings "${evidencePath}" | grep -oE '[a-fA-F0-9]{32}|[a-fA-F0-9]{40}|[a-fA-F0-9]{64}' | head -50 || true
+                            ;;
+                    esac
+                """,
+                returnStdout: true
+            ).trim()
+            writeFile file: iocFile, text: extracted
+        }
+        def iocData = readFile(iocFile).trim()
         
         // Process extracted IOCs
         iocData.split('\n').each { ioc ->
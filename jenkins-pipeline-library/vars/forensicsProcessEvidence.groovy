@@ -12,12 +12,16 @@ def call(Map config) {
             string(name: 'INVESTIGATOR', defaultValue: '', description: 'Lead investigator name')
             booleanParam(name: 'URGENT', defaultValue: false, description: 'Mark as urgent/priority case')
             choice(name: 'ANALYSIS_LEVEL', choices: ['basic', 'standard', 'comprehensive'], description: 'Analysis depth')
+            booleanParam(name: 'LOCAL_DAG', defaultValue: false, description: 'Run the processing steps concurrently with the local pipeline runner')
+            booleanParam(name: 'DISTRIBUTED', defaultValue: false, description: 'Queue the processing for the next free tool node instead of running it on this agent')
+            booleanParam(name: 'RERUN_ALL_STAGES', defaultValue: false, description: 'Ignore stage manifests from earlier runs of this evidence and process it from scratch')
         }
         
         environment {
             FORENSICS_WORKSPACE = "/var/lib/jenkins/forensics"
             IRIS_API_URL = "https://10.128.0.19:443/api"
             MISP_API_URL = "http://10.128.0.19:8080"
+            INTEGRATION_SCRIPTS = "/opt/scripts"
             ELK_URL = "http://10.128.0.19:9200"
             EVIDENCE_STORAGE = "/var/lib/jenkins/forensics/evidence"
             REPORT_OUTPUT = "/var/lib/jenkins/forensics/reports"
@@ -33,8 +37,8 @@ def call(Map config) {
                             irisCreateCase(params.CASE_ID, params.INVESTIGATOR)
                         }
                         
-                        // Create evidence tracking
-                        forensicsInitEvidence(params.CASE_ID, params.EVIDENCE_TYPE, params.EVIDENCE_PATH)
+                        // Create evidence tracking; reruns reuse the working directory and skip completed stages
+                        forensicsInitEvidence(params.CASE_ID, params.EVIDENCE_TYPE, params.EVIDENCE_PATH, params.RERUN_ALL_STAGES)
                         
                         // Send notification
                         forensicsNotify("🔍 Started processing ${params.EVIDENCE_TYPE} evidence for case ${params.CASE_ID}")
@@ -68,6 +72,15 @@ def call(Map config) {
                     stage('Primary Analysis') {
                         steps {
                             script {
+                                if (params.DISTRIBUTED) {
+                                    forensicsQueueEvidence(params.EVIDENCE_TYPE, params.EVIDENCE_PATH, params.CASE_ID, params.ANALYSIS_LEVEL,
+                                                           params.INVESTIGATOR, params.URGENT)
+                                    return
+                                }
+                                if (params.LOCAL_DAG) {
+                                    forensicsRunPipeline(params.EVIDENCE_TYPE, params.EVIDENCE_PATH, params.CASE_ID, params.ANALYSIS_LEVEL)
+                                    return
+                                }
                                 switch(params.EVIDENCE_TYPE) {
                                     case 'disk':
                                         forensicsProcessDiskImage(params.EVIDENCE_PATH, params.CASE_ID, params.ANALYSIS_LEVEL)
@@ -1,5 +1,10 @@
 // IRIS API Integration Functions for Jenkins
 // Provides seamless integration with DFIR-IRIS case management system
+//
+// Jenkins credentials:
+//   iris-api-key   - username/password, used by the httpRequest calls
+//   iris-api-token - secret text holding the IRIS API key, passed as IRIS_API_KEY to the
+//                    Python clients (iris_bulk.py, iris_upload.py) for Bearer authentication
 
 def checkCase(String caseId) {
     script {
@@ -70,75 +75,35 @@ def addEvidence(String caseId, String evidenceType, String evidencePath, Map met
 
 def updateFindings(String caseId, List findings) {
     script {
-        findings.each { finding ->
-            def noteData = [
-                note_title: "Automated Finding: ${finding.type}",
-                note_content: finding.description,
-                note_tags: ["automated", "ioc", finding.type],
-                case_id: caseId
-            ]
-            
-            httpRequest(
-                url: "${env.IRIS_API_URL}/case/notes/add",
-                httpMode: 'POST',
-                authentication: 'iris-api-key',
-                contentType: 'APPLICATION_JSON',
-                requestBody: groovy.json.JsonBuilder(noteData).toString()
-            )
-        }
-        echo "✅ Updated IRIS case ${caseId} with ${findings.size()} findings"
+        def summary = bulkSend(caseId, 'notes', findings)
+        echo "✅ Updated IRIS case ${caseId} with ${summary.sent} findings (${summary.per_second}/s)"
     }
 }
 
 def addTimeline(String caseId, List timelineEvents) {
     script {
-        timelineEvents.each { event ->
-            def timelineData = [
-                event_title: event.title,
-                event_content: event.description,
-                event_date: event.timestamp,
-                event_tags: event.tags ?: ["automated"],
-                case_id: caseId
-            ]
-            
-            httpRequest(
-                url: "${env.IRIS_API_URL}/case/timeline/events/add",
-                httpMode: 'POST',
-                authentication: 'iris-api-key',
-                contentType: 'APPLICATION_JSON',
-                requestBody: groovy.json.JsonBuilder(timelineData).toString()
-            )
-        }
-        echo "✅ Added ${timelineEvents.size()} timeline events to IRIS case ${caseId}"
+        def summary = bulkSend(caseId, 'timeline', timelineEvents)
+        echo "✅ Added ${summary.sent} timeline events to IRIS case ${caseId} (${summary.per_second}/s)"
     }
 }
 
 def attachReport(String caseId, String reportPath) {
     script {
-        // Read report file and encode
-        def reportContent = readFile(reportPath)
-        def encodedContent = reportContent.bytes.encodeBase64().toString()
-        
-        def reportData = [
-            filename: reportPath.split('/').last(),
-            file_content: encodedContent,
-            file_description: "Automated forensic analysis report",
-            file_tags: ["report", "automated", "forensics"],
-            case_id: caseId
-        ]
-        
-        def response = httpRequest(
-            url: "${env.IRIS_API_URL}/case/evidences/add",
-            httpMode: 'POST',
-            authentication: 'iris-api-key',
-            contentType: 'APPLICATION_JSON',
-            requestBody: groovy.json.JsonBuilder(reportData).toString()
-        )
+        // Stream the report from disk via iris_upload.py rather than base64-encoding
+        // it in controller memory
+        def scriptsDir = env.INTEGRATION_SCRIPTS ?: '/opt/scripts'
+        def status = 0
+        withCredentials([string(credentialsId: 'iris-api-token', variable: 'IRIS_API_KEY')]) {
+            status = sh(
+                script: "python3 ${scriptsDir}/iris_upload.py '${env.IRIS_API_URL}' '${caseId}' '${reportPath}'",
+                returnStatus: true
+            )
+        }
         
-        if (response.status == 200) {
+        if (status == 0) {
             echo "✅ Attached report to IRIS case ${caseId}"
         } else {
-            error("Failed to attach report to IRIS: ${response.status}")
+            error("Failed to attach report to IRIS: upload exited with ${status}")
         }
     }
 }
@@ -172,24 +137,32 @@ def updateCaseStatus(String caseId, String status) {
 
 def addIOCs(String caseId, List iocs) {
     script {
-        iocs.each { ioc ->
-            def iocData = [
-                ioc_value: ioc.value,
-                ioc_type_id: getIOCTypeId(ioc.type),
-                ioc_description: ioc.description ?: "Automatically extracted IOC",
-                ioc_tags: ["automated", "extracted"],
-                case_id: caseId
-            ]
-            
-            httpRequest(
-                url: "${env.IRIS_API_URL}/case/ioc/add",
-                httpMode: 'POST',
-                authentication: 'iris-api-key',
-                contentType: 'APPLICATION_JSON',
-                requestBody: groovy.json.JsonBuilder(iocData).toString()
-            )
+        def summary = bulkSend(caseId, 'iocs', iocs)
+        echo "✅ Added ${summary.sent} IOCs to IRIS case ${caseId} (${summary.per_second}/s)"
+    }
+}
+
+// Send a whole list in one iris_bulk.py call (pooled, concurrent, rate limited)
+def bulkSend(String caseId, String itemType, List items) {
+    script {
+        if (!items) {
+            return [sent: 0, failed: 0, per_second: 0]
+        }
+        
+        def scriptsDir = env.INTEGRATION_SCRIPTS ?: '/opt/scripts'
+        def itemsFile = "${env.WORKING_DIR}/temp/iris_${itemType}.json"
+        writeFile file: itemsFile, text: groovy.json.JsonOutput.toJson(items)
+        
+        def output = ''
+        withCredentials([string(credentialsId: 'iris-api-token', variable: 'IRIS_API_KEY')]) {
+            output = sh(
+                script: "python3 ${scriptsDir}/iris_bulk.py '${env.IRIS_API_URL}' ${itemType} '${caseId}' ${itemsFile}",
+                returnStdout: true
+            ).trim()
         }
-        echo "✅ Added ${iocs.size()} IOCs to IRIS case ${caseId}"
+        
+        // iris_bulk.py exits non-zero (failing the step) if any item could not be sent
+        return readJSON(text: output)
     }
 }
 
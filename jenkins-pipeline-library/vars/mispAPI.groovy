@@ -0,0 +1,35 @@
+// MISP API Integration Functions for Jenkins
+// IOC correlation runs through misp_integration.py so lookups share the local verdict cache
+
+def correlateIOCs(List iocs) {
+    script {
+        if (!iocs) {
+            return []
+        }
+        
+        def scriptsDir = env.INTEGRATION_SCRIPTS ?: '/opt/scripts'
+        def iocsFile = "${env.WORKING_DIR}/temp/iocs.json"
+        writeFile file: iocsFile, text: groovy.json.JsonOutput.toJson(iocs)
+        
+        def output = ''
+        withCredentials([string(credentialsId: 'misp-api-key', variable: 'MISP_API_KEY')]) {
+            output = sh(
+                script: "python3 ${scriptsDir}/misp_integration.py correlate '${env.MISP_API_URL}' \"\$MISP_API_KEY\" ${iocsFile}",
+                returnStdout: true
+            ).trim()
+        }
+        
+        def correlations = readJSON(text: output ?: '[]')
+        echo "✅ Correlated ${iocs.size()} IOCs with MISP: ${correlations.size()} matches"
+        return correlations
+    }
+}
+
+def cacheStats() {
+    script {
+        def scriptsDir = env.INTEGRATION_SCRIPTS ?: '/opt/scripts'
+        def stats = sh(script: "python3 ${scriptsDir}/ioc_cache.py stats", returnStdout: true).trim()
+        echo "📊 IOC cache statistics: ${stats}"
+        return readJSON(text: stats)
+    }
+}